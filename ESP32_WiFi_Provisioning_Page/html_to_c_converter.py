@@ -9,12 +9,118 @@ HTML转C语言字符串转换工具
 日期: 2024年
 """
 
+import io
 import os
 import re
+import gzip
+import hashlib
 import argparse
 import sys
 
 
+# ESP-IDF HTTP服务器处理函数（--httpd）使用的资源元数据
+CONTENT_TYPES = {
+    '.html': 'text/html; charset=utf-8',
+    '.htm': 'text/html; charset=utf-8',
+    '.css': 'text/css',
+    '.js': 'application/javascript',
+    '.json': 'application/json',
+    '.svg': 'image/svg+xml',
+    '.xml': 'text/xml',
+    '.txt': 'text/plain; charset=utf-8',
+}
+DEFAULT_CONTENT_TYPE = 'application/octet-stream'
+
+# 不压缩的文件类型（压缩规则会改动其中字符串的空白）
+NO_MINIFY_EXTENSIONS = ('.json', '.txt')
+
+# 这些关键字之后的 / 是正则表达式字面量的开始，而不是除号
+JS_REGEX_KEYWORDS = r'\b(return|typeof|case|do|else|in|of|void|delete|throw|new|yield|await)\s*$'
+
+# 缓存策略：页面每次都向设备确认（配合ETag，未修改时只返回304），其余资源缓存一天
+PAGE_CACHE_CONTROL = 'no-cache'
+ASSET_CACHE_CONTROL = 'max-age=86400'
+
+# 每次发送的数据块大小：默认等于lwIP的TCP发送缓冲区（ESP-IDF默认5744字节，即4个MSS），
+# 一次写满发送缓冲区，既不让数据块在缓冲区中排队等待，也减少每个块的分块头开销
+DEFAULT_CHUNK_SIZE = 5744
+
+HTTPD_COMMON_CODE = """#include <string.h>
+#include "esp_http_server.h"
+#include "sdkconfig.h"
+
+#ifndef WEB_ASSET_CHUNK_SIZE
+{chunk_size}
+#endif
+
+typedef struct {{
+    const char *data;
+    size_t size;
+    const char *content_type;
+    const char *content_encoding;
+    const char *cache_control;
+    const char *etag;
+}} web_asset_t;
+
+// 直接从Flash中的常量发送，不复制到RAM；不超过一个数据块时一次发送（带Content-Length），
+// 否则按WEB_ASSET_CHUNK_SIZE分块发送；浏览器缓存的ETag与当前一致时只返回304
+static esp_err_t web_asset_handler(httpd_req_t *req)
+{{
+    const web_asset_t *asset = (const web_asset_t *)req->user_ctx;
+    char etag[24];
+
+    httpd_resp_set_hdr(req, "Cache-Control", asset->cache_control);
+    httpd_resp_set_hdr(req, "ETag", asset->etag);
+    if (httpd_req_get_hdr_value_str(req, "If-None-Match", etag, sizeof(etag)) == ESP_OK &&
+        strcmp(etag, asset->etag) == 0) {{
+        httpd_resp_set_status(req, "304 Not Modified");
+        return httpd_resp_send(req, NULL, 0);
+    }}
+
+    httpd_resp_set_type(req, asset->content_type);
+    if (asset->content_encoding) {{
+        httpd_resp_set_hdr(req, "Content-Encoding", asset->content_encoding);
+    }}
+    if (asset->size <= WEB_ASSET_CHUNK_SIZE) {{
+        return httpd_resp_send(req, asset->data, asset->size);
+    }}
+    for (size_t offset = 0; offset < asset->size; offset += WEB_ASSET_CHUNK_SIZE) {{
+        size_t len = asset->size - offset;
+        if (len > WEB_ASSET_CHUNK_SIZE) {{
+            len = WEB_ASSET_CHUNK_SIZE;
+        }}
+        esp_err_t err = httpd_resp_send_chunk(req, asset->data + offset, len);
+        if (err != ESP_OK) {{
+            return err;
+        }}
+    }}
+    return httpd_resp_send_chunk(req, NULL, 0);
+}}
+"""
+
+HTTPD_CHUNK_SIZE_AUTO = """#ifdef CONFIG_LWIP_TCP_SND_BUF_DEFAULT
+#define WEB_ASSET_CHUNK_SIZE CONFIG_LWIP_TCP_SND_BUF_DEFAULT
+#else
+#define WEB_ASSET_CHUNK_SIZE {default}
+#endif"""
+
+HTTPD_REGISTER_CODE = """
+const size_t {prefix}_uri_handlers_count = sizeof({prefix}_uri_handlers) / sizeof({prefix}_uri_handlers[0]);
+
+// 注册全部处理函数（httpd_config_t的max_uri_handlers需要不少于{count}）
+esp_err_t {prefix}_register_uri_handlers(httpd_handle_t server)
+{{
+    for (size_t i = 0; i < {prefix}_uri_handlers_count; i++) {{
+        esp_err_t err = httpd_register_uri_handler(server, &{prefix}_uri_handlers[i]);
+        if (err != ESP_OK) {{
+            return err;
+        }}
+    }}
+    return ESP_OK;
+}}
+"""
+
+
 class HTMLToCConverter:
     def __init__(self):
         self.line_length = 80  # 每行最大长度
@@ -22,10 +128,10 @@ class HTMLToCConverter:
         
     def escape_string(self, content):
         """转义字符串中的特殊字符"""
+        # 转义反斜杠（必须最先处理，否则会重复转义后面添加的反斜杠）
+        content = content.replace('\\', '\\\\')
         # 转义双引号
         content = content.replace('"', '\\"')
-        # 转义反斜杠
-        content = content.replace('\\', '\\\\')
         # 转义换行符
         content = content.replace('\n', '\\n')
         # 转义回车符
@@ -35,10 +141,74 @@ class HTMLToCConverter:
         
         return content
     
-    def minify_html(self, content):
-        """压缩HTML内容"""
+    def strip_js_line_comments(self, code):
+        """移除JavaScript单行注释，跳过字符串、模板字符串和正则表达式字面量中的 //"""
+        result = []
+        i = 0
+        n = len(code)
+        last = ''  # 上一个非空白字符，用于区分除号和正则表达式
+        while i < n:
+            char = code[i]
+            if char in '"\'`':
+                # 字符串：到相同的引号为止（普通字符串不跨行）
+                j = i + 1
+                while j < n and code[j] != char and not (code[j] == '\n' and char != '`'):
+                    j += 2 if code[j] == '\\' else 1
+                j = min(j + 1, n)
+                result.append(code[i:j])
+                last = char
+                i = j
+            elif code.startswith('//', i):
+                # 单行注释：保留换行符
+                j = code.find('\n', i)
+                i = n if j == -1 else j
+            elif code.startswith('/*', i):
+                # 多行注释：原样保留，由后面的压缩步骤移除
+                j = code.find('*/', i + 2)
+                j = n if j == -1 else j + 2
+                result.append(code[i:j])
+                i = j
+            elif char == '/' and (not last or last in '(,=:[!&|?{};+-*%<>~^' or
+                                  re.search(JS_REGEX_KEYWORDS, code[max(0, i - 12):i])):
+                # 正则表达式字面量：到字符类之外的 / 为止
+                j = i + 1
+                in_class = False
+                while j < n and code[j] != '\n':
+                    if code[j] == '\\':
+                        j += 2
+                        continue
+                    if code[j] == '[':
+                        in_class = True
+                    elif code[j] == ']':
+                        in_class = False
+                    elif code[j] == '/' and not in_class:
+                        break
+                    j += 1
+                j = min(j + 1, n)
+                result.append(code[i:j])
+                last = '/'
+                i = j
+            else:
+                result.append(char)
+                if not char.isspace():
+                    last = char
+                i += 1
+        return ''.join(result)
+    
+    def minify_html(self, content, script=False):
+        """压缩HTML内容（script为True时整个内容是JavaScript）"""
         # 移除HTML注释
-        content = re.sub(r'<!--.*?-->', '', content, flags=re.DOTALL)
+        if not script:
+            content = re.sub(r'<!--.*?-->', '', content, flags=re.DOTALL)
+        
+        # 移除JavaScript单行注释（必须在合并空白之前，否则注释会吞掉后面的代码；
+        # HTML中只处理<script>内的代码，不影响正文和CSS中的 http:// 等URL）
+        if script:
+            content = self.strip_js_line_comments(content)
+        else:
+            content = re.sub(r'(<script\b[^>]*>)(.*?)(</script>)',
+                             lambda m: m.group(1) + self.strip_js_line_comments(m.group(2)) + m.group(3),
+                             content, flags=re.DOTALL | re.IGNORECASE)
         
         # 移除多余空白
         content = re.sub(r'\s+', ' ', content)
@@ -55,8 +225,6 @@ class HTMLToCConverter:
         content = re.sub(r',\s*', ',', content)
         
         # 压缩JavaScript
-        # 移除单行注释
-        content = re.sub(r'//.*?\n', '', content)
         # 移除多行注释
         content = re.sub(r'/\*.*?\*/', '', content, flags=re.DOTALL)
         # 移除多余空白
@@ -108,7 +276,37 @@ class HTMLToCConverter:
         
         return lines
     
-    def convert_file(self, input_file, output_file=None, minify=True, variable_name="html_content"):
+    def variable_name_from_path(self, path):
+        """根据文件路径生成C语言变量名（web/index.html -> web_index_html）"""
+        path = os.path.normpath(path).replace('\\', '/').lstrip('./')
+        name = re.sub(r'[^0-9A-Za-z_]', '_', path)
+        if not name or name[0].isdigit():
+            name = '_' + name
+        return name
+    
+    def write_depfile(self, depfile, output_file, input_files):
+        """写入Makefile格式的依赖文件（输出文件依赖输入文件和本脚本，供make/Ninja增量构建）"""
+        def escape(path):
+            return path.replace('\\', '/').replace(' ', '\\ ').replace('$', '$$')
+        deps = [os.path.abspath(path) for path in input_files] + [os.path.abspath(__file__)]
+        with open(depfile, 'w', encoding='utf-8') as f:
+            f.write(f"{escape(output_file)}: {' '.join(escape(dep) for dep in deps)}\n")
+    
+    def write_output(self, c_code, output_file, input_files, depfile=None):
+        """输出到文件（同时写入依赖文件）或控制台"""
+        if output_file:
+            output_dir = os.path.dirname(output_file)
+            if output_dir:
+                os.makedirs(output_dir, exist_ok=True)
+            with open(output_file, 'w', encoding='utf-8') as f:
+                f.write(c_code)
+            if depfile:
+                self.write_depfile(depfile, output_file, input_files)
+            print(f"转换完成！输出文件: {output_file}")
+        else:
+            print(c_code)
+    
+    def convert_file(self, input_file, output_file=None, minify=True, variable_name="html_content", depfile=None):
         """转换HTML文件为C语言字符串"""
         try:
             # 读取HTML文件
@@ -129,12 +327,7 @@ class HTMLToCConverter:
             c_code = self.generate_c_code(lines, variable_name)
             
             # 输出到文件或控制台
-            if output_file:
-                with open(output_file, 'w', encoding='utf-8') as f:
-                    f.write(c_code)
-                print(f"转换完成！输出文件: {output_file}")
-            else:
-                print(c_code)
+            self.write_output(c_code, output_file, [input_file], depfile)
                 
         except FileNotFoundError:
             print(f"错误: 找不到文件 {input_file}")
@@ -145,6 +338,74 @@ class HTMLToCConverter:
         
         return True
     
+    def uri_from_path(self, path, base_dir):
+        """资源对应的URI（相对于base_dir），index.html同时对应所在的目录"""
+        rel = os.path.relpath(path, base_dir).replace('\\', '/')
+        uris = ['/' + rel]
+        name = os.path.basename(rel)
+        if name in ('index.html', 'index.htm'):
+            uris.insert(0, '/' + rel[:-len(name)])
+        return uris
+    
+    def gzip_data(self, data):
+        """gzip压缩（固定时间戳，相同内容生成相同的结果）"""
+        buffer = io.BytesIO()
+        with gzip.GzipFile(fileobj=buffer, mode='wb', compresslevel=9, mtime=0) as f:
+            f.write(data)
+        return buffer.getvalue()
+    
+    def load_asset(self, input_file, variable_name, minify=True, compress=False, cache_control=None, base_dir=None):
+        """读取并转换一个资源文件，返回数据和HTTP响应头所需的元数据"""
+        with open(input_file, 'r', encoding='utf-8') as f:
+            content = f.read()
+        ext = os.path.splitext(input_file)[1].lower()
+        if minify and ext not in NO_MINIFY_EXTENSIONS:
+            content = self.minify_html(content, script=ext == '.js')
+        
+        data = content.encode('utf-8')
+        encoding = None
+        if compress:
+            compressed = self.gzip_data(data)
+            # 很小的文件压缩后反而更大，保持原样
+            if len(compressed) < len(data):
+                data, encoding = compressed, 'gzip'
+        
+        if cache_control is None:
+            cache_control = PAGE_CACHE_CONTROL if ext in ('.html', '.htm') else ASSET_CACHE_CONTROL
+        
+        return {
+            'file': input_file,
+            'variable': variable_name,
+            'content': content,
+            'data': data,
+            'content_type': CONTENT_TYPES.get(ext, DEFAULT_CONTENT_TYPE),
+            'content_encoding': encoding,
+            'cache_control': cache_control,
+            'etag': '"' + hashlib.sha1(data).hexdigest()[:16] + '"',
+            'uris': self.uri_from_path(input_file, base_dir or os.path.dirname(os.path.abspath(input_file))),
+        }
+    
+    def convert_httpd(self, input_files, output_file=None, minify=True, variable_names=None, prefix='web',
+                      depfile=None, compress=False, cache_control=None, base_dir=None, chunk_size=None):
+        """转换资源文件，同时生成ESP-IDF HTTP处理函数和httpd_uri_t注册表"""
+        if variable_names is None:
+            variable_names = [self.variable_name_from_path(path) for path in input_files]
+        if base_dir is None:
+            base_dir = os.path.commonpath([os.path.dirname(os.path.abspath(path)) for path in input_files])
+        try:
+            assets = [self.load_asset(path, name, minify, compress, cache_control, base_dir)
+                      for path, name in zip(input_files, variable_names)]
+            c_code = self.generate_httpd_code(assets, prefix, chunk_size)
+            self.write_output(c_code, output_file, input_files, depfile)
+        except FileNotFoundError as e:
+            print(f"错误: 找不到文件 {e.filename}")
+            return False
+        except Exception as e:
+            print(f"转换过程中出现错误: {e}")
+            return False
+        
+        return True
+    
     def generate_c_code(self, lines, variable_name):
         """生成C语言代码"""
         c_code = f"// 自动生成的HTML字符串常量\n"
@@ -161,6 +422,56 @@ class HTMLToCConverter:
         
         return c_code
     
+    def format_bytes(self, data):
+        """将二进制数据分割为C数组初始化列表的多行"""
+        per_line = max(1, (self.line_length - len(self.indent)) // 6)
+        return [self.indent + ' '.join(f"0x{b:02x}," for b in data[i:i + per_line])
+                for i in range(0, len(data), per_line)]
+    
+    def generate_httpd_code(self, assets, prefix, chunk_size=None):
+        """生成资源数据、ESP-IDF HTTP处理函数和httpd_uri_t注册表"""
+        if chunk_size:
+            chunk = f"#define WEB_ASSET_CHUNK_SIZE {chunk_size}"
+        else:
+            chunk = HTTPD_CHUNK_SIZE_AUTO.format(default=DEFAULT_CHUNK_SIZE)
+        
+        c_code = f"// 自动生成的网页资源和ESP-IDF HTTP处理函数\n"
+        c_code += f"// 注册: extern esp_err_t {prefix}_register_uri_handlers(httpd_handle_t server);\n"
+        c_code += f"// 生成时间: {self.get_timestamp()}\n\n"
+        c_code += HTTPD_COMMON_CODE.format(chunk_size=chunk)
+        
+        table = []
+        for asset in assets:
+            name = asset['variable']
+            encoding = asset['content_encoding']
+            encoding_value = f'"{encoding}"' if encoding else 'NULL'
+            c_code += f"\n// {asset['file']}（{len(asset['data'])} 字节）\n"
+            if encoding:
+                c_code += f"const unsigned char {name}[] = {{\n"
+                c_code += '\n'.join(self.format_bytes(asset['data'])) + "\n};\n"
+                c_code += f"const size_t {name}_len = sizeof({name});\n\n"
+            else:
+                lines = self.split_string(self.escape_string(asset['content'])) or [self.indent + '""']
+                c_code += f"const char {name}[] =\n" + '\n'.join(lines) + ";\n"
+                c_code += f"const size_t {name}_len = sizeof({name}) - 1;\n\n"
+            
+            c_code += f"static const web_asset_t {name}_asset = {{\n"
+            c_code += f"    .data = (const char *){name},\n"
+            c_code += f"    .size = sizeof({name}){'' if encoding else ' - 1'},\n"
+            c_code += f"    .content_type = \"{asset['content_type']}\",\n"
+            c_code += f"    .content_encoding = {encoding_value},\n"
+            c_code += f"    .cache_control = \"{self.escape_string(asset['cache_control'])}\",\n"
+            c_code += f"    .etag = \"{self.escape_string(asset['etag'])}\",\n"
+            c_code += "};\n"
+            
+            for uri in asset['uris']:
+                table.append(f"    {{ .uri = \"{self.escape_string(uri)}\", .method = HTTP_GET, "
+                             f".handler = web_asset_handler, .user_ctx = (void *)&{name}_asset }},")
+        
+        c_code += f"\nconst httpd_uri_t {prefix}_uri_handlers[] = {{\n" + '\n'.join(table) + "\n};\n"
+        c_code += HTTPD_REGISTER_CODE.format(prefix=prefix, count=len(table))
+        return c_code
+    
     def get_timestamp(self):
         """获取当前时间戳"""
         import datetime
@@ -177,36 +488,92 @@ def main():
   python html_to_c_converter.py input.html -o output.c
   python html_to_c_converter.py input.html -v wifi_page_html --no-minify
   python html_to_c_converter.py input.html -l 100 -o output.c
+  python html_to_c_converter.py web/index.html -o build/web/index.html.c --variable-from-path --depfile build/web/index.html.c.d
+  python html_to_c_converter.py web/index.html web/style.css web/app.js -o main/web_assets.c --httpd --gzip
         """
     )
     
-    parser.add_argument('input_file', help='输入的HTML文件路径')
+    parser.add_argument('input_files', nargs='+', metavar='input_file',
+                       help='输入的HTML文件路径（使用 --httpd 时可以指定多个资源文件）')
     parser.add_argument('-o', '--output', help='输出的C文件路径（可选）')
-    parser.add_argument('-v', '--variable', default='html_content', 
+    parser.add_argument('-v', '--variable',
                        help='C语言变量名（默认: html_content）')
     parser.add_argument('-l', '--line-length', type=int, default=80,
                        help='每行最大长度（默认: 80）')
     parser.add_argument('--no-minify', action='store_true',
                        help='不压缩HTML内容')
+    parser.add_argument('--variable-from-path', action='store_true',
+                       help='根据输入文件路径生成变量名（web/index.html -> web_index_html），用于批量转换')
+    parser.add_argument('--depfile', metavar='PATH',
+                       help='同时写入Makefile格式的依赖文件（需要指定 -o），供make/CMake增量构建')
+    
+    # ESP-IDF HTTP服务器
+    parser.add_argument('--httpd', nargs='?', const='', metavar='PREFIX',
+                       help='同时生成ESP-IDF HTTP处理函数和httpd_uri_t注册表 PREFIX_uri_handlers'
+                            '（默认: 多个文件时为 web，单个文件时为变量名）')
+    parser.add_argument('--gzip', action='store_true',
+                       help='（--httpd）gzip压缩资源数据，响应时带 Content-Encoding: gzip')
+    parser.add_argument('--cache-control', metavar='VALUE',
+                       help=f'（--httpd）Cache-Control响应头（默认: 页面 {PAGE_CACHE_CONTROL}，其他资源 {ASSET_CACHE_CONTROL}）')
+    parser.add_argument('--base-dir', metavar='DIR',
+                       help='（--httpd）计算URI的根目录（默认: 输入文件所在的公共目录）')
+    parser.add_argument('--chunk-size', type=int, metavar='BYTES',
+                       help=f'（--httpd）分块发送的大小（默认: sdkconfig 中的TCP发送缓冲区大小，未配置时为 {DEFAULT_CHUNK_SIZE}）')
     
     args = parser.parse_args()
     
     # 检查输入文件是否存在
-    if not os.path.exists(args.input_file):
-        print(f"错误: 文件 {args.input_file} 不存在")
+    for input_file in args.input_files:
+        if not os.path.exists(input_file):
+            print(f"错误: 文件 {input_file} 不存在")
+            sys.exit(1)
+    
+    if args.depfile and not args.output:
+        print("错误: --depfile 需要同时指定 -o 输出文件")
+        sys.exit(1)
+    
+    multiple = len(args.input_files) > 1
+    if multiple and args.httpd is None:
+        print("错误: 多个输入文件需要同时指定 --httpd")
+        sys.exit(1)
+    if multiple and args.variable:
+        print("错误: 多个输入文件时变量名根据文件路径生成，不能指定 -v")
+        sys.exit(1)
+    if args.chunk_size is not None and args.chunk_size <= 0:
+        print("错误: --chunk-size 必须大于 0")
         sys.exit(1)
     
     # 创建转换器
     converter = HTMLToCConverter()
     converter.line_length = args.line_length
     
+    variable = args.variable or 'html_content'
+    if args.variable_from_path:
+        variable = converter.variable_name_from_path(args.input_files[0])
+    
     # 执行转换
-    success = converter.convert_file(
-        args.input_file,
-        args.output,
-        not args.no_minify,
-        args.variable
-    )
+    if args.httpd is not None:
+        variables = None if multiple else [variable]
+        success = converter.convert_httpd(
+            args.input_files,
+            args.output,
+            not args.no_minify,
+            variables,
+            args.httpd or ('web' if multiple else variable),
+            args.depfile,
+            args.gzip,
+            args.cache_control,
+            args.base_dir,
+            args.chunk_size
+        )
+    else:
+        success = converter.convert_file(
+            args.input_files[0],
+            args.output,
+            not args.no_minify,
+            variable,
+            args.depfile
+        )
     
     if not success:
         sys.exit(1)
@@ -0,0 +1,567 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+###############################################################################
+# STM32 链接 map 文件 Flash/RAM 占用分析工具
+#
+# 功能：逐行读取 GNU ld 生成的 .map 文件（可选读取 nm 输出的 ELF 符号表），
+#       按目标文件、静态库、输出段和符号统计 Flash/RAM 占用，并对比两次构建的变化
+#       内存占用只与目标文件/段/符号的数量有关，与 map 文件大小无关
+#
+# 使用方法：
+#   python3 cubemx_map_size.py build/project.map
+#   python3 cubemx_map_size.py build/project.map --elf build/project.elf --json size.json
+#   python3 cubemx_map_size.py --diff old.map new.map
+#   python3 cubemx_map_size.py --diff size.json build/project.map
+#
+# 日期：2026年10月
+###############################################################################
+
+import sys
+import os
+import argparse
+import json
+import shutil
+import subprocess
+
+# 颜色输出
+class Colors:
+    RED = '\033[0;31m'
+    GREEN = '\033[0;32m'
+    YELLOW = '\033[1;33m'
+    BLUE = '\033[0;34m'
+    NC = '\033[0m'  # No Color
+
+def print_info(msg):
+    print(f"{Colors.BLUE}[INFO]{Colors.NC} {msg}")
+
+def print_success(msg):
+    print(f"{Colors.GREEN}[SUCCESS]{Colors.NC} {msg}")
+
+def print_warning(msg):
+    print(f"{Colors.YELLOW}[WARNING]{Colors.NC} {msg}")
+
+def print_error(msg):
+    print(f"{Colors.RED}[ERROR]{Colors.NC} {msg}")
+
+# map 文件的章节标题
+MAP_DISCARDED = 'Discarded input sections'
+MAP_MEMORY = 'Memory Configuration'
+MAP_LAYOUT = 'Linker script and memory map'
+MAP_CREF = 'Cross Reference Table'
+
+# 不占用目标内存的输出段（调试信息等）
+NON_ALLOC_PREFIXES = ('.debug', '.comment', '.ARM.attributes', '.stab', '.gnu.attributes', '.line')
+
+# 没有 MEMORY 配置时按段名判断位置
+RAM_SECTION_PREFIXES = ('.bss', '.noinit', '._user_heap_stack', '.heap', '.stack', '.tbss')
+DATA_SECTION_PREFIXES = ('.data', '.tdata')
+
+# 由链接脚本直接分配（如堆栈预留）、不属于任何目标文件的空间
+LINKER_SCRIPT_OBJECT = '(链接脚本)'
+FILL_OBJECT = '*fill*'
+PROJECT_LIBRARY = '(项目目标文件)'
+
+SUMMARY_VERSION = 1
+TOP_DEFAULT = 20
+TABLES = ('objects', 'libraries', 'sections', 'symbols')
+TABLE_TITLES = {
+    'objects': '目标文件',
+    'libraries': '静态库',
+    'sections': '输出段',
+    'symbols': '符号',
+}
+
+class MemoryRegion:
+    """链接脚本中的 MEMORY 区域"""
+    def __init__(self, name, origin, length, attributes=''):
+        self.name = name
+        self.origin = origin
+        self.length = length
+        self.attributes = attributes
+        self.used = 0
+
+    @property
+    def is_flash(self):
+        """只读区域视为 Flash（没有属性时按名称判断）"""
+        if self.attributes:
+            return 'w' not in self.attributes.lower()
+        return any(key in self.name.upper() for key in ('FLASH', 'ROM'))
+
+    def contains(self, address):
+        return self.origin <= address < self.origin + self.length
+
+    def to_json(self):
+        return {'name': self.name, 'origin': self.origin, 'length': self.length,
+                'attributes': self.attributes, 'used': self.used}
+
+    @classmethod
+    def from_json(cls, data):
+        region = cls(data['name'], data['origin'], data['length'], data.get('attributes', ''))
+        region.used = data.get('used', 0)
+        return region
+
+class SizeSummary:
+    """按目标文件、静态库、输出段和符号汇总的 Flash/RAM 占用
+
+    每个统计表为 {名称: [Flash 字节数, RAM 字节数]}。
+    """
+    def __init__(self):
+        self.regions = []
+        self.tables = {table: {} for table in TABLES}
+        self.flash = 0
+        self.ram = 0
+
+    def add(self, table, key, flash, ram):
+        entry = self.tables[table].get(key)
+        if entry is None:
+            self.tables[table][key] = [flash, ram]
+        else:
+            entry[0] += flash
+            entry[1] += ram
+
+    def find_region(self, address):
+        for region in self.regions:
+            if region.contains(address):
+                return region
+        return None
+
+    def to_json(self):
+        return {'version': SUMMARY_VERSION, 'flash': self.flash, 'ram': self.ram,
+                'regions': [region.to_json() for region in self.regions],
+                **{table: self.tables[table] for table in TABLES}}
+
+    @classmethod
+    def from_json(cls, data):
+        summary = cls()
+        summary.flash = data.get('flash', 0)
+        summary.ram = data.get('ram', 0)
+        summary.regions = [MemoryRegion.from_json(region) for region in data.get('regions', [])]
+        for table in TABLES:
+            summary.tables[table] = {key: list(value) for key, value in data.get(table, {}).items()}
+        return summary
+
+def _is_hex(token):
+    return token.startswith('0x')
+
+def _split_object(path):
+    """拆分输入文件为 (目标文件名, 静态库名)：libc_nano.a(lib_a-memset.o) -> 静态库 libc_nano.a"""
+    if path.endswith(')') and '(' in path:
+        archive, _, member = path[:-1].partition('(')
+        library = os.path.basename(archive)
+        return f"{library}({member})", library
+    return path, PROJECT_LIBRARY
+
+class _OutputSection:
+    """正在解析的输出段"""
+    __slots__ = ('name', 'size', 'flash', 'ram', 'assigned')
+
+    def __init__(self, name, size, flash, ram):
+        self.name = name
+        self.size = size
+        self.flash = flash
+        self.ram = ram
+        self.assigned = 0
+
+class MapParser:
+    """逐行解析 GNU ld map 文件（流式处理，不保存原始内容）"""
+    def __init__(self, summary=None):
+        self.summary = summary or SizeSummary()
+        self.state = 'header'
+        self.output = None
+        self.pending_output = None
+        self.pending_input = None
+        self.sections = 0
+
+    def _classify(self, name, vma, lma):
+        """返回 (是否占用 Flash, 是否占用 RAM)，不占用目标内存时返回 None"""
+        if name.startswith(NON_ALLOC_PREFIXES):
+            return None
+        summary = self.summary
+        if not summary.regions:
+            if name.startswith(RAM_SECTION_PREFIXES):
+                return False, True
+            if name.startswith(DATA_SECTION_PREFIXES):
+                return True, True
+            return True, False
+        region = summary.find_region(vma)
+        if region is None:
+            return None
+        flash = region.is_flash
+        ram = not flash
+        if lma is not None and lma != vma:
+            load_region = summary.find_region(lma)
+            if load_region is not None and load_region.is_flash:
+                flash = True
+        return flash, ram
+
+    def _open_output(self, name, tokens):
+        """开始新的输出段：tokens 为 [VMA, 大小, ('load', 'address', LMA)]"""
+        self._close_output()
+        vma = int(tokens[0], 16)
+        size = int(tokens[1], 16)
+        lma = None
+        if len(tokens) >= 5 and tokens[2] == 'load' and tokens[3] == 'address':
+            lma = int(tokens[4], 16)
+        placement = self._classify(name, vma, lma)
+        if placement is None:
+            return
+        flash, ram = placement
+        summary = self.summary
+        if summary.regions:
+            summary.find_region(vma).used += size
+            if lma is not None and lma != vma:
+                load_region = summary.find_region(lma)
+                if load_region is not None:
+                    load_region.used += size
+        summary.flash += size if flash else 0
+        summary.ram += size if ram else 0
+        summary.add('sections', name, size if flash else 0, size if ram else 0)
+        self.output = _OutputSection(name, size, flash, ram)
+        self.sections += 1
+
+    def _close_output(self):
+        """结束当前输出段：未分配给输入段的空间计入链接脚本"""
+        output = self.output
+        if output is not None and output.size > output.assigned:
+            rest = output.size - output.assigned
+            self.summary.add('objects', LINKER_SCRIPT_OBJECT,
+                             rest if output.flash else 0, rest if output.ram else 0)
+        self.output = None
+
+    def _add_input(self, size, path):
+        output = self.output
+        if size == 0:
+            return
+        output.assigned += size
+        flash = size if output.flash else 0
+        ram = size if output.ram else 0
+        if path:
+            obj, library = _split_object(path)
+        else:
+            obj, library = FILL_OBJECT, PROJECT_LIBRARY
+        self.summary.add('objects', obj, flash, ram)
+        self.summary.add('libraries', library, flash, ram)
+
+    def feed(self, line):
+        """处理一行，遇到交叉引用表（不需要解析）时返回 False"""
+        if self.state != 'layout':
+            if line.startswith(MAP_MEMORY):
+                self.state = 'memory'
+            elif line.startswith(MAP_LAYOUT):
+                self.state = 'layout'
+            elif line.startswith(MAP_DISCARDED):
+                self.state = 'discarded'
+            elif self.state == 'memory':
+                tokens = line.split()
+                if len(tokens) >= 3 and _is_hex(tokens[1]) and tokens[0] != '*default*':
+                    self.summary.regions.append(MemoryRegion(
+                        tokens[0], int(tokens[1], 16), int(tokens[2], 16), tokens[3] if len(tokens) > 3 else ''))
+            return True
+
+        first = line[:1]
+        if first == ' ' or first == '\t':
+            # 当前没有需要统计的段时快速跳过（调试信息段占 map 文件的大部分）
+            if self.output is None and self.pending_output is None:
+                return True
+            tokens = line.split()
+            if not tokens:
+                return True
+            if _is_hex(tokens[0]):
+                if len(tokens) < 2 or not _is_hex(tokens[1]):
+                    return True  # 符号定义或赋值语句
+                if self.pending_output is not None:
+                    self._open_output(self.pending_output, tokens)
+                    self.pending_output = None
+                elif self.pending_input is not None and self.output is not None:
+                    self._add_input(int(tokens[1], 16), ' '.join(tokens[2:]))
+                    self.pending_input = None
+                return True
+            self.pending_output = None
+            self.pending_input = None
+            if self.output is None:
+                return True
+            if len(tokens) >= 3 and _is_hex(tokens[1]) and _is_hex(tokens[2]):
+                # 输入段（包括 *fill* 和 COMMON）
+                self._add_input(int(tokens[2], 16), ' '.join(tokens[3:]))
+            elif len(tokens) == 1 and (tokens[0].startswith('.') or tokens[0] == 'COMMON'):
+                # 输入段名太长，地址和大小在下一行
+                self.pending_input = tokens[0]
+            return True
+
+        if first in ('', '\n', '\r'):
+            return True
+        if line.startswith(MAP_CREF):
+            return False
+        # 顶格的行：输出段，或 LOAD/OUTPUT 等其他内容
+        tokens = line.split()
+        self.pending_input = None
+        self.pending_output = None
+        if len(tokens) >= 3 and _is_hex(tokens[1]) and _is_hex(tokens[2]):
+            self._open_output(tokens[0], tokens[1:])
+        elif len(tokens) == 1 and not tokens[0].startswith('OUTPUT('):
+            # 输出段名太长，地址和大小在下一行
+            self._close_output()
+            self.pending_output = tokens[0]
+        else:
+            self._close_output()
+        return True
+
+    def finish(self):
+        self._close_output()
+        return self.summary
+
+def analyze_map(path):
+    """流式分析 map 文件，返回 SizeSummary，不是 GNU ld map 文件时返回 None"""
+    parser = MapParser()
+    try:
+        with open(path, 'r', encoding='utf-8', errors='replace') as f:
+            for line in f:
+                if not parser.feed(line):
+                    break
+    except OSError as e:
+        print_error(f"读取文件失败: {e}")
+        return None
+    if parser.state != 'layout':
+        print_error(f"{path} 不是 GNU ld 生成的 map 文件（缺少 \"{MAP_LAYOUT}\"）")
+        return None
+    summary = parser.finish()
+    if parser.sections == 0:
+        print_warning(f"{path} 中没有找到占用 Flash/RAM 的输出段")
+    return summary
+
+def find_nm(program=None):
+    """查找 nm：优先使用指定的程序，其次使用 ARM_TOOLCHAIN_PATH 中的工具链，最后使用 PATH"""
+    if program:
+        return program
+    toolchain = os.environ.get('ARM_TOOLCHAIN_PATH')
+    if toolchain:
+        candidate = os.path.join(toolchain, 'bin', 'arm-none-eabi-nm')
+        if os.path.isfile(candidate):
+            return candidate
+    return shutil.which('arm-none-eabi-nm') or shutil.which('nm')
+
+def add_symbols(summary, lines):
+    """统计 nm -S 输出的符号大小（地址 大小 类型 名称）"""
+    count = 0
+    for line in lines:
+        tokens = line.split(None, 3)
+        if len(tokens) != 4:
+            continue  # 没有大小的符号
+        try:
+            address = int(tokens[0], 16)
+            size = int(tokens[1], 16)
+        except ValueError:
+            continue
+        kind = tokens[2]
+        if size == 0 or kind in 'aAuUwWN?':
+            continue
+        name = tokens[3].strip()
+        if summary.regions:
+            region = summary.find_region(address)
+            if region is None:
+                continue
+            flash = region.is_flash or kind in 'dD'
+            ram = not region.is_flash
+        else:
+            flash = kind not in 'bB'
+            ram = kind in 'bBdD'
+        summary.add('symbols', name, size if flash else 0, size if ram else 0)
+        count += 1
+    return count
+
+def analyze_elf_symbols(summary, elf, nm=None):
+    """运行 nm 读取 ELF 符号表（逐行处理输出）"""
+    program = find_nm(nm)
+    if program is None:
+        print_warning("没有找到 nm（可通过 --nm 指定 arm-none-eabi-nm），跳过符号统计")
+        return False
+    try:
+        process = subprocess.Popen([program, '-S', '--size-sort', elf], stdout=subprocess.PIPE,
+                                   stderr=subprocess.PIPE, text=True, errors='replace')
+    except OSError as e:
+        print_warning(f"无法运行 {program}: {e}")
+        return False
+    count = add_symbols(summary, process.stdout)
+    _, stderr = process.communicate()
+    if process.returncode != 0:
+        print_warning(f"{program} 运行失败: {stderr.strip()}")
+        return False
+    print_info(f"读取了 {count} 个符号（{program}）")
+    return True
+
+def load_summary(path):
+    """读取 map 文件或保存的 JSON 统计结果"""
+    if path.endswith('.json'):
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                return SizeSummary.from_json(json.load(f))
+        except (OSError, ValueError, KeyError) as e:
+            print_error(f"读取统计结果失败: {path}: {e}")
+            return None
+    return analyze_map(path)
+
+def _percent(used, total):
+    return f"{used * 100.0 / total:5.1f}%" if total else '    -'
+
+def print_regions(summary):
+    """打印各内存区域的使用情况（与 --print-memory-usage 类似）"""
+    if not summary.regions:
+        print_info(f"Flash: {summary.flash} 字节，RAM: {summary.ram} 字节（map 文件中没有 MEMORY 配置）")
+        return
+    print_info("内存区域使用情况：")
+    print(f"  {'区域':<12}{'已使用':>12}{'总大小':>12}{'使用率':>9}")
+    for region in summary.regions:
+        print(f"  {region.name:<12}{region.used:>12}{region.length:>12}   {_percent(region.used, region.length)}")
+    print(f"  Flash 合计 {summary.flash} 字节，RAM 合计 {summary.ram} 字节")
+
+def print_table(summary, table, top=TOP_DEFAULT, sort='flash'):
+    """打印占用最大的条目"""
+    entries = summary.tables[table]
+    if not entries:
+        return
+    index = 0 if sort == 'flash' else 1
+    rows = sorted(entries.items(), key=lambda item: (item[1][index], item[1][1 - index], item[0]), reverse=True)
+    shown = rows[:top] if top > 0 else rows
+    print()
+    print_info(f"按{TABLE_TITLES[table]}统计（共 {len(rows)} 个，按 {'Flash' if index == 0 else 'RAM'} 排序"
+               f"{f'，前 {len(shown)} 个' if len(shown) < len(rows) else ''}）：")
+    print(f"  {'Flash':>10}{'RAM':>10}  {TABLE_TITLES[table]}")
+    for name, (flash, ram) in shown:
+        print(f"  {flash:>10}{ram:>10}  {name}")
+
+def diff_summaries(old, new, table):
+    """对比两次构建的统计表，返回 [(名称, ΔFlash, ΔRAM, 新 Flash, 新 RAM, 状态)]，按变化量排序"""
+    old_entries = old.tables[table]
+    new_entries = new.tables[table]
+    rows = []
+    for name in set(old_entries) | set(new_entries):
+        old_flash, old_ram = old_entries.get(name, (0, 0))
+        new_flash, new_ram = new_entries.get(name, (0, 0))
+        if old_flash == new_flash and old_ram == new_ram:
+            continue
+        status = '新增' if name not in old_entries else '移除' if name not in new_entries else ''
+        rows.append((name, new_flash - old_flash, new_ram - old_ram, new_flash, new_ram, status))
+    rows.sort(key=lambda row: (abs(row[1]) + abs(row[2]), row[0]), reverse=True)
+    return rows
+
+def _signed(value):
+    return f"{value:+d}" if value else '0'
+
+def print_diff(old, new, top=TOP_DEFAULT):
+    """打印两次构建的差异"""
+    print_info(f"Flash: {old.flash} -> {new.flash}（{_signed(new.flash - old.flash)}），"
+               f"RAM: {old.ram} -> {new.ram}（{_signed(new.ram - old.ram)}）")
+    old_regions = {region.name: region for region in old.regions}
+    for region in new.regions:
+        before = old_regions.get(region.name)
+        if before is not None and before.used != region.used:
+            print(f"  {region.name:<12}{before.used:>12} -> {region.used:<12}"
+                  f"{_signed(region.used - before.used):>10}   {_percent(region.used, region.length)}")
+
+    changed = False
+    for table in TABLES:
+        rows = diff_summaries(old, new, table)
+        if not rows:
+            continue
+        changed = True
+        shown = rows[:top] if top > 0 else rows
+        print()
+        print_info(f"{TABLE_TITLES[table]}变化（共 {len(rows)} 个"
+                   f"{f'，变化最大的 {len(shown)} 个' if len(shown) < len(rows) else ''}）：")
+        print(f"  {'ΔFlash':>10}{'ΔRAM':>10}{'Flash':>10}{'RAM':>10}  {TABLE_TITLES[table]}")
+        for name, d_flash, d_ram, flash, ram, status in shown:
+            print(f"  {_signed(d_flash):>10}{_signed(d_ram):>10}{flash:>10}{ram:>10}  {name}"
+                  f"{f'（{status}）' if status else ''}")
+    if not changed:
+        print_success("两次构建的占用没有变化")
+
+def save_summary(summary, path):
+    """保存统计结果，供之后的构建对比"""
+    try:
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(summary.to_json(), f, ensure_ascii=False, indent=1, sort_keys=True)
+            f.write('\n')
+    except OSError as e:
+        print_error(f"保存统计结果失败: {e}")
+        return False
+    print_info(f"统计结果已保存到: {path}")
+    return True
+
+def parse_args(argv=None):
+    """解析命令行参数"""
+    parser = argparse.ArgumentParser(
+        description="STM32 链接 map 文件 Flash/RAM 占用分析工具",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+使用示例:
+  python3 cubemx_map_size.py build/project.map
+  python3 cubemx_map_size.py build/project.map --elf build/project.elf --top 30
+  python3 cubemx_map_size.py build/project.map --json build/size.json
+  python3 cubemx_map_size.py --diff old/project.map build/project.map
+  python3 cubemx_map_size.py --diff size-main.json build/project.map
+        """
+    )
+    parser.add_argument('map', nargs='?',
+                        help='GNU ld 生成的 map 文件（或 --json 保存的统计结果）')
+    parser.add_argument('--diff', nargs=2, metavar=('OLD', 'NEW'),
+                        help='对比两次构建（map 文件或 --json 保存的统计结果）')
+    parser.add_argument('--elf', metavar='ELF',
+                        help='同时通过 nm 读取 ELF 符号表，按符号统计')
+    parser.add_argument('--nm', metavar='PROGRAM',
+                        help='nm 程序（默认: $ARM_TOOLCHAIN_PATH/bin/arm-none-eabi-nm 或 PATH 中的 arm-none-eabi-nm）')
+    parser.add_argument('--top', type=int, default=TOP_DEFAULT, metavar='N',
+                        help=f'每个统计表列出的数量，0 表示全部（默认: {TOP_DEFAULT}）')
+    parser.add_argument('--sort', choices=('flash', 'ram'), default='flash',
+                        help='排序依据（默认: flash）')
+    parser.add_argument('--by', choices=TABLES + ('all',), default='all',
+                        help='只列出指定的统计表（默认: all）')
+    parser.add_argument('--json', metavar='PATH',
+                        help='保存统计结果（JSON），可用于之后的 --diff')
+    args = parser.parse_args(argv)
+    if not args.map and not args.diff:
+        parser.error('需要指定 map 文件或 --diff OLD NEW')
+    return args
+
+def main():
+    """主函数"""
+    args = parse_args()
+
+    if args.diff:
+        old_path, new_path = args.diff
+        for path in (old_path, new_path):
+            if not os.path.isfile(path):
+                print_error(f"文件不存在: {path}")
+                sys.exit(1)
+        old = load_summary(old_path)
+        new = load_summary(new_path)
+        if old is None or new is None:
+            sys.exit(1)
+        print_info(f"对比 {old_path} -> {new_path}")
+        print_diff(old, new, args.top)
+        if args.json and not save_summary(new, args.json):
+            sys.exit(1)
+        sys.exit(0)
+
+    if not os.path.isfile(args.map):
+        print_error(f"文件不存在: {args.map}")
+        sys.exit(1)
+    summary = load_summary(args.map)
+    if summary is None:
+        sys.exit(1)
+    if args.elf:
+        if not os.path.isfile(args.elf):
+            print_error(f"文件不存在: {args.elf}")
+            sys.exit(1)
+        summary.tables['symbols'].clear()
+        analyze_elf_symbols(summary, args.elf, args.nm)
+
+    print_regions(summary)
+    for table in TABLES if args.by == 'all' else (args.by,):
+        print_table(summary, table, args.top, args.sort)
+    if args.json and not save_summary(summary, args.json):
+        sys.exit(1)
+    sys.exit(0)
+
+if __name__ == '__main__':
+    main()
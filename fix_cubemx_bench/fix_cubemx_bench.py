@@ -0,0 +1,1121 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+###############################################################################
+# STM32CubeMX 修复脚本基准测试与回归检查工具
+#
+# 功能：生成模拟 STM32CubeMX 不同版本、CRLF 换行、超长源文件列表和手动修改过的
+#       Makefile 与 CMake 工具链文件，测量 fix_makefile / fix_cmake_toolchain
+#       每秒能处理的文件数，并逐字节对比修复结果与 golden/ 中的预期结果
+#
+# 使用方法：
+#   python3 fix_cubemx_bench.py --check            # 对比 golden 文件
+#   python3 fix_cubemx_bench.py --update-golden    # 修改模板或启发式规则后更新 golden 文件
+#   python3 fix_cubemx_bench.py --bench --count 2000
+#   python3 fix_cubemx_bench.py --generate /tmp/corpus --count 500
+#
+# 日期：2026年10月
+###############################################################################
+
+import sys
+import os
+import argparse
+import contextlib
+import difflib
+import importlib.util
+import io
+import random
+import shutil
+import subprocess
+import tempfile
+import time
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+GOLDEN_DIR = os.path.join(SCRIPT_DIR, 'golden')
+FIXER_PATHS = {
+    'makefile': os.path.join(SCRIPT_DIR, '..', 'fix_cubemx_makefile', 'fix_cubemx_makefile.py'),
+    'cmake': os.path.join(SCRIPT_DIR, '..', 'fix_cubemx_cmake', 'fix_cubemx_cmake.py'),
+}
+
+# 颜色输出
+class Colors:
+    RED = '\033[0;31m'
+    GREEN = '\033[0;32m'
+    YELLOW = '\033[1;33m'
+    BLUE = '\033[0;34m'
+    NC = '\033[0m'  # No Color
+
+def print_info(msg):
+    print(f"{Colors.BLUE}[INFO]{Colors.NC} {msg}")
+
+def print_success(msg):
+    print(f"{Colors.GREEN}[SUCCESS]{Colors.NC} {msg}")
+
+def print_warning(msg):
+    print(f"{Colors.YELLOW}[WARNING]{Colors.NC} {msg}")
+
+def print_error(msg):
+    print(f"{Colors.RED}[ERROR]{Colors.NC} {msg}")
+
+def load_fixer(kind):
+    """按路径加载修复脚本模块（两个脚本都是独立文件，不是包）"""
+    path = os.path.normpath(FIXER_PATHS[kind])
+    spec = importlib.util.spec_from_file_location(f"fix_cubemx_{kind}", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+# STM32CubeMX Makefile 模板
+# 各版本的差别主要在文件头、工具链部分（4.x 使用 BINPATH，5.0 起使用 GCC_PATH）
+# 和 CFLAGS 的写法上
+MAKEFILE_VERSIONS = {
+    # STM32CubeMX 4.x（projectgenerator 2.x）
+    'cubemx-4': {
+        'generator': '2.26.0',
+        'date': 'Mon Jan 07 10:00:00 CST 2019',
+        'binaries': '''PREFIX = arm-none-eabi-
+BINPATH =
+CC = $(BINPATH)/$(PREFIX)gcc
+AS = $(BINPATH)/$(PREFIX)gcc -x assembler-with-cpp
+CP = $(BINPATH)/$(PREFIX)objcopy
+AR = $(BINPATH)/$(PREFIX)ar
+SZ = $(BINPATH)/$(PREFIX)size
+HEX = $(CP) -O ihex
+BIN = $(CP) -O binary -S
+''',
+        'cflags': 'CFLAGS = ',
+        'asmm': False,
+    },
+    # STM32CubeMX 5.x / 6.0 ~ 6.9（projectgenerator 3.x）
+    'cubemx-5': {
+        'generator': '3.10.0',
+        'date': 'Wed Mar 03 10:00:00 CST 2021',
+        'binaries': '''PREFIX = arm-none-eabi-
+# The gcc compiler bin path can be either defined in make command via GCC_PATH variable (> make GCC_PATH=xxx)
+# either it can be added to the PATH environment variable.
+ifdef GCC_PATH
+CC = $(GCC_PATH)/$(PREFIX)gcc
+AS = $(GCC_PATH)/$(PREFIX)gcc -x assembler-with-cpp
+CP = $(GCC_PATH)/$(PREFIX)objcopy
+SZ = $(GCC_PATH)/$(PREFIX)size
+else
+CC = $(PREFIX)gcc
+AS = $(PREFIX)gcc -x assembler-with-cpp
+CP = $(PREFIX)objcopy
+SZ = $(PREFIX)size
+endif
+HEX = $(CP) -O ihex
+BIN = $(CP) -O binary -S
+''',
+        'cflags': 'CFLAGS = ',
+        'asmm': False,
+    },
+    # STM32CubeMX 6.10 及以上（projectgenerator 4.x）
+    'cubemx-6': {
+        'generator': '4.3.0-B58',
+        'date': 'Mon Dec 01 10:00:00 CST 2025',
+        'binaries': '''PREFIX = arm-none-eabi-
+# The gcc compiler bin path can be either defined in make command via GCC_PATH variable (> make GCC_PATH=xxx)
+# either it can be added to the PATH environment variable.
+ifdef GCC_PATH
+CC = $(GCC_PATH)/$(PREFIX)gcc
+AS = $(GCC_PATH)/$(PREFIX)gcc -x assembler-with-cpp
+CP = $(GCC_PATH)/$(PREFIX)objcopy
+SZ = $(GCC_PATH)/$(PREFIX)size
+else
+CC = $(PREFIX)gcc
+AS = $(PREFIX)gcc -x assembler-with-cpp
+CP = $(PREFIX)objcopy
+SZ = $(PREFIX)size
+endif
+HEX = $(CP) -O ihex
+BIN = $(CP) -O binary -S
+''',
+        'cflags': 'CFLAGS += ',
+        'asmm': True,
+    },
+}
+
+# MCU 系列：(系列名, 启动文件, CPU, FPU, FLOAT-ABI, 芯片宏定义)
+MCU_FAMILIES = (
+    ('F1', 'startup_stm32f103xb.s', '-mcpu=cortex-m3', '', '', 'STM32F103xB'),
+    ('F4', 'startup_stm32f407xx.s', '-mcpu=cortex-m4', '-mfpu=fpv4-sp-d16', '-mfloat-abi=hard', 'STM32F407xx'),
+    ('G0', 'startup_stm32g071xx.s', '-mcpu=cortex-m0plus', '', '', 'STM32G071xx'),
+    ('H7', 'startup_stm32h743xx.s', '-mcpu=cortex-m7', '-mfpu=fpv5-d16', '-mfloat-abi=hard', 'STM32H743xx'),
+)
+
+HAL_MODULES = ('', '_cortex', '_rcc', '_rcc_ex', '_flash', '_flash_ex', '_gpio', '_gpio_ex', '_dma', '_pwr',
+               '_pwr_ex', '_exti', '_tim', '_tim_ex', '_uart', '_usart', '_spi', '_i2c', '_adc', '_adc_ex')
+
+# 手动修改过的 Makefile（在生成的 Makefile 上做的修改）
+MAKEFILE_EDITS = ('gcc-path', 'comments', 'serial', 'custom-rules')
+
+def _make_list(name, items):
+    """生成 make 续行列表"""
+    return f"{name} =  \\\n" + ' \\\n'.join(items) + '\n'
+
+def _source_list(family, count, rng):
+    """生成源文件列表：Core、HAL 驱动以及用于凑数的中间件文件"""
+    fam = family[0]
+    sources = [f"Core/Src/main.c", f"Core/Src/stm32{fam.lower()}xx_it.c", f"Core/Src/stm32{fam.lower()}xx_hal_msp.c"]
+    for module in HAL_MODULES:
+        sources.append(f"Drivers/STM32{fam}xx_HAL_Driver/Src/stm32{fam.lower()}xx_hal{module}.c")
+    sources.append(f"Core/Src/system_stm32{fam.lower()}xx.c")
+    i = 0
+    while len(sources) < count:
+        group = rng.choice(('Middlewares/Third_Party/FreeRTOS/Source', 'Middlewares/ST/STM32_USB_Device_Library/Core/Src',
+                            'Middlewares/Third_Party/LwIP/src/core', 'App/Src'))
+        sources.append(f"{group}/gen_{i:05d}.c")
+        i += 1
+    return sources[:max(count, 1)]
+
+def generate_makefile(version='cubemx-6', family=MCU_FAMILIES[0], sources=30, edit=None, seed=0):
+    """生成一个模拟 STM32CubeMX 生成的 Makefile"""
+    rng = random.Random(seed)
+    info = MAKEFILE_VERSIONS[version]
+    fam, startup, cpu, fpu, float_abi, chip = family
+    target = f"proj_{fam.lower()}_{seed}"
+
+    binaries = info['binaries']
+    if edit == 'comments':
+        # 在工具链部分插入注释和行尾空格
+        binaries = binaries.replace('ifdef GCC_PATH\n', 'ifdef GCC_PATH\n# use the toolchain from GCC_PATH  \n')
+        binaries = binaries.replace('PREFIX = arm-none-eabi-\n', 'PREFIX = arm-none-eabi-   \n# local note: keep PREFIX\n')
+
+    lines = [
+        '#' * 122,
+        f"# File automatically-generated by tool: [projectgenerator] version: [{info['generator']}] date: [{info['date']}] ",
+        '#' * 122,
+        '',
+        '# ------------------------------------------------',
+        '# Generic Makefile (based on gcc)',
+        '#',
+        '# ChangeLog :',
+        '#\t2017-02-10 - Several enhancements + project update mode',
+        '#   2015-07-22 - first version',
+        '# ------------------------------------------------',
+        '',
+        '######################################',
+        '# target',
+        '######################################',
+        f"TARGET = {target}",
+        '',
+        '',
+        '######################################',
+        '# building variables',
+        '######################################',
+        '# debug build?',
+        'DEBUG = 1',
+        '# optimization',
+        'OPT = -Og',
+        '',
+        '',
+    ]
+    if edit == 'gcc-path':
+        lines += ['# local toolchain', 'GCC_PATH = /opt/gcc-arm-none-eabi/bin', '']
+    lines += [
+        '#######################################',
+        '# paths',
+        '#######################################',
+        '# Build path',
+        'BUILD_DIR = build',
+        '',
+        '######################################',
+        '# source',
+        '######################################',
+        '# C sources',
+    ]
+    text = '\n'.join(lines) + '\n'
+    text += _make_list('C_SOURCES', _source_list(family, sources, rng))
+    text += '\n# ASM sources\n' + _make_list('ASM_SOURCES', [startup])
+    if info['asmm']:
+        text += '\n# ASM sources\nASMM_SOURCES = \n'
+    text += '\n\n#######################################\n# binaries\n#######################################\n'
+    text += binaries
+    text += f'''
+#######################################
+# CFLAGS
+#######################################
+# cpu
+CPU = {cpu}
+
+# fpu
+{('FPU = ' + fpu) if fpu else '# NONE for Cortex-M0/M0+/M3'}
+
+# float-abi
+{('FLOAT-ABI = ' + float_abi) if float_abi else ''}
+
+# mcu
+MCU = $(CPU) -mthumb $(FPU) $(FLOAT-ABI)
+
+# macros for gcc
+# AS defines
+AS_DEFS =
+
+# C defines
+C_DEFS =  \\
+-DUSE_HAL_DRIVER \\
+-D{chip}
+
+
+# AS includes
+AS_INCLUDES =
+
+# C includes
+C_INCLUDES =  \\
+-ICore/Inc \\
+-IDrivers/STM32{fam}xx_HAL_Driver/Inc \\
+-IDrivers/STM32{fam}xx_HAL_Driver/Inc/Legacy \\
+-IDrivers/CMSIS/Device/ST/STM32{fam}xx/Include \\
+-IDrivers/CMSIS/Include
+
+
+# compile gcc flags
+ASFLAGS = $(MCU) $(AS_DEFS) $(AS_INCLUDES) $(OPT) -Wall -fdata-sections -ffunction-sections
+
+{info['cflags']}$(MCU) $(C_DEFS) $(C_INCLUDES) $(OPT) -Wall -fdata-sections -ffunction-sections
+
+ifeq ($(DEBUG), 1)
+CFLAGS += -g -gdwarf-2
+endif
+'''
+    if edit == 'custom-rules':
+        text += '\n# project specific warnings\nCFLAGS += -Wextra -Wno-unused-parameter \\\n\t-Wshadow\n'
+    text += f'''
+
+# Generate dependency information
+CFLAGS += -MMD -MP -MF"$(@:%.o=%.d)"
+
+
+#######################################
+# LDFLAGS
+#######################################
+# link script
+LDSCRIPT = {chip.upper()}_FLASH.ld
+
+# libraries
+LIBS = -lc -lm -lnosys
+LIBDIR =
+LDFLAGS = $(MCU) -specs=nano.specs -T$(LDSCRIPT) $(LIBDIR) $(LIBS) -Wl,-Map=$(BUILD_DIR)/$(TARGET).map,--cref -Wl,--gc-sections
+
+# default action: build all
+all: $(BUILD_DIR)/$(TARGET).elf $(BUILD_DIR)/$(TARGET).hex $(BUILD_DIR)/$(TARGET).bin
+
+'''
+    if edit == 'serial':
+        text += '.NOTPARALLEL:\nMAKEFLAGS += -j1\n\n'
+    text += '''
+#######################################
+# build the application
+#######################################
+# list of objects
+OBJECTS = $(addprefix $(BUILD_DIR)/,$(notdir $(C_SOURCES:.c=.o)))
+vpath %.c $(sort $(dir $(C_SOURCES)))
+# list of ASM program objects
+OBJECTS += $(addprefix $(BUILD_DIR)/,$(notdir $(ASM_SOURCES:.s=.o)))
+vpath %.s $(sort $(dir $(ASM_SOURCES)))
+
+$(BUILD_DIR)/%.o: %.c Makefile | $(BUILD_DIR)
+\t$(CC) -c $(CFLAGS) -Wa,-a,-ad,-alms=$(BUILD_DIR)/$(notdir $(<:.c=.lst)) $< -o $@
+
+$(BUILD_DIR)/%.o: %.s Makefile | $(BUILD_DIR)
+\t$(AS) -c $(CFLAGS) $< -o $@
+
+$(BUILD_DIR)/$(TARGET).elf: $(OBJECTS) Makefile
+\t$(CC) $(OBJECTS) $(LDFLAGS) -o $@
+\t$(SZ) $@
+
+$(BUILD_DIR)/%.hex: $(BUILD_DIR)/%.elf | $(BUILD_DIR)
+\t$(HEX) $< $@
+\t
+$(BUILD_DIR)/%.bin: $(BUILD_DIR)/%.elf | $(BUILD_DIR)
+\t$(BIN) $< $@\t
+\t
+$(BUILD_DIR):
+\tmkdir $@\t\t
+
+#######################################
+# clean up
+#######################################
+clean:
+\t-rm -fR $(BUILD_DIR)
+'''
+    if edit == 'custom-rules':
+        text += '''
+#######################################
+# flash
+#######################################
+flash: all
+\topenocd -f interface/stlink.cfg -f target/stm32f1x.cfg -c "program $(BUILD_DIR)/$(TARGET).elf verify reset exit"
+'''
+    text += '''
+#######################################
+# dependencies
+#######################################
+-include $(wildcard $(BUILD_DIR)/*.d)
+
+# *** EOF ***
+'''
+    return text
+
+# STM32CubeMX CMake 工具链文件模板
+CMAKE_VERSIONS = ('cubemx-6.11', 'cubemx-6.13', 'no-compiler-id')
+CMAKE_EDITS = ('abs-prefix', 'comments', 'compact')
+
+def generate_cmake_toolchain(version='cubemx-6.13', family=MCU_FAMILIES[0], edit=None, seed=0):
+    """生成一个模拟 STM32CubeMX 生成的 gcc-arm-none-eabi.cmake"""
+    fam, startup, cpu, fpu, float_abi, chip = family
+    target_flags = ' '.join(flag for flag in (cpu, fpu, float_abi) if flag)
+    prefix = '/opt/gcc-arm-none-eabi/bin/arm-none-eabi-' if edit == 'abs-prefix' else 'arm-none-eabi-'
+
+    text = 'set(CMAKE_SYSTEM_NAME               Generic)\nset(CMAKE_SYSTEM_PROCESSOR          arm)\n\n'
+    if version != 'no-compiler-id':
+        text += 'set(CMAKE_C_COMPILER_ID GNU)\nset(CMAKE_CXX_COMPILER_ID GNU)\n\n'
+    text += '# Some default GCC settings\n# arm-none-eabi- must be part of path environment\n'
+    text += f'set(TOOLCHAIN_PREFIX                {prefix})\n'
+    if edit != 'compact':
+        text += '\n'
+    text += '''set(CMAKE_C_COMPILER                ${TOOLCHAIN_PREFIX}gcc)
+set(CMAKE_ASM_COMPILER              ${CMAKE_C_COMPILER})
+set(CMAKE_CXX_COMPILER              ${TOOLCHAIN_PREFIX}g++)
+set(CMAKE_LINKER                    ${TOOLCHAIN_PREFIX}g++)
+set(CMAKE_OBJCOPY                   ${TOOLCHAIN_PREFIX}objcopy)
+set(CMAKE_SIZE                      ${TOOLCHAIN_PREFIX}size)
+'''
+    if edit == 'comments':
+        text += '# local: map file is written next to the elf\n'
+    if edit != 'compact':
+        text += '\n'
+    text += f'''set(CMAKE_EXECUTABLE_SUFFIX_ASM     ".elf")
+set(CMAKE_EXECUTABLE_SUFFIX_C       ".elf")
+set(CMAKE_EXECUTABLE_SUFFIX_CXX     ".elf")
+
+set(CMAKE_TRY_COMPILE_TARGET_TYPE STATIC_LIBRARY)
+
+# MCU specific flags
+set(TARGET_FLAGS "{target_flags} ")
+
+set(CMAKE_C_FLAGS "${{CMAKE_C_FLAGS}} ${{TARGET_FLAGS}}")
+set(CMAKE_ASM_FLAGS "${{CMAKE_C_FLAGS}} -x assembler-with-cpp -MMD -MP")
+set(CMAKE_C_FLAGS "${{CMAKE_C_FLAGS}} -Wall -fdata-sections -ffunction-sections")
+
+set(CMAKE_C_FLAGS_DEBUG "-O0 -g3")
+set(CMAKE_C_FLAGS_RELEASE "-Os -g0")
+set(CMAKE_CXX_FLAGS_DEBUG "-O0 -g3")
+set(CMAKE_CXX_FLAGS_RELEASE "-Os -g0")
+
+set(CMAKE_CXX_FLAGS "${{CMAKE_CXX_FLAGS}} -fno-rtti -fno-exceptions -fno-threadsafe-statics")
+
+set(CMAKE_C_LINK_FLAGS "${{TARGET_FLAGS}}")
+set(CMAKE_C_LINK_FLAGS "${{CMAKE_C_LINK_FLAGS}} -T \\"${{CMAKE_SOURCE_DIR}}/{chip.upper()}_FLASH.ld\\"")
+set(CMAKE_C_LINK_FLAGS "${{CMAKE_C_LINK_FLAGS}} --specs=nano.specs")
+set(CMAKE_C_LINK_FLAGS "${{CMAKE_C_LINK_FLAGS}} -Wl,-Map=${{CMAKE_PROJECT_NAME}}.map -Wl,--gc-sections")
+'''
+    if version == 'cubemx-6.11':
+        text += 'set(CMAKE_C_LINK_FLAGS "${CMAKE_C_LINK_FLAGS} -Wl,--start-group -lc -lm -Wl,--end-group")\n'
+    else:
+        text += ('set(CMAKE_C_LINK_FLAGS "${CMAKE_C_LINK_FLAGS} -Wl,--start-group -lc -lm -Wl,--end-group")\n'
+                 'set(CMAKE_C_LINK_FLAGS "${CMAKE_C_LINK_FLAGS} -Wl,--print-memory-usage")\n')
+    text += '\nset(CMAKE_CXX_LINK_FLAGS "${CMAKE_C_LINK_FLAGS} -Wl,--start-group -lstdc++ -lsupc++ -Wl,--end-group")\n'
+    return text
+
+def _crlf(text):
+    return text.replace('\n', '\r\n')
+
+def corpus_cases(count, sources=30, seed=0):
+    """按顺序轮换各版本、MCU 系列、换行符和手动修改生成测试用例
+
+    生成 (工具, 用例名, 文件内容) ，每 10 个 Makefile 中有一个超长源文件列表。
+    """
+    rng = random.Random(seed)
+    for i in range(count):
+        family = MCU_FAMILIES[i % len(MCU_FAMILIES)]
+        crlf = i % 3 == 2
+        if i % 2 == 0:
+            version = list(MAKEFILE_VERSIONS)[(i // 2) % len(MAKEFILE_VERSIONS)]
+            edit = MAKEFILE_EDITS[(i // 2) % len(MAKEFILE_EDITS)] if i % 4 == 0 else None
+            n_sources = sources * 100 if i % 20 == 0 else sources + rng.randrange(sources + 1)
+            text = generate_makefile(version, family, n_sources, edit, seed=seed + i)
+            name = f"{i:05d}-{version}-{family[0]}-{edit or 'stock'}{'-crlf' if crlf else ''}"
+            yield 'makefile', name, _crlf(text) if crlf else text
+        else:
+            version = CMAKE_VERSIONS[(i // 2) % len(CMAKE_VERSIONS)]
+            edit = CMAKE_EDITS[(i // 2) % len(CMAKE_EDITS)] if i % 4 == 1 else None
+            text = generate_cmake_toolchain(version, family, edit, seed=seed + i)
+            name = f"{i:05d}-{version}-{family[0]}-{edit or 'stock'}{'-crlf' if crlf else ''}"
+            yield 'cmake', name, _crlf(text) if crlf else text
+
+def _case_filename(kind, name):
+    return os.path.join(name, 'Makefile' if kind == 'makefile' else 'gcc-arm-none-eabi.cmake')
+
+def write_corpus(directory, count, sources=30, seed=0):
+    """把测试用例写入目录，返回 [(工具, 用例名, 文件路径)]"""
+    files = []
+    for kind, name, text in corpus_cases(count, sources, seed):
+        path = os.path.join(directory, kind, _case_filename(kind, name))
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'w', encoding='utf-8', newline='') as f:
+            f.write(text)
+        files.append((kind, name, path))
+    return files
+
+# golden 用例：覆盖所有版本、手动修改和 CRLF 组合，另外加上常用选项组合
+GOLDEN_OPTIONS = {
+    'makefile': (
+        ('default', {}),
+        ('fast-release', {'fast_build': True, 'release_profile': 'size', 'compiler_cache': 'ccache'}),
+        ('web', {'web_assets': 'web'}),
+        ('profile', {'build_profile': True}),
+    ),
+    'cmake': (
+        ('default', {}),
+        ('cache-release', {'compiler_cache': 'ccache', 'release_profile': 'speed'}),
+        ('web', {'web_assets': 'web'}),
+        ('profile', {'build_profile': True}),
+    ),
+}
+
+def golden_cases():
+    """生成 golden 用例 (工具, 用例名, 文件内容, 选项)"""
+    cases = []
+    for version in MAKEFILE_VERSIONS:
+        for edit in (None,) + MAKEFILE_EDITS:
+            for crlf in (False, True):
+                # CRLF 用例与对应的 LF 用例只有换行符不同，golden 文件可以直接对比
+                text = generate_makefile(version, MCU_FAMILIES[0], 12, edit)
+                name = f"{version}-{edit or 'stock'}{'-crlf' if crlf else ''}"
+                cases.append(('makefile', name, _crlf(text) if crlf else text))
+    for version in CMAKE_VERSIONS:
+        for edit in (None,) + CMAKE_EDITS:
+            for crlf in (False, True):
+                text = generate_cmake_toolchain(version, MCU_FAMILIES[0], edit)
+                name = f"{version}-{edit or 'stock'}{'-crlf' if crlf else ''}"
+                cases.append(('cmake', name, _crlf(text) if crlf else text))
+    for kind, name, text in cases:
+        for option_name, options in GOLDEN_OPTIONS[kind]:
+            # 选项组合只用于未修改和串行构建的用例，避免用例数量成倍增加
+            if option_name != 'default' and not name.endswith(('-stock', '-serial')):
+                continue
+            yield kind, f"{name}.{option_name}", text, options
+
+@contextlib.contextmanager
+def quiet_stdout():
+    """屏蔽修复脚本的输出"""
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        yield
+
+def run_fixer(fixers, kind, path, options):
+    """调用修复函数（屏蔽其输出），返回是否成功"""
+    with quiet_stdout():
+        if kind == 'makefile':
+            return fixers[kind].fix_makefile(path, **options)
+        return fixers[kind].fix_cmake_toolchain(path, **options)
+
+def check_golden(update=False, verbose=False):
+    """逐字节对比修复结果与 golden 文件，update 为 True 时更新 golden 文件"""
+    fixers = {kind: load_fixer(kind) for kind in FIXER_PATHS}
+    failed = []
+    expected_files = set()
+    total = 0
+    with tempfile.TemporaryDirectory() as tmp:
+        for kind, name, text, options in golden_cases():
+            total += 1
+            path = os.path.join(tmp, kind, _case_filename(kind, name))
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, 'w', encoding='utf-8', newline='') as f:
+                f.write(text)
+            if not run_fixer(fixers, kind, path, options):
+                print_error(f"修复失败: {kind}/{name}")
+                failed.append(name)
+                continue
+            with open(path, 'rb') as f:
+                actual = f.read()
+            if name.split('.')[0].endswith('-crlf') and actual.replace(b'\r\n', b'').count(b'\n'):
+                print_error(f"修复后换行符不是 CRLF: {kind}/{name}")
+                failed.append(name)
+                continue
+
+            golden_path = os.path.join(GOLDEN_DIR, kind, name)
+            expected_files.add(os.path.normpath(golden_path))
+            if update:
+                os.makedirs(os.path.dirname(golden_path), exist_ok=True)
+                with open(golden_path, 'wb') as f:
+                    f.write(actual)
+                continue
+            try:
+                with open(golden_path, 'rb') as f:
+                    expected = f.read()
+            except OSError:
+                print_error(f"缺少 golden 文件: {golden_path}")
+                failed.append(name)
+                continue
+            if actual != expected:
+                print_error(f"结果与 golden 文件不一致: {kind}/{name}")
+                failed.append(name)
+                if verbose:
+                    diff = difflib.unified_diff(
+                        expected.decode('utf-8', 'replace').splitlines(True),
+                        actual.decode('utf-8', 'replace').splitlines(True),
+                        fromfile=f"golden/{kind}/{name}", tofile='actual')
+                    sys.stdout.writelines(list(diff)[:80])
+            elif verbose:
+                print_success(f"{kind}/{name}")
+
+    if update:
+        # 删除不再使用的 golden 文件
+        removed = 0
+        for kind in FIXER_PATHS:
+            kind_dir = os.path.join(GOLDEN_DIR, kind)
+            for filename in os.listdir(kind_dir) if os.path.isdir(kind_dir) else ():
+                if os.path.normpath(os.path.join(kind_dir, filename)) not in expected_files:
+                    os.remove(os.path.join(kind_dir, filename))
+                    removed += 1
+        print_success(f"已更新 {total - len(failed)} 个 golden 文件" + (f"，删除了 {removed} 个" if removed else ''))
+        return not failed
+
+    if failed:
+        print_error(f"{len(failed)}/{total} 个用例不一致（使用 -v 查看差异；确认修改正确后使用 --update-golden 更新）")
+        return False
+    print_success(f"全部 {total} 个用例与 golden 文件一致")
+    return True
+
+# 重复修复用例：同一个文件先后用不同的选项修复（STM32CubeMX 未重新生成时调整选项），
+# 结果必须与直接用最后一组选项修复原文件完全一致；固定工具链的路径不需要存在
+REFIX_OPTIONS = {
+    'makefile': (
+        ('default', {}),
+        ('pin', {'toolchain_pin': '/opt/arm-gnu-toolchain'}),
+        ('cache', {'compiler_cache': 'ccache'}),
+        ('fast', {'fast_build': True}),
+        ('release', {'release_profile': 'size'}),
+        ('profile', {'build_profile': True}),
+        ('web', {'web_assets': 'web'}),
+        ('all', {'toolchain_pin': '/opt/arm-gnu-toolchain', 'compiler_cache': 'ccache', 'fast_build': True,
+                 'release_profile': 'speed', 'build_profile': True, 'web_assets': 'www'}),
+    ),
+    'cmake': (
+        ('default', {}),
+        ('pin', {'toolchain_pin': '/opt/arm-gnu-toolchain'}),
+        ('cache', {'compiler_cache': 'ccache'}),
+        ('release', {'release_profile': 'size'}),
+        ('profile', {'build_profile': True}),
+        ('web', {'web_assets': 'web'}),
+        ('all', {'toolchain_pin': '/opt/arm-gnu-toolchain', 'compiler_cache': 'sccache',
+                 'release_profile': 'speed', 'build_profile': True, 'web_assets': 'www'}),
+    ),
+}
+
+def refix_sequences(kind):
+    """重复修复的选项序列：同一选项修复两次、默认 -> 选项、选项 -> 默认、选项 -> 其他选项"""
+    options = dict(REFIX_OPTIONS[kind])
+    names = list(options)
+    sequences = []
+    for name in names[1:]:
+        sequences += [('default', 'default'), (name, name), ('default', name), (name, 'default'),
+                      ('default', name, 'default')]
+        sequences += [(name, other) for other in names[1:] if other != name]
+    # 去重并保持顺序
+    sequences = list(dict.fromkeys(sequences))
+    return [(seq, [options[name] for name in seq]) for seq in sequences]
+
+def check_refix(verbose=False):
+    """检查重复修复和切换选项：结果必须与直接用最后一组选项修复原文件一致"""
+    fixers = {kind: load_fixer(kind) for kind in FIXER_PATHS}
+    cases = {}
+    for kind, name, text, options in golden_cases():
+        cases.setdefault((kind, name.rsplit('.', 1)[0]), text)
+    failed = []
+    total = 0
+    with tempfile.TemporaryDirectory() as tmp:
+        for (kind, name), text in cases.items():
+            expected = {}
+            for seq, options_list in refix_sequences(kind):
+                total += 1
+                label = f"{kind}/{name}: {' -> '.join(seq)}"
+                final = seq[-1]
+                if final not in expected:
+                    path = os.path.join(tmp, 'once', kind, _case_filename(kind, name))
+                    os.makedirs(os.path.dirname(path), exist_ok=True)
+                    with open(path, 'w', encoding='utf-8', newline='') as f:
+                        f.write(text)
+                    run_fixer(fixers, kind, path, options_list[-1])
+                    with open(path, 'rb') as f:
+                        expected[final] = f.read()
+
+                path = os.path.join(tmp, 'refix', kind, _case_filename(kind, name))
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                with open(path, 'w', encoding='utf-8', newline='') as f:
+                    f.write(text)
+                ok = all(run_fixer(fixers, kind, path, options) for options in options_list)
+                with open(path, 'rb') as f:
+                    actual = f.read()
+                if ok and actual == expected[final]:
+                    if verbose:
+                        print_success(label)
+                    continue
+                print_error(f"重复修复结果不一致: {label}" if ok else f"重复修复失败: {label}")
+                failed.append(label)
+                if verbose and ok:
+                    diff = difflib.unified_diff(
+                        expected[final].decode('utf-8', 'replace').splitlines(True),
+                        actual.decode('utf-8', 'replace').splitlines(True),
+                        fromfile=f"once/{final}", tofile='refix')
+                    sys.stdout.writelines(list(diff)[:80])
+
+    if failed:
+        print_error(f"{len(failed)}/{total} 个重复修复用例不一致")
+        return False
+    print_success(f"全部 {total} 个重复修复用例与直接修复的结果一致")
+    return True
+
+@contextlib.contextmanager
+def patched_environ(**values):
+    """临时修改环境变量（值为 None 表示删除），退出时恢复"""
+    saved = {name: os.environ.get(name) for name in values}
+    try:
+        for name, value in values.items():
+            if value is None:
+                os.environ.pop(name, None)
+            else:
+                os.environ[name] = value
+        yield
+    finally:
+        for name, value in saved.items():
+            if value is None:
+                os.environ.pop(name, None)
+            else:
+                os.environ[name] = value
+
+@contextlib.contextmanager
+def patched_attr(obj, name, value):
+    """临时替换模块属性，退出时恢复"""
+    saved = getattr(obj, name)
+    setattr(obj, name, value)
+    try:
+        yield
+    finally:
+        setattr(obj, name, saved)
+
+class CheckResults:
+    """逐项检查的结果：失败时立即输出，-v 时同时输出通过的项"""
+    def __init__(self, verbose=False):
+        self.verbose = verbose
+        self.total = 0
+        self.failed = []
+
+    def check(self, label, condition, detail=None):
+        self.total += 1
+        if condition:
+            if self.verbose:
+                print_success(label)
+            return True
+        print_error(f"{label}{f'（{detail}）' if detail else ''}")
+        self.failed.append(label)
+        return False
+
+# 模拟的 ARM GNU 工具链：arm-none-eabi-gcc 是一个 shell 脚本，按工具链目录中的
+# version / multilib 文件和 lib/ 下的库文件回答探测命令，每次调用都记录到 probe.log
+STUB_GCC = """#!/bin/sh
+root=$(cd "$(dirname "$0")/.." && pwd)
+echo "$*" >> "$root/probe.log"
+case "$1" in
+    --version) echo "arm-none-eabi-gcc (Stub Toolchain) $(cat "$root/version") 20240101" ;;
+    -print-multi-lib) cat "$root/multilib" ;;
+    -print-file-name=*)
+        name=${1#-print-file-name=}
+        if [ -f "$root/lib/$name" ]; then echo "$root/lib/$name"; else echo "$name"; fi ;;
+esac
+"""
+
+# (目录, 版本, multilib 数量, newlib, newlib-nano)，版本为 None 表示 gcc 无法运行；
+# 按推荐程度排序后的预期顺序见 STUB_TOOLCHAIN_ORDER
+STUB_TOOLCHAINS = (
+    ('a-old', '10.3.1', 3, True, True),
+    ('b-new', '14.2.1', 3, True, True),
+    ('c-no-newlib', '15.1.0', 3, False, False),
+    ('d-broken', None, 0, False, False),
+    ('vendor/e-one-multilib', '14.2.1', 1, True, True),
+)
+STUB_TOOLCHAIN_ORDER = ('b-new', 'a-old', 'vendor/e-one-multilib', 'c-no-newlib', 'd-broken')
+
+def write_stub_toolchains(root):
+    """在 root 下生成模拟工具链（另有一个指向 b-new 的符号链接，用于检查去重）"""
+    for name, version, multilibs, newlib, nano in STUB_TOOLCHAINS:
+        path = os.path.join(root, name)
+        os.makedirs(os.path.join(path, 'bin'))
+        os.makedirs(os.path.join(path, 'lib'))
+        gcc = os.path.join(path, 'bin', 'arm-none-eabi-gcc')
+        with open(gcc, 'w', encoding='utf-8') as f:
+            f.write(STUB_GCC)
+        if version is None:
+            continue  # 没有执行权限，探测时报错
+        os.chmod(gcc, 0o755)
+        with open(os.path.join(path, 'version'), 'w', encoding='utf-8') as f:
+            f.write(version)
+        with open(os.path.join(path, 'multilib'), 'w', encoding='utf-8') as f:
+            f.write('.;\n' + ''.join(f'thumb/v{7 + i}-m;@mthumb@march=armv{7 + i}-m\n'
+                                     for i in range(multilibs - 1)))
+        for lib, present in (('libc.a', newlib), ('nano.specs', nano)):
+            if present:
+                open(os.path.join(path, 'lib', lib), 'w').close()
+    os.symlink(os.path.join(root, 'b-new'), os.path.join(root, 'z-link-to-b-new'))
+
+def _probe_count(path):
+    try:
+        with open(os.path.join(path, 'probe.log'), encoding='utf-8') as f:
+            return len(f.readlines())
+    except OSError:
+        return 0
+
+def check_toolchains(verbose=False):
+    """用模拟工具链检查工具链发现顺序、探测缓存失效和 --pin-toolchain 生成的配置"""
+    if os.name == 'nt':
+        print_warning("模拟工具链使用 shell 脚本，Windows 上跳过工具链发现检查")
+        return True
+    fixers = {kind: load_fixer(kind) for kind in FIXER_PATHS}
+    results = CheckResults(verbose)
+    for kind, fixer in fixers.items():
+        with tempfile.TemporaryDirectory() as tmp:
+            root = os.path.join(tmp, 'toolchains')
+            write_stub_toolchains(root)
+            roots = [(root, 2)]
+            paths = {name: os.path.join(root, name) for name in STUB_TOOLCHAIN_ORDER}
+            with patched_environ(CUBEMX_FIX_CACHE_DIR=os.path.join(tmp, 'cache')):
+                # 发现顺序：可用 > newlib > newlib-nano > multilib 数量 > 版本号，符号链接去重
+                infos = fixer.discover_toolchains(roots)
+                order = tuple(os.path.relpath(info['path'], root) for info in infos)
+                results.check(f"{kind}: 工具链发现顺序", order == STUB_TOOLCHAIN_ORDER,
+                              f"实际: {', '.join(order)}")
+                results.check(f"{kind}: 无法运行的工具链带有错误信息", bool(infos) and infos[-1]['error'] is not None)
+
+                # 第二次发现全部使用缓存，不再调用 gcc
+                calls = {name: _probe_count(path) for name, path in paths.items()}
+                fixer.discover_toolchains(roots)
+                results.check(f"{kind}: 探测结果使用缓存",
+                              all(_probe_count(path) == calls[name] for name, path in paths.items()))
+
+                # 只修改版本文件时 gcc 没有变化，仍使用缓存；gcc 的 mtime 变化后重新探测
+                with open(os.path.join(paths['b-new'], 'version'), 'w', encoding='utf-8') as f:
+                    f.write('14.3.1')
+                info = next(i for i in fixer.discover_toolchains(roots) if i['path'] == paths['b-new'])
+                results.check(f"{kind}: gcc 未变化时不重新探测", info['version'] == '14.2.1',
+                              f"版本: {info['version']}")
+                gcc = os.path.join(paths['b-new'], 'bin', 'arm-none-eabi-gcc')
+                st = os.stat(gcc)
+                os.utime(gcc, ns=(st.st_atime_ns, st.st_mtime_ns + 10 ** 9))
+                calls = {name: _probe_count(path) for name, path in paths.items()}
+                info = next(i for i in fixer.discover_toolchains(roots) if i['path'] == paths['b-new'])
+                results.check(f"{kind}: gcc 的 mtime 变化后重新探测", info['version'] == '14.3.1',
+                              f"版本: {info['version']}")
+                others = [name for name in paths if name not in ('b-new', 'd-broken')]
+                results.check(f"{kind}: 只重新探测变化的工具链",
+                              all(_probe_count(paths[name]) == calls[name] for name in others))
+
+                # --pin-toolchain：自动选择推荐的工具链，写入的配置与指纹一致
+                with patched_attr(fixer, 'toolchain_search_roots', lambda: roots), quiet_stdout():
+                    pin = fixer.resolve_toolchain_pin('auto')
+                results.check(f"{kind}: --pin-toolchain 自动选择推荐的工具链",
+                              pin == os.path.abspath(paths['b-new']), f"实际: {pin}")
+                text = generate_makefile() if kind == 'makefile' else generate_cmake_toolchain()
+                path = os.path.join(tmp, 'project', _case_filename(kind, 'pin'))
+                os.makedirs(os.path.dirname(path))
+                with open(path, 'w', encoding='utf-8') as f:
+                    f.write(text)
+                fixed = run_fixer(fixers, kind, path, {'toolchain_pin': pin})
+                with open(path, encoding='utf-8') as f:
+                    content = f.read()
+                results.check(f"{kind}: --pin-toolchain 写入固定工具链配置",
+                              fixed and fixer.TOOLCHAIN_PIN_CONFIG.format(path=pin) in content)
+                status = fixer.get_fix_status(path, fixer.toolchain_fingerprint(toolchain_pin=pin))
+                results.check(f"{kind}: --pin-toolchain 修复后指纹为最新", status == 'current',
+                              f"状态: {status}")
+
+                # 指定的目录不是工具链、或找不到可用的工具链时退出
+                for label, value, search in (('无效目录', os.path.join(root, 'd-broken', 'bin'), roots),
+                                             ('没有工具链', 'auto', [])):
+                    with patched_attr(fixer, 'toolchain_search_roots', lambda: search), quiet_stdout():
+                        try:
+                            fixer.resolve_toolchain_pin(value)
+                            exited = False
+                        except SystemExit as e:
+                            exited = e.code == 1
+                    results.check(f"{kind}: --pin-toolchain {label}时退出", exited)
+
+    if results.failed:
+        print_error(f"{len(results.failed)}/{results.total} 项工具链检查失败")
+        return False
+    print_success(f"全部 {results.total} 项工具链发现、探测缓存和 --pin-toolchain 检查通过")
+    return True
+
+# 模拟的 cmake：检查工具链文件中的 if/function/foreach 是否配对（STM32CubeMX 原始文件和
+# 修复结果都不应出错），执行 CMakeLists.txt 中的 message(FATAL_ERROR ...)，
+# "# stub-sleep 秒数" 用于模拟耗时的配置和超时
+STUB_CMAKE = r"""#!@PYTHON@
+import os, re, sys, time
+args = sys.argv[1:]
+source = args[args.index('-S') + 1]
+build = args[args.index('-B') + 1]
+toolchain = next(a.split('=', 1)[1] for a in args if a.startswith('-DCMAKE_TOOLCHAIN_FILE='))
+open(os.path.join(build, 'CMakeCache.txt'), 'w').close()
+
+blocks = {'endif': 'if', 'endfunction': 'function', 'endforeach': 'foreach'}
+stack = []
+with open(toolchain, encoding='utf-8') as f:
+    for number, line in enumerate(f, 1):
+        m = re.match(r'\s*(\w+)\s*\(', line)
+        command = m.group(1).lower() if m else ''
+        if command in blocks.values():
+            stack.append((command, number))
+        elif command in blocks:
+            if not stack or stack[-1][0] != blocks[command]:
+                print(f"CMake Error at {toolchain}:{number} ({command}):")
+                print("  Flow control statements are not properly nested.")
+                print("\n\n-- Configuring incomplete, errors occurred!")
+                sys.exit(1)
+            stack.pop()
+if stack:
+    command, number = stack[-1]
+    print(f"CMake Error in {toolchain}:")
+    print("  A logical block opening on the line")
+    print(f"\n    {toolchain}:{number} ({command})\n")
+    print("  is not closed.")
+    print("\n\n-- Configuring incomplete, errors occurred!")
+    sys.exit(1)
+
+with open(os.path.join(source, 'CMakeLists.txt'), encoding='utf-8') as f:
+    for number, line in enumerate(f, 1):
+        m = re.match(r'\s*# stub-sleep ([\d.]+)', line)
+        if m:
+            time.sleep(float(m.group(1)))
+        m = re.match(r'\s*message\(FATAL_ERROR "(.*)"\)', line)
+        if m:
+            print(f"CMake Error at {source}/CMakeLists.txt:{number} (message):")
+            print(f"  {m.group(1)}")
+            print("\n\n-- Configuring incomplete, errors occurred!")
+            sys.exit(1)
+print("-- Configuring done")
+print("-- Generating done")
+print(f"-- Build files have been written to: {build}")
+"""
+
+VERIFY_TIMEOUT_CHECK = 2  # 秒，--verify 检查使用的超时时间
+VERIFY_CMAKELISTS = 'cmake_minimum_required(VERSION 3.22)\nproject(demo C ASM)\n{extra}add_executable(demo main.c)\n'
+
+def stack_toolchain_block(text):
+    """模拟旧版本重复修复时叠加的配置：在生成的配置前面再插入一份，只到未闭合的 if(TOOLCHAIN_DIR)"""
+    lines = text.splitlines(True)
+    marker = next(i for i, line in enumerate(lines) if line.startswith('# cubemx-fix: toolchain'))
+    prefix_if = next(i for i in range(marker, len(lines)) if lines[i].strip() == 'if(TOOLCHAIN_DIR)')
+    return ''.join(lines[:marker] + lines[marker:prefix_if + 1] + lines[marker:])
+
+def write_verify_project(root, name, toolchain_text, extra=''):
+    """生成一个带工具链文件的 CMake 项目，返回工具链文件路径"""
+    project = os.path.join(root, name)
+    path = os.path.join(project, 'cmake', 'gcc-arm-none-eabi.cmake')
+    os.makedirs(os.path.dirname(path))
+    with open(os.path.join(project, 'CMakeLists.txt'), 'w', encoding='utf-8') as f:
+        f.write(VERIFY_CMAKELISTS.format(extra=extra))
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(toolchain_text)
+    return path
+
+def check_verify(verbose=False):
+    """用模拟的 cmake 检查 --verify：配置失败、超时、叠加的工具链配置和并行验证报告"""
+    if os.name == 'nt':
+        print_warning("模拟的 cmake 使用 shebang 脚本，Windows 上跳过 --verify 检查")
+        return True
+    fixers = {kind: load_fixer(kind) for kind in FIXER_PATHS}
+    fixer = fixers['cmake']
+    results = CheckResults(verbose)
+    with tempfile.TemporaryDirectory() as tmp:
+        bin_dir = os.path.join(tmp, 'bin')
+        os.makedirs(bin_dir)
+        cmake = os.path.join(bin_dir, 'cmake')
+        with open(cmake, 'w', encoding='utf-8') as f:
+            f.write(STUB_CMAKE.replace('@PYTHON@', sys.executable))
+        os.chmod(cmake, 0o755)
+        work_dir = os.path.join(tmp, 'work')
+        os.makedirs(work_dir)
+
+        # 修复后的工具链文件
+        original = os.path.join(tmp, 'original.cmake')
+        with open(original, 'w', encoding='utf-8') as f:
+            f.write(generate_cmake_toolchain())
+        run_fixer(fixers, 'cmake', original, {})
+        with open(original, encoding='utf-8') as f:
+            fixed = f.read()
+
+        root = os.path.join(tmp, 'projects')
+        files = {
+            'ok-1': write_verify_project(root, 'ok-1', fixed, '# stub-sleep 0.5\n'),
+            'ok-2': write_verify_project(root, 'ok-2', fixed, '# stub-sleep 0.5\n'),
+            'fatal': write_verify_project(root, 'fatal', fixed, 'message(FATAL_ERROR "stub configure failure")\n'),
+            'stacked': write_verify_project(root, 'stacked', stack_toolchain_block(fixed)),
+            'hang': write_verify_project(root, 'hang', fixed, '# stub-sleep 60\n'),
+        }
+        path_env = bin_dir + os.pathsep + os.environ.get('PATH', '')
+        with patched_environ(PATH=path_env), patched_attr(tempfile, 'tempdir', work_dir), quiet_stdout():
+            start = time.perf_counter()
+            verified = fixer.verify_projects(list(files.values()), jobs=len(files), timeout=VERIFY_TIMEOUT_CHECK)
+            elapsed = time.perf_counter() - start
+        by_name = {os.path.basename(result['project'] or ''): result for result in verified}
+
+        results.check("--verify: 每个项目一个结果，按工具链文件路径排序",
+                      [r['toolchain'] for r in verified] == sorted(os.path.abspath(p) for p in files.values()))
+        for name in ('ok-1', 'ok-2'):
+            result = by_name.get(name, {})
+            results.check(f"--verify: {name} 配置通过", result.get('ok') and not result.get('errors'),
+                          '; '.join(result.get('errors', [])))
+        result = by_name.get('fatal', {})
+        results.check("--verify: 配置失败时报告 CMake Error 段落",
+                      not result.get('ok') and result.get('errors', [''])[0].startswith('CMake Error at') and
+                      any('stub configure failure' in line for line in result.get('errors', [])))
+        result = by_name.get('stacked', {})
+        results.check("--verify: 叠加的工具链配置（未闭合的 if）报告为失败",
+                      not result.get('ok') and any('is not closed' in line for line in result.get('errors', [])))
+        result = by_name.get('hang', {})
+        results.check("--verify: 超时的项目报告为失败",
+                      not result.get('ok') and result.get('errors') == [f'配置超时（{VERIFY_TIMEOUT_CHECK} 秒）'] and
+                      result.get('time', 0) < VERIFY_TIMEOUT_CHECK + 5, f"耗时 {result.get('time', 0):.2f}s")
+        results.check("--verify: 多个项目并行配置", elapsed < sum(r['time'] for r in verified),
+                      f"总耗时 {elapsed:.2f}s")
+        results.check("--verify: 删除临时构建目录", not os.listdir(work_dir))
+
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output):
+            passed = fixer.print_verify_report(verified, elapsed)
+        report = output.getvalue()
+        results.check("--verify: 报告列出全部项目和失败原因",
+                      not passed and all(os.path.dirname(os.path.dirname(p)) in report for p in files.values()) and
+                      '3 个项目配置失败，2 个通过' in report and 'stub configure failure' in report)
+
+        # 命令行：修复后验证；叠加的配置带有最新的指纹标记，不加 --force 时跳过修复，由验证发现问题
+        toolchains = os.path.join(tmp, 'toolchains')
+        write_stub_toolchains(toolchains)
+        env = dict(os.environ, PATH=path_env, ARM_TOOLCHAIN_PATH=os.path.join(toolchains, 'b-new'),
+                   CUBEMX_FIX_CACHE_DIR=os.path.join(tmp, 'cache'))
+        stacked = write_verify_project(root, 'cli-stacked', stack_toolchain_block(fixed))
+        # 带有旧指纹标记但找不到工具链配置的文件：自动重新修复会失败
+        broken = write_verify_project(root, 'cli-broken',
+                                      '# cubemx-fix: toolchain v1 0000000000000000\nset(CMAKE_SYSTEM_NAME Generic)\n')
+        unchanged = write_verify_project(root, 'cli-jobs', generate_cmake_toolchain())
+        for label, path, extra_args, passed, expected in (
+                ('修复并验证', write_verify_project(root, 'cli', generate_cmake_toolchain()), [], True,
+                 '全部 1 个项目配置通过'),
+                ('验证发现叠加的工具链配置', stacked, [], False, 'is not closed'),
+                ('使用 --force 修复叠加的工具链配置后验证通过', stacked, ['--force'], True, '全部 1 个项目配置通过'),
+                ('修复失败的文件在报告中列为失败', broken, [], False, '修复工具链文件失败'),
+                ('--jobs 无效时不修改文件', unchanged, ['--jobs', '0'], False, '--jobs 必须大于 0')):
+            process = subprocess.run([sys.executable, os.path.normpath(FIXER_PATHS['cmake']), path, '--verify'] +
+                                     extra_args, stdin=subprocess.DEVNULL, stdout=subprocess.PIPE,
+                                     stderr=subprocess.STDOUT, encoding='utf-8', errors='replace', env=env,
+                                     timeout=120)
+            ok = results.check(f"--verify: 命令行{label}",
+                               (process.returncode == 0) == passed and expected in process.stdout,
+                               f"返回值 {process.returncode}")
+            if verbose and not ok:
+                print(process.stdout)
+        with open(unchanged, encoding='utf-8') as f:
+            results.check("--verify: --jobs 无效时在修复前退出", f.read() == generate_cmake_toolchain())
+
+    if results.failed:
+        print_error(f"{len(results.failed)}/{results.total} 项 --verify 检查失败")
+        return False
+    print_success(f"全部 {results.total} 项 --verify 检查通过")
+    return True
+
+def run_benchmark(count, sources=30, repeat=3, seed=0):
+    """测量两个修复函数每秒处理的文件数（取多次运行中最快的一次）"""
+    fixers = {kind: load_fixer(kind) for kind in FIXER_PATHS}
+    with tempfile.TemporaryDirectory() as tmp:
+        corpus_dir = os.path.join(tmp, 'corpus')
+        print_info(f"生成测试用例: {count} 个文件（每个 Makefile 约 {sources}~{sources * 2} 个源文件，"
+                   f"每 20 个中有一个 {sources * 100} 个源文件）")
+        files = write_corpus(corpus_dir, count, sources, seed)
+
+        for kind in FIXER_PATHS:
+            kind_files = [(name, path) for k, name, path in files if k == kind]
+            if not kind_files:
+                continue
+            total_bytes = sum(os.path.getsize(path) for _, path in kind_files)
+            best = None
+            failures = 0
+            for _ in range(repeat):
+                # 每次运行前恢复未修复的文件，复制时间不计入
+                work_dir = os.path.join(tmp, 'work')
+                shutil.rmtree(work_dir, ignore_errors=True)
+                shutil.copytree(os.path.join(corpus_dir, kind), work_dir)
+                work_files = [os.path.join(work_dir, os.path.relpath(path, os.path.join(corpus_dir, kind)))
+                              for _, path in kind_files]
+                failures = 0
+                start = time.perf_counter()
+                for path in work_files:
+                    if not run_fixer(fixers, kind, path, {}):
+                        failures += 1
+                elapsed = time.perf_counter() - start
+                best = elapsed if best is None else min(best, elapsed)
+            rate = len(kind_files) / best if best else float('inf')
+            print_success(f"{kind:>8}: {len(kind_files)} 个文件，{best:.3f}s，{rate:.0f} 个文件/秒，"
+                          f"{total_bytes / best / 1024 / 1024:.1f} MB/s")
+            if failures:
+                print_warning(f"{kind:>8}: {failures} 个文件修复失败")
+    return True
+
+def parse_args(argv=None):
+    """解析命令行参数"""
+    parser = argparse.ArgumentParser(
+        description="STM32CubeMX 修复脚本基准测试与回归检查工具",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+使用示例:
+  python3 fix_cubemx_bench.py --check
+  python3 fix_cubemx_bench.py --check -v
+  python3 fix_cubemx_bench.py --update-golden
+  python3 fix_cubemx_bench.py --bench --count 2000 --sources 40
+  python3 fix_cubemx_bench.py --generate /tmp/corpus --count 500
+        """
+    )
+    parser.add_argument('--check', action='store_true',
+                        help='逐字节对比修复结果与 golden 文件（默认操作）')
+    parser.add_argument('--update-golden', action='store_true',
+                        help='用当前修复结果更新 golden 文件')
+    parser.add_argument('--bench', action='store_true',
+                        help='测量 fix_makefile / fix_cmake_toolchain 每秒处理的文件数')
+    parser.add_argument('--generate', metavar='DIR',
+                        help='把测试用例写入目录后退出')
+    parser.add_argument('--count', type=int, default=1000, metavar='N',
+                        help='生成的文件数量（默认: 1000，Makefile 和工具链文件各一半）')
+    parser.add_argument('--sources', type=int, default=30, metavar='N',
+                        help='Makefile 的基础源文件数量（默认: 30）')
+    parser.add_argument('--repeat', type=int, default=3, metavar='N',
+                        help='基准测试重复次数，取最快的一次（默认: 3）')
+    parser.add_argument('--seed', type=int, default=0,
+                        help='随机种子（默认: 0，相同种子生成相同的用例）')
+    parser.add_argument('-v', '--verbose', action='store_true',
+                        help='输出每个用例的结果和差异')
+    return parser.parse_args(argv)
+
+def main():
+    """主函数"""
+    args = parse_args()
+
+    if args.generate:
+        files = write_corpus(args.generate, args.count, args.sources, args.seed)
+        print_success(f"已生成 {len(files)} 个测试文件到: {args.generate}")
+        sys.exit(0)
+
+    if args.update_golden:
+        sys.exit(0 if check_golden(update=True) else 1)
+
+    ok = True
+    if args.bench:
+        ok = run_benchmark(args.count, args.sources, args.repeat, args.seed)
+    if args.check or not args.bench:
+        ok = check_golden(verbose=args.verbose) and ok
+        ok = check_refix(verbose=args.verbose) and ok
+        ok = check_toolchains(verbose=args.verbose) and ok
+        ok = check_verify(verbose=args.verbose) and ok
+    sys.exit(0 if ok else 1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,83 @@
+set(CMAKE_SYSTEM_NAME               Generic)
+set(CMAKE_SYSTEM_PROCESSOR          arm)
+
+set(CMAKE_C_COMPILER_ID GNU)
+set(CMAKE_CXX_COMPILER_ID GNU)
+# cubemx-fix: toolchain v1 f988d720dea970e1（自动生成的标记，请勿修改）
+# 编译耗时统计（记录到构建目录的 build-profile.jsonl）
+# 统计脚本默认为项目中的 tools/fix_cubemx_cmake.py（找不到时不统计），可通过环境变量 CUBEMX_PROFILE_SCRIPT 或 -DCUBEMX_PROFILE_SCRIPT=... 指定
+option(CUBEMX_BUILD_PROFILE "Record per-file compile time into build-profile.jsonl" ON)
+if(DEFINED ENV{CUBEMX_PROFILE_SCRIPT})
+    set(CUBEMX_PROFILE_SCRIPT "$ENV{CUBEMX_PROFILE_SCRIPT}" CACHE FILEPATH "Script recording per-file compile time")
+else()
+    set(CUBEMX_PROFILE_SCRIPT "tools/fix_cubemx_cmake.py" CACHE FILEPATH "Script recording per-file compile time, relative to the project source directory")
+endif()
+if(CUBEMX_BUILD_PROFILE AND NOT "--profile-exec" IN_LIST CMAKE_C_COMPILER_LAUNCHER)
+    get_filename_component(_cubemx_profile_script "${CUBEMX_PROFILE_SCRIPT}" ABSOLUTE BASE_DIR "${CMAKE_SOURCE_DIR}")
+    find_program(CUBEMX_PYTHON NAMES python3 python)
+    if(CUBEMX_PYTHON AND EXISTS "${_cubemx_profile_script}")
+        set(CUBEMX_BUILD_PROFILER "${CUBEMX_PYTHON}" "${_cubemx_profile_script}" --profile-exec "${CMAKE_BINARY_DIR}/build-profile.jsonl" --)
+        list(PREPEND CMAKE_C_COMPILER_LAUNCHER ${CUBEMX_BUILD_PROFILER})
+        list(PREPEND CMAKE_CXX_COMPILER_LAUNCHER ${CUBEMX_BUILD_PROFILER})
+    endif()
+endif()
+
+# 工具链路径配置（优先级：环境变量 > 相对路径 > 系统 PATH）
+# 优先级1：使用环境变量指定的工具链（推荐，支持全局配置）
+if(DEFINED ENV{ARM_TOOLCHAIN_PATH})
+    # 使用环境变量指定的工具链路径
+    set(TOOLCHAIN_DIR $ENV{ARM_TOOLCHAIN_PATH})
+    message(STATUS "Using toolchain from environment: ${TOOLCHAIN_DIR}")
+elseif(EXISTS "${CMAKE_CURRENT_LIST_DIR}/../../toolchain")
+    # 回退到相对路径（兼容旧项目结构）
+    get_filename_component(TOOLCHAIN_DIR "${CMAKE_CURRENT_LIST_DIR}/../../toolchain" ABSOLUTE)
+    message(STATUS "Using toolchain from relative path: ${TOOLCHAIN_DIR}")
+else()
+    # 尝试使用系统 PATH 中的工具链（可能缺少 newlib）
+    set(TOOLCHAIN_DIR "")
+    message(WARNING "ARM_TOOLCHAIN_PATH environment variable not set and ../../toolchain not found. Trying system PATH.")
+    message(WARNING "If compilation fails, set ARM_TOOLCHAIN_PATH environment variable to point to ARM GNU Toolchain with newlib.")
+endif()
+
+# 设置工具链前缀
+if(TOOLCHAIN_DIR)
+    set(TOOLCHAIN_PREFIX                ${TOOLCHAIN_DIR}/bin/arm-none-eabi-)
+else()
+    set(TOOLCHAIN_PREFIX                arm-none-eabi-)
+endif()
+
+set(CMAKE_C_COMPILER                ${TOOLCHAIN_PREFIX}gcc)
+set(CMAKE_ASM_COMPILER              ${CMAKE_C_COMPILER})
+set(CMAKE_CXX_COMPILER              ${TOOLCHAIN_PREFIX}g++)
+set(CMAKE_LINKER                    ${TOOLCHAIN_PREFIX}g++)
+set(CMAKE_OBJCOPY                   ${TOOLCHAIN_PREFIX}objcopy)
+set(CMAKE_SIZE                      ${TOOLCHAIN_PREFIX}size)
+
+set(CMAKE_EXECUTABLE_SUFFIX_ASM     ".elf")
+set(CMAKE_EXECUTABLE_SUFFIX_C       ".elf")
+set(CMAKE_EXECUTABLE_SUFFIX_CXX     ".elf")
+
+set(CMAKE_TRY_COMPILE_TARGET_TYPE STATIC_LIBRARY)
+
+# MCU specific flags
+set(TARGET_FLAGS "-mcpu=cortex-m3 ")
+
+set(CMAKE_C_FLAGS "${CMAKE_C_FLAGS} ${TARGET_FLAGS}")
+set(CMAKE_ASM_FLAGS "${CMAKE_C_FLAGS} -x assembler-with-cpp -MMD -MP")
+set(CMAKE_C_FLAGS "${CMAKE_C_FLAGS} -Wall -fdata-sections -ffunction-sections")
+
+set(CMAKE_C_FLAGS_DEBUG "-O0 -g3")
+set(CMAKE_C_FLAGS_RELEASE "-Os -g0")
+set(CMAKE_CXX_FLAGS_DEBUG "-O0 -g3")
+set(CMAKE_CXX_FLAGS_RELEASE "-Os -g0")
+
+set(CMAKE_CXX_FLAGS "${CMAKE_CXX_FLAGS} -fno-rtti -fno-exceptions -fno-threadsafe-statics")
+
+set(CMAKE_C_LINK_FLAGS "${TARGET_FLAGS}")
+set(CMAKE_C_LINK_FLAGS "${CMAKE_C_LINK_FLAGS} -T \"${CMAKE_SOURCE_DIR}/STM32F103XB_FLASH.ld\"")
+set(CMAKE_C_LINK_FLAGS "${CMAKE_C_LINK_FLAGS} --specs=nano.specs")
+set(CMAKE_C_LINK_FLAGS "${CMAKE_C_LINK_FLAGS} -Wl,-Map=${CMAKE_PROJECT_NAME}.map -Wl,--gc-sections")
+set(CMAKE_C_LINK_FLAGS "${CMAKE_C_LINK_FLAGS} -Wl,--start-group -lc -lm -Wl,--end-group")
+set(CMAKE_C_LINK_FLAGS "${CMAKE_C_LINK_FLAGS} -Wl,--print-memory-usage")
+
+set(CMAKE_CXX_LINK_FLAGS "${CMAKE_C_LINK_FLAGS} -Wl,--start-group -lstdc++ -lsupc++ -Wl,--end-group")
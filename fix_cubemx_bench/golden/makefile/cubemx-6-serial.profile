@@ -0,0 +1,209 @@
+##########################################################################################################################
+# File automatically-generated by tool: [projectgenerator] version: [4.3.0-B58] date: [Mon Dec 01 10:00:00 CST 2025] 
+##########################################################################################################################
+
+# ------------------------------------------------
+# Generic Makefile (based on gcc)
+#
+# ChangeLog :
+#	2017-02-10 - Several enhancements + project update mode
+#   2015-07-22 - first version
+# ------------------------------------------------
+
+######################################
+# target
+######################################
+TARGET = proj_f1_0
+
+
+######################################
+# building variables
+######################################
+# debug build?
+DEBUG = 1
+# optimization
+OPT = -Og
+
+
+#######################################
+# paths
+#######################################
+# Build path
+BUILD_DIR = build
+
+######################################
+# source
+######################################
+# C sources
+C_SOURCES =  \
+Core/Src/main.c \
+Core/Src/stm32f1xx_it.c \
+Core/Src/stm32f1xx_hal_msp.c \
+Drivers/STM32F1xx_HAL_Driver/Src/stm32f1xx_hal.c \
+Drivers/STM32F1xx_HAL_Driver/Src/stm32f1xx_hal_cortex.c \
+Drivers/STM32F1xx_HAL_Driver/Src/stm32f1xx_hal_rcc.c \
+Drivers/STM32F1xx_HAL_Driver/Src/stm32f1xx_hal_rcc_ex.c \
+Drivers/STM32F1xx_HAL_Driver/Src/stm32f1xx_hal_flash.c \
+Drivers/STM32F1xx_HAL_Driver/Src/stm32f1xx_hal_flash_ex.c \
+Drivers/STM32F1xx_HAL_Driver/Src/stm32f1xx_hal_gpio.c \
+Drivers/STM32F1xx_HAL_Driver/Src/stm32f1xx_hal_gpio_ex.c \
+Drivers/STM32F1xx_HAL_Driver/Src/stm32f1xx_hal_dma.c
+
+# ASM sources
+ASM_SOURCES =  \
+startup_stm32f103xb.s
+
+# ASM sources
+ASMM_SOURCES = 
+
+
+#######################################
+# binaries
+#######################################
+# cubemx-fix: toolchain v1 ea6cc921477f1fcc（自动生成的标记，请勿修改）
+# 工具链路径配置（优先级：环境变量 > GCC_PATH > 系统 PATH）
+# 优先级1：使用环境变量指定的工具链（推荐，支持全局配置）
+ifdef ARM_TOOLCHAIN_PATH
+    # 使用环境变量指定的工具链（推荐）
+    TOOLCHAIN_DIR = $(ARM_TOOLCHAIN_PATH)
+    PREFIX = $(TOOLCHAIN_DIR)/bin/arm-none-eabi-
+    $(info Using toolchain from environment: $(TOOLCHAIN_DIR))
+else ifdef GCC_PATH
+    # 使用 GCC_PATH 变量指定的路径（兼容原有方式）
+    TOOLCHAIN_DIR = $(GCC_PATH)
+    PREFIX = $(TOOLCHAIN_DIR)/$(if $(findstring /bin,$(GCC_PATH)),,bin/)arm-none-eabi-
+    $(info Using toolchain from GCC_PATH: $(TOOLCHAIN_DIR))
+else
+    # 使用系统 PATH 中的工具链（可能缺少 newlib）
+    PREFIX = arm-none-eabi-
+    TOOLCHAIN_DIR = 
+    $(info Using toolchain from system PATH)
+    $(warning WARNING: Using system PATH toolchain. If compilation fails, set ARM_TOOLCHAIN_PATH environment variable.)
+    # 验证工具链是否存在
+    ifeq ($(shell which $(PREFIX)gcc),)
+        $(error Cannot find ARM toolchain. Please set ARM_TOOLCHAIN_PATH environment variable or place toolchain in ../toolchain)
+    endif
+endif
+
+# 编译耗时统计（记录到 $(BUILD_PROFILE)，make BUILD_PROFILE= 可临时关闭）
+# 统计脚本默认为项目中的 tools/fix_cubemx_makefile.py（找不到时不统计），可通过环境变量或 make CUBEMX_PROFILE_SCRIPT=... 指定
+CUBEMX_PROFILE_SCRIPT ?= tools/fix_cubemx_makefile.py
+BUILD_PROFILE ?= $(BUILD_DIR)/build-profile.jsonl
+BUILD_PROFILER = $(if $(and $(BUILD_PROFILE),$(wildcard $(CUBEMX_PROFILE_SCRIPT))),$(or $(PYTHON),python3) "$(CUBEMX_PROFILE_SCRIPT)" --profile-exec "$(BUILD_PROFILE)" -- )
+CC = $(BUILD_PROFILER)$(PREFIX)gcc
+AS = $(BUILD_PROFILER)$(PREFIX)gcc -x assembler-with-cpp
+CP = $(PREFIX)objcopy
+SZ = $(PREFIX)size
+HEX = $(CP) -O ihex
+BIN = $(CP) -O binary -S
+
+#######################################
+# CFLAGS
+#######################################
+# cpu
+CPU = -mcpu=cortex-m3
+
+# fpu
+# NONE for Cortex-M0/M0+/M3
+
+# float-abi
+
+
+# mcu
+MCU = $(CPU) -mthumb $(FPU) $(FLOAT-ABI)
+
+# macros for gcc
+# AS defines
+AS_DEFS =
+
+# C defines
+C_DEFS =  \
+-DUSE_HAL_DRIVER \
+-DSTM32F103xB
+
+
+# AS includes
+AS_INCLUDES =
+
+# C includes
+C_INCLUDES =  \
+-ICore/Inc \
+-IDrivers/STM32F1xx_HAL_Driver/Inc \
+-IDrivers/STM32F1xx_HAL_Driver/Inc/Legacy \
+-IDrivers/CMSIS/Device/ST/STM32F1xx/Include \
+-IDrivers/CMSIS/Include
+
+
+# compile gcc flags
+ASFLAGS = $(MCU) $(AS_DEFS) $(AS_INCLUDES) $(OPT) -Wall -fdata-sections -ffunction-sections
+
+CFLAGS += $(MCU) $(C_DEFS) $(C_INCLUDES) $(OPT) -Wall -fdata-sections -ffunction-sections
+
+ifeq ($(DEBUG), 1)
+CFLAGS += -g -gdwarf-2
+endif
+
+
+# Generate dependency information
+CFLAGS += -MMD -MP -MF"$(@:%.o=%.d)"
+
+
+#######################################
+# LDFLAGS
+#######################################
+# link script
+LDSCRIPT = STM32F103XB_FLASH.ld
+
+# libraries
+LIBS = -lc -lm -lnosys
+LIBDIR =
+LDFLAGS = $(MCU) -specs=nano.specs -T$(LDSCRIPT) $(LIBDIR) $(LIBS) -Wl,-Map=$(BUILD_DIR)/$(TARGET).map,--cref -Wl,--gc-sections
+
+# default action: build all
+all: $(BUILD_DIR)/$(TARGET).elf $(BUILD_DIR)/$(TARGET).hex $(BUILD_DIR)/$(TARGET).bin
+
+.NOTPARALLEL:
+MAKEFLAGS += -j1
+
+
+#######################################
+# build the application
+#######################################
+# list of objects
+OBJECTS = $(addprefix $(BUILD_DIR)/,$(notdir $(C_SOURCES:.c=.o)))
+vpath %.c $(sort $(dir $(C_SOURCES)))
+# list of ASM program objects
+OBJECTS += $(addprefix $(BUILD_DIR)/,$(notdir $(ASM_SOURCES:.s=.o)))
+vpath %.s $(sort $(dir $(ASM_SOURCES)))
+
+$(BUILD_DIR)/%.o: %.c Makefile | $(BUILD_DIR)
+	$(CC) -c $(CFLAGS) -Wa,-a,-ad,-alms=$(BUILD_DIR)/$(notdir $(<:.c=.lst)) $< -o $@
+
+$(BUILD_DIR)/%.o: %.s Makefile | $(BUILD_DIR)
+	$(AS) -c $(CFLAGS) $< -o $@
+
+$(BUILD_DIR)/$(TARGET).elf: $(OBJECTS) Makefile
+	$(CC) $(OBJECTS) $(LDFLAGS) -o $@
+	$(SZ) $@
+
+$(BUILD_DIR)/%.hex: $(BUILD_DIR)/%.elf | $(BUILD_DIR)
+	$(HEX) $< $@
+	
+$(BUILD_DIR)/%.bin: $(BUILD_DIR)/%.elf | $(BUILD_DIR)
+	$(BIN) $< $@	
+	
+$(BUILD_DIR):
+	mkdir $@		
+
+#######################################
+# clean up
+#######################################
+clean:
+	-rm -fR $(BUILD_DIR)
+
+#######################################
+# dependencies
+#######################################
+-include $(wildcard $(BUILD_DIR)/*.d)
+
+# *** EOF ***
@@ -28,7 +28,15 @@
 import sys
 import os
 import re
-from datetime import datetime
+import argparse
+import hashlib
+import json
+import subprocess
+import shutil
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime, timedelta
 from pathlib import Path
 import glob
 
@@ -86,28 +94,783 @@ def is_already_fixed(filepath):
     except:
         return False
 
-def backup_file(filepath):
-    """备份文件"""
-    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-    backup_path = f"{filepath}.backup.{timestamp}"
+# 备份仓库
+# 备份按内容哈希（SHA-256）存放在被修复文件所在目录的 .cubemx-fix/ 中，
+# 相同内容只保存一份；index.json 记录每个文件的备份历史（最新的在最后），
+# 所有写入都先写临时文件再 rename，保证中途中断不会留下损坏的备份
+BACKUP_DIR_NAME = '.cubemx-fix'
+BACKUP_INDEX_NAME = 'index.json'
+# 每个文件默认保留的备份数量，可通过 --keep-backups 或环境变量 CUBEMX_FIX_BACKUP_KEEP 修改
+BACKUP_KEEP_DEFAULT = 10
+
+_invalid_env_warned = set()
+
+def backup_setting_from_env(name, convert, default):
+    """读取备份保留策略的环境变量，值无效时给出警告（每个变量只提示一次）并使用默认值"""
+    value = os.environ.get(name)
+    if not value:
+        return default
+    try:
+        return convert(value)
+    except ValueError:
+        if name not in _invalid_env_warned:
+            _invalid_env_warned.add(name)
+            fallback = f"，使用默认值 {default}" if default is not None else ""
+            print_warning(f"环境变量 {name} 的值无效: {value}（需要是数字），已忽略{fallback}")
+        return default
+
+def atomic_write(filepath, data):
+    """原子写入文件（临时文件 + rename）"""
+    directory = os.path.dirname(os.path.abspath(filepath))
+    fd, tmp_path = tempfile.mkstemp(prefix='.tmp-', dir=directory)
+    try:
+        # 覆盖已有文件时保留其权限（mkstemp 创建的临时文件只有所有者可读写）
+        if os.path.exists(filepath):
+            shutil.copymode(filepath, tmp_path)
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, filepath)
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+        raise
+
+class BackupStore:
+    """按内容哈希寻址的备份仓库
+
+    目录结构：
+        .cubemx-fix/index.json            备份索引
+        .cubemx-fix/objects/ab/abcdef...  备份内容（文件名为 SHA-256）
+    """
+    def __init__(self, root, keep=None, max_age_days=None):
+        self.root = root
+        self.objects_dir = os.path.join(root, 'objects')
+        self.index_path = os.path.join(root, BACKUP_INDEX_NAME)
+        if keep is None:
+            keep = backup_setting_from_env('CUBEMX_FIX_BACKUP_KEEP', int, BACKUP_KEEP_DEFAULT)
+        if max_age_days is None:
+            max_age_days = backup_setting_from_env('CUBEMX_FIX_BACKUP_MAX_AGE_DAYS', float, None)
+        self.keep = keep
+        self.max_age_days = max_age_days
+        self._index = None
+
+    @classmethod
+    def for_file(cls, filepath, **kwargs):
+        """获取文件所在目录的备份仓库"""
+        directory = os.path.dirname(os.path.abspath(filepath))
+        return cls(os.path.join(directory, BACKUP_DIR_NAME), **kwargs)
+
+    def _load_index(self):
+        if self._index is None:
+            try:
+                with open(self.index_path, 'r', encoding='utf-8') as f:
+                    self._index = json.load(f)
+            except (OSError, ValueError):
+                self._index = {}
+            self._index.setdefault('version', 1)
+            self._index.setdefault('files', {})
+        return self._index
+
+    def _save_index(self):
+        data = json.dumps(self._load_index(), ensure_ascii=False, indent=2, sort_keys=True)
+        atomic_write(self.index_path, data.encode('utf-8'))
+
+    def _ensure_root(self):
+        if not os.path.isdir(self.root):
+            os.makedirs(self.objects_dir, exist_ok=True)
+            # 备份目录不应被提交到版本库
+            atomic_write(os.path.join(self.root, '.gitignore'), b'*\n')
+        else:
+            os.makedirs(self.objects_dir, exist_ok=True)
+
+    def object_path(self, digest):
+        """备份内容的存放路径"""
+        return os.path.join(self.objects_dir, digest[:2], digest)
+
+    def entries(self, filepath):
+        """文件的备份历史（按时间从旧到新）"""
+        return list(self._load_index()['files'].get(os.path.basename(filepath), []))
+
+    def latest(self, filepath):
+        """文件最新的备份记录，没有时返回 None"""
+        entries = self.entries(filepath)
+        return entries[-1] if entries else None
+
+    def save(self, filepath):
+        """备份文件，返回备份内容的路径；内容与已有备份相同时不会重复存储"""
+        with open(filepath, 'rb') as f:
+            data = f.read()
+        digest = hashlib.sha256(data).hexdigest()
+        self._ensure_root()
+
+        object_path = self.object_path(digest)
+        if not os.path.exists(object_path):
+            os.makedirs(os.path.dirname(object_path), exist_ok=True)
+            atomic_write(object_path, data)
+
+        files = self._load_index()['files']
+        history = files.setdefault(os.path.basename(filepath), [])
+        entry = {
+            'hash': digest,
+            'size': len(data),
+            'time': datetime.now().strftime('%Y-%m-%dT%H:%M:%S'),
+        }
+        # 与最新备份相同则只刷新时间，不新增记录
+        if history and history[-1]['hash'] == digest:
+            history[-1] = entry
+        else:
+            history.append(entry)
+        self.prune(save=False)
+        self._save_index()
+        return object_path
+
+    def restore(self, filepath, digest=None):
+        """从备份恢复文件（默认恢复最新的备份），返回使用的备份路径"""
+        if digest is None:
+            entry = self.latest(filepath)
+            if entry is None:
+                return None
+            digest = entry['hash']
+        object_path = self.object_path(digest)
+        with open(object_path, 'rb') as f:
+            atomic_write(filepath, f.read())
+        return object_path
+
+    def prune(self, save=True):
+        """按保留策略清理旧备份，并删除不再被引用的备份内容，返回删除的内容数量"""
+        files = self._load_index()['files']
+        cutoff = None
+        if self.max_age_days is not None:
+            cutoff = (datetime.now() - timedelta(days=self.max_age_days)).strftime('%Y-%m-%dT%H:%M:%S')
+        for name, history in list(files.items()):
+            # 最新的一份总是保留
+            kept = history[-max(self.keep, 1):]
+            if cutoff is not None:
+                kept = [e for e in kept[:-1] if e['time'] >= cutoff] + kept[-1:]
+            files[name] = kept
+
+        referenced = {e['hash'] for history in files.values() for e in history}
+        removed = 0
+        if os.path.isdir(self.objects_dir):
+            for bucket in os.listdir(self.objects_dir):
+                bucket_dir = os.path.join(self.objects_dir, bucket)
+                if not os.path.isdir(bucket_dir):
+                    continue
+                for digest in os.listdir(bucket_dir):
+                    if digest not in referenced:
+                        os.unlink(os.path.join(bucket_dir, digest))
+                        removed += 1
+        if save:
+            self._save_index()
+        return removed
+
+def backup_file(filepath, keep=None):
+    """备份文件到 .cubemx-fix/ 备份仓库"""
     try:
-        import shutil
-        shutil.copy2(filepath, backup_path)
-        return backup_path
+        return BackupStore.for_file(filepath, keep=keep).save(filepath)
     except Exception as e:
         print_error(f"备份失败: {e}")
         return None
 
-def fix_cmake_toolchain(filepath):
-    """修复 CMake 工具链文件"""
+# 修复指纹
+# 生成的工具链配置首行带有版本化的指纹标记，指纹为配置内容的哈希，
+# 模板或选项变化后指纹随之变化，据此区分“已是最新修复”和“旧版本修复”
+FIX_TEMPLATE_VERSION = 1
+FIX_MARKER_PREFIX = '# cubemx-fix: toolchain'
+_FIX_MARKER_RE = re.compile(r'^\s*# cubemx-fix: toolchain v(\d+) ([0-9a-f]+)')
+
+def block_fingerprint(block):
+    """计算工具链配置的指纹"""
+    data = f"v{FIX_TEMPLATE_VERSION}\n{block}".encode('utf-8')
+    return hashlib.sha256(data).hexdigest()[:16]
+
+def fix_marker(fingerprint):
+    """生成工具链配置的指纹标记行"""
+    return f"{FIX_MARKER_PREFIX} v{FIX_TEMPLATE_VERSION} {fingerprint}（自动生成的标记，请勿修改）\n"
+
+def read_fix_marker(filepath):
+    """读取文件中的指纹标记，返回 (版本, 指纹)，没有标记时返回 None"""
     try:
         with open(filepath, 'r', encoding='utf-8') as f:
-            content = f.read()
-            lines = content.splitlines(True)
-    except Exception as e:
-        print_error(f"读取文件失败: {e}")
-        return False
-    
+            for line in f:
+                m = _FIX_MARKER_RE.match(line)
+                if m:
+                    return int(m.group(1)), m.group(2)
+    except (OSError, UnicodeDecodeError):
+        pass
+    return None
+
+def get_fix_status(filepath, fingerprint):
+    """检查文件的修复状态
+
+    返回值：
+        'current'  已使用当前模板修复
+        'outdated' 已修复，但模板版本或选项已变化
+        'legacy'   包含 ARM_TOOLCHAIN_PATH 但没有指纹标记（旧版脚本或手动修改）
+        None       尚未修复
+    """
+    marker = read_fix_marker(filepath)
+    if marker is not None:
+        return 'current' if marker[1] == fingerprint else 'outdated'
+    if is_already_fixed(filepath):
+        return 'legacy'
+    return None
+
+def get_cache_dir():
+    """本工具的缓存目录（可通过环境变量 CUBEMX_FIX_CACHE_DIR 指定）"""
+    cache_dir = os.environ.get('CUBEMX_FIX_CACHE_DIR')
+    if not cache_dir:
+        base = os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+        cache_dir = os.path.join(base, 'cubemx-fix')
+    return cache_dir
+
+class FixStateCache:
+    """已修复文件的状态缓存
+
+    以 (路径, inode, 大小, mtime) 为键记录文件修复时的指纹，
+    文件未变化且指纹与当前模板一致时无需打开文件即可跳过。
+    """
+    def __init__(self, path=None):
+        self.path = path or os.path.join(get_cache_dir(), 'fixed-files.json')
+        self._entries = None
+
+    def _load(self):
+        if self._entries is None:
+            try:
+                with open(self.path, 'r', encoding='utf-8') as f:
+                    self._entries = json.load(f).get('files', {})
+            except (OSError, ValueError):
+                self._entries = {}
+        return self._entries
+
+    @staticmethod
+    def _stat_key(filepath):
+        st = os.stat(filepath)
+        return [st.st_ino, st.st_size, st.st_mtime_ns]
+
+    def is_current(self, filepath, fingerprint):
+        """文件自上次修复后未变化，且指纹与当前模板一致"""
+        entry = self._load().get(os.path.abspath(filepath))
+        if not entry or entry.get('fingerprint') != fingerprint:
+            return False
+        try:
+            return entry.get('stat') == self._stat_key(filepath)
+        except OSError:
+            return False
+
+    def record(self, filepath, fingerprint):
+        """记录文件当前状态"""
+        try:
+            self._load()[os.path.abspath(filepath)] = {
+                'stat': self._stat_key(filepath),
+                'fingerprint': fingerprint,
+            }
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            data = json.dumps({'version': 1, 'files': self._entries}, ensure_ascii=False, indent=1)
+            atomic_write(self.path, data.encode('utf-8'))
+        except OSError as e:
+            print_warning(f"写入修复状态缓存失败: {e}")
+
+# 工具链发现
+# 在常见安装位置中查找 ARM GNU 工具链，探测版本、multilib 和 newlib 支持，
+# 探测结果按 gcc 可执行文件的 mtime 缓存，后续运行无需重复调用编译器
+TOOLCHAIN_GCC = 'arm-none-eabi-gcc' + ('.exe' if os.name == 'nt' else '')
+TOOLCHAIN_PROBE_TIMEOUT = 10  # 秒
+
+def toolchain_search_roots():
+    """工具链搜索位置，返回 [(目录, 搜索深度)]"""
+    home = os.path.expanduser('~')
+    roots = []
+    for var in ('ARM_TOOLCHAIN_PATH', 'GCC_PATH'):
+        if os.environ.get(var):
+            path = os.environ[var].rstrip('/\\')
+            if os.path.basename(path) == 'bin':
+                path = os.path.dirname(path)
+            roots.append((path, 0))
+    # 额外的搜索位置（多个目录用路径分隔符隔开）
+    for path in os.environ.get('CUBEMX_FIX_TOOLCHAIN_ROOTS', '').split(os.pathsep):
+        if path:
+            roots.append((path, 2))
+    roots += [
+        (os.path.join(home, 'toolchains'), 2),
+        (os.path.join(home, 'toolchain'), 1),
+        (os.path.join(home, 'opt'), 2),
+        ('/opt', 2),
+        ('/opt/st', 4),                                              # Linux STM32CubeIDE
+        ('/Applications/ArmGNUToolchain', 2),                        # macOS 官方安装包
+        ('/Applications/STM32CubeIDE.app/Contents/Eclipse/plugins', 2),
+        ('/usr/local', 0),
+        ('/usr', 0),
+        ('C:\\Program Files (x86)\\GNU Arm Embedded Toolchain', 1),
+        ('C:\\Program Files (x86)\\Arm GNU Toolchain arm-none-eabi', 1),
+        ('C:\\Program Files\\Arm GNU Toolchain arm-none-eabi', 1),
+        ('C:\\ST', 4),
+    ]
+    # PATH 中的工具链
+    for path in os.environ.get('PATH', '').split(os.pathsep):
+        if path and os.path.isfile(os.path.join(path, TOOLCHAIN_GCC)):
+            roots.append((os.path.dirname(path.rstrip('/\\')), 0))
+    return roots
+
+def find_toolchain_dirs(roots=None):
+    """查找包含 bin/arm-none-eabi-gcc 的工具链目录（按真实路径去重）"""
+    found = []
+    seen = set()
+
+    def visit(path, depth):
+        if os.path.isfile(os.path.join(path, 'bin', TOOLCHAIN_GCC)):
+            real = os.path.realpath(path)
+            if real not in seen:
+                seen.add(real)
+                found.append(path)
+            return
+        if depth <= 0:
+            return
+        try:
+            entries = sorted(os.scandir(path), key=lambda e: e.name)
+        except OSError:
+            return
+        for entry in entries:
+            if entry.is_dir() and not entry.name.startswith('.'):
+                visit(entry.path, depth - 1)
+
+    for root, depth in (roots if roots is not None else toolchain_search_roots()):
+        if os.path.isdir(root):
+            visit(root, depth)
+    return found
+
+def _run_gcc(gcc, *args):
+    result = subprocess.run([gcc] + list(args), stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+                            universal_newlines=True, timeout=TOOLCHAIN_PROBE_TIMEOUT)
+    return result.stdout.strip()
+
+def _version_key(version):
+    return tuple(int(x) for x in re.findall(r'\d+', version or ''))
+
+def probe_toolchain(toolchain_dir):
+    """调用 arm-none-eabi-gcc 探测工具链的版本、multilib 和 newlib 支持"""
+    gcc = os.path.join(toolchain_dir, 'bin', TOOLCHAIN_GCC)
+    info = {'path': toolchain_dir, 'gcc': gcc, 'version': None,
+            'multilibs': [], 'newlib': False, 'newlib_nano': False, 'error': None}
+    try:
+        first_line = _run_gcc(gcc, '--version').splitlines()[0]
+        # 例如：arm-none-eabi-gcc (Arm GNU Toolchain 14.2.Rel1 (Build arm-14.52)) 14.2.1 20241119
+        m = re.search(r'\)\s+(\d+\.\d+(?:\.\d+)?)', first_line) or \
+            re.search(r'(\d+\.\d+(?:\.\d+)?)', first_line)
+        info['version'] = m.group(1) if m else None
+        info['description'] = first_line
+        info['multilibs'] = [line.split(';')[0] for line in _run_gcc(gcc, '-print-multi-lib').splitlines()
+                             if ';' in line]
+        # 找不到库文件时 gcc 只会原样输出文件名
+        info['newlib'] = os.path.isabs(_run_gcc(gcc, '-print-file-name=libc.a'))
+        info['newlib_nano'] = os.path.isabs(_run_gcc(gcc, '-print-file-name=nano.specs'))
+    except (OSError, IndexError, subprocess.SubprocessError) as e:
+        info['error'] = str(e) or e.__class__.__name__
+    return info
+
+class ToolchainProbeCache:
+    """工具链探测结果缓存，以 gcc 可执行文件的真实路径为键，mtime 和大小变化时重新探测"""
+    def __init__(self, path=None):
+        self.path = path or os.path.join(get_cache_dir(), 'toolchains.json')
+        self._entries = None
+        self._dirty = False
+
+    def _load(self):
+        if self._entries is None:
+            try:
+                with open(self.path, 'r', encoding='utf-8') as f:
+                    self._entries = json.load(f).get('toolchains', {})
+            except (OSError, ValueError):
+                self._entries = {}
+        return self._entries
+
+    def probe(self, toolchain_dir):
+        """探测工具链（优先使用缓存）"""
+        gcc = os.path.realpath(os.path.join(toolchain_dir, 'bin', TOOLCHAIN_GCC))
+        try:
+            st = os.stat(gcc)
+        except OSError:
+            return probe_toolchain(toolchain_dir)
+        stamp = [st.st_mtime_ns, st.st_size]
+        entry = self._load().get(gcc)
+        if entry and entry.get('stamp') == stamp:
+            info = dict(entry['info'])
+            info['path'] = toolchain_dir
+            return info
+        info = probe_toolchain(toolchain_dir)
+        if not info['error']:
+            self._entries[gcc] = {'stamp': stamp, 'info': info}
+            self._dirty = True
+        return info
+
+    def save(self):
+        if not self._dirty:
+            return
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            data = json.dumps({'version': 1, 'toolchains': self._entries}, ensure_ascii=False, indent=1)
+            atomic_write(self.path, data.encode('utf-8'))
+            self._dirty = False
+        except OSError as e:
+            print_warning(f"写入工具链缓存失败: {e}")
+
+def toolchain_rank(info):
+    """工具链排序键：可用 > 带 newlib > 带 newlib-nano > multilib 数量 > 版本号"""
+    return (info['error'] is None, info['newlib'], info['newlib_nano'],
+            len(info['multilibs']), _version_key(info['version']))
+
+def discover_toolchains(roots=None):
+    """查找并探测所有工具链，按推荐程度从高到低排序"""
+    cache = ToolchainProbeCache()
+    infos = [cache.probe(path) for path in find_toolchain_dirs(roots)]
+    cache.save()
+    return sorted(infos, key=toolchain_rank, reverse=True)
+
+def select_best_toolchain(roots=None):
+    """选择推荐的工具链，找不到可用的工具链时返回 None"""
+    for info in discover_toolchains(roots):
+        if info['error'] is None:
+            return info
+    return None
+
+def format_toolchain(info):
+    """工具链的单行描述"""
+    if info['error']:
+        return f"{info['path']}（无法运行: {info['error']}）"
+    features = [f"GCC {info['version'] or '?'}"]
+    features.append('newlib' if info['newlib'] else '缺少 newlib')
+    if info['newlib_nano']:
+        features.append('nano.specs')
+    features.append(f"{len(info['multilibs'])} 个 multilib")
+    return f"{info['path']}（{', '.join(features)}）"
+
+def print_toolchains(infos):
+    """打印发现的工具链列表"""
+    if not infos:
+        print_warning("没有找到 ARM GNU 工具链")
+        print_info("可通过环境变量 CUBEMX_FIX_TOOLCHAIN_ROOTS 指定额外的搜索目录")
+        return
+    print_info(f"找到 {len(infos)} 个 ARM GNU 工具链（按推荐程度排序）：")
+    for i, info in enumerate(infos):
+        mark = '*' if i == 0 and info['error'] is None else ' '
+        print(f"  {mark} {format_toolchain(info)}")
+
+# 新的工具链配置
+TOOLCHAIN_CONFIG = '''# 工具链路径配置（优先级：环境变量 > 相对路径 > 系统 PATH）
+# 优先级1：使用环境变量指定的工具链（推荐，支持全局配置）
+if(DEFINED ENV{ARM_TOOLCHAIN_PATH})
+    # 使用环境变量指定的工具链路径
+    set(TOOLCHAIN_DIR $ENV{ARM_TOOLCHAIN_PATH})
+    message(STATUS "Using toolchain from environment: ${TOOLCHAIN_DIR}")
+elseif(EXISTS "${CMAKE_CURRENT_LIST_DIR}/../../toolchain")
+    # 回退到相对路径（兼容旧项目结构）
+    get_filename_component(TOOLCHAIN_DIR "${CMAKE_CURRENT_LIST_DIR}/../../toolchain" ABSOLUTE)
+    message(STATUS "Using toolchain from relative path: ${TOOLCHAIN_DIR}")
+else()
+    # 尝试使用系统 PATH 中的工具链（可能缺少 newlib）
+    set(TOOLCHAIN_DIR "")
+    message(WARNING "ARM_TOOLCHAIN_PATH environment variable not set and ../../toolchain not found. Trying system PATH.")
+    message(WARNING "If compilation fails, set ARM_TOOLCHAIN_PATH environment variable to point to ARM GNU Toolchain with newlib.")
+endif()
+
+# 设置工具链前缀
+if(TOOLCHAIN_DIR)
+    set(TOOLCHAIN_PREFIX                ${TOOLCHAIN_DIR}/bin/arm-none-eabi-)
+else()
+    set(TOOLCHAIN_PREFIX                arm-none-eabi-)
+endif()
+
+set(CMAKE_C_COMPILER                ${TOOLCHAIN_PREFIX}gcc)
+set(CMAKE_ASM_COMPILER              ${CMAKE_C_COMPILER})
+set(CMAKE_CXX_COMPILER              ${TOOLCHAIN_PREFIX}g++)
+set(CMAKE_LINKER                    ${TOOLCHAIN_PREFIX}g++)
+set(CMAKE_OBJCOPY                   ${TOOLCHAIN_PREFIX}objcopy)
+set(CMAKE_SIZE                      ${TOOLCHAIN_PREFIX}size)
+
+'''
+
+# 固定使用的工具链（--pin-toolchain 生成，设置了环境变量 ARM_TOOLCHAIN_PATH 时仍以环境变量为准）
+TOOLCHAIN_PIN_CONFIG = '''# 固定使用的工具链（环境变量 ARM_TOOLCHAIN_PATH 优先）
+if(NOT DEFINED ENV{{ARM_TOOLCHAIN_PATH}} AND EXISTS "{path}")
+    set(ENV{{ARM_TOOLCHAIN_PATH}} "{path}")
+endif()
+
+'''
+
+# 编译器缓存（--compiler-cache 生成，构建时未安装则自动跳过）
+COMPILER_CACHE_CONFIG = '''# 编译器缓存（未安装时自动跳过）
+find_program(COMPILER_CACHE_PROGRAM {program})
+if(COMPILER_CACHE_PROGRAM)
+    message(STATUS "Using compiler cache: ${{COMPILER_CACHE_PROGRAM}}")
+    set(CMAKE_C_COMPILER_LAUNCHER     ${{COMPILER_CACHE_PROGRAM}})
+    set(CMAKE_CXX_COMPILER_LAUNCHER   ${{COMPILER_CACHE_PROGRAM}})
+endif()
+
+'''
+
+# 链接时优化需要使用带 LTO 插件的 gcc-ar/gcc-ranlib/gcc-nm（--release-profile 生成，紧跟在工具链命令之后）
+RELEASE_TOOLCHAIN_COMMANDS = '''set(CMAKE_C_COMPILER_AR             ${TOOLCHAIN_PREFIX}gcc-ar)
+set(CMAKE_CXX_COMPILER_AR           ${TOOLCHAIN_PREFIX}gcc-ar)
+set(CMAKE_C_COMPILER_RANLIB         ${TOOLCHAIN_PREFIX}gcc-ranlib)
+set(CMAKE_CXX_COMPILER_RANLIB       ${TOOLCHAIN_PREFIX}gcc-ranlib)
+set(CMAKE_NM                        ${TOOLCHAIN_PREFIX}gcc-nm)
+
+'''
+
+# 编译耗时统计（--profile-build 生成，放在编译器缓存之前，-DCUBEMX_BUILD_PROFILE=OFF 可关闭）
+# 统计脚本和 Python 在配置时查找，工具链文件和修复指纹中不包含本机路径
+BUILD_PROFILE_CONFIG = '''# 编译耗时统计（记录到构建目录的 {log}）
+# 统计脚本默认为项目中的 {script}（找不到时不统计），可通过环境变量 {env} 或 -D{env}=... 指定
+option(CUBEMX_BUILD_PROFILE "Record per-file compile time into {log}" ON)
+if(DEFINED ENV{{{env}}})
+    set({env} "$ENV{{{env}}}" CACHE FILEPATH "Script recording per-file compile time")
+else()
+    set({env} "{script}" CACHE FILEPATH "Script recording per-file compile time, relative to the project source directory")
+endif()
+if(CUBEMX_BUILD_PROFILE AND NOT "{flag}" IN_LIST CMAKE_C_COMPILER_LAUNCHER)
+    get_filename_component(_cubemx_profile_script "${{{env}}}" ABSOLUTE BASE_DIR "${{CMAKE_SOURCE_DIR}}")
+    find_program(CUBEMX_PYTHON NAMES python3 python)
+    if(CUBEMX_PYTHON AND EXISTS "${{_cubemx_profile_script}}")
+        set(CUBEMX_BUILD_PROFILER "${{CUBEMX_PYTHON}}" "${{_cubemx_profile_script}}" {flag} "${{CMAKE_BINARY_DIR}}/{log}" --)
+        list(PREPEND CMAKE_C_COMPILER_LAUNCHER ${{CUBEMX_BUILD_PROFILER}})
+        list(PREPEND CMAKE_CXX_COMPILER_LAUNCHER ${{CUBEMX_BUILD_PROFILER}})
+    endif()
+endif()
+
+'''
+
+def toolchain_config(toolchain_pin=None, compiler_cache=None, release_profile=None, build_profile=False):
+    """按选项生成工具链配置（不含指纹标记）"""
+    config = TOOLCHAIN_CONFIG
+    if release_profile:
+        config = config.rstrip('\n') + '\n' + RELEASE_TOOLCHAIN_COMMANDS
+    if build_profile:
+        config = BUILD_PROFILE_CONFIG.format(log=PROFILE_LOG_NAME, flag=PROFILE_EXEC_FLAG,
+                                             script=PROFILE_SCRIPT_DEFAULT, env=PROFILE_SCRIPT_ENV) + config
+    if compiler_cache:
+        config = COMPILER_CACHE_CONFIG.format(program=compiler_cache) + config
+    if toolchain_pin:
+        config = TOOLCHAIN_PIN_CONFIG.format(path=toolchain_pin.replace('\\', '/')) + config
+    return config
+
+def generate_toolchain_block(web_assets=None, **options):
+    """生成新的工具链配置（首行为指纹标记）"""
+    return fix_marker(toolchain_fingerprint(web_assets, **options)) + toolchain_config(**options)
+
+def toolchain_fingerprint(web_assets=None, **options):
+    """当前模板和选项下的修复指纹（包括工具链配置、发布优化配置和网页资源构建规则）"""
+    content = toolchain_config(**options)
+    if web_assets:
+        content += generate_web_assets_config(web_assets)
+    if options.get('release_profile'):
+        content += (RELEASE_PROFILE_CONFIG.format(opt=RELEASE_PROFILE_OPT[options['release_profile']]) +
+                    ''.join(RELEASE_PROFILE_FLAGS_CONFIG.values()))
+    return block_fingerprint(content)
+
+# 发布优化配置（--release-profile 生成，追加在工具链文件末尾，覆盖前面的编译选项）
+RELEASE_PROFILE_BEGIN = '# cubemx-fix: release-profile begin（自动生成，请勿修改）'
+RELEASE_PROFILE_END = '# cubemx-fix: release-profile end'
+
+# Release 配置的优化级别：size 按体积优化，speed 按速度优化
+RELEASE_PROFILE_OPT = {
+    'size': '-Os',
+    'speed': '-O2',
+}
+
+RELEASE_PROFILE_CONFIG = '''# 发布构建：Release 使用 {opt}，RelWithDebInfo 使用 -O2，MinSizeRel 使用 -Os，Debug 保持不变
+set(CMAKE_C_FLAGS_RELEASE "{opt} -g0")
+set(CMAKE_CXX_FLAGS_RELEASE "{opt} -g0")
+set(CMAKE_C_FLAGS_RELWITHDEBINFO "-O2 -g")
+set(CMAKE_CXX_FLAGS_RELWITHDEBINFO "-O2 -g")
+set(CMAKE_C_FLAGS_MINSIZEREL "-Os -g0")
+set(CMAKE_CXX_FLAGS_MINSIZEREL "-Os -g0")
+
+# 非 Debug 配置开启链接时优化（LTO），可通过 -DCUBEMX_LTO=OFF 关闭
+option(CUBEMX_LTO "Enable link time optimization for non-Debug builds" ON)
+if(CUBEMX_LTO)
+    set(CMAKE_INTERPROCEDURAL_OPTIMIZATION_RELEASE ON)
+    set(CMAKE_INTERPROCEDURAL_OPTIMIZATION_RELWITHDEBINFO ON)
+    set(CMAKE_INTERPROCEDURAL_OPTIMIZATION_MINSIZEREL ON)
+endif()
+'''
+
+# 未使用代码/数据的段回收（原工具链文件缺少时才添加）
+RELEASE_PROFILE_FLAGS_CONFIG = {
+    'sections': '''# 每个函数/变量单独放在一个段中，便于链接时回收
+set(CMAKE_C_FLAGS "${CMAKE_C_FLAGS} -ffunction-sections -fdata-sections")
+set(CMAKE_CXX_FLAGS "${CMAKE_CXX_FLAGS} -ffunction-sections -fdata-sections")
+''',
+    'gc-sections': '''# 链接时删除未使用的段
+set(CMAKE_C_LINK_FLAGS "${CMAKE_C_LINK_FLAGS} -Wl,--gc-sections")
+set(CMAKE_CXX_LINK_FLAGS "${CMAKE_CXX_LINK_FLAGS} -Wl,--gc-sections")
+''',
+}
+
+def strip_generated_block(lines, begin, end):
+    """移除之前生成的 begin/end 标记之间的配置，返回剩余的行"""
+    result = []
+    inside = False
+    after_block = False
+    for line in lines:
+        stripped = line.strip()
+        if stripped == begin:
+            inside = True
+            continue
+        if inside:
+            if stripped == end:
+                inside = False
+                after_block = True
+            continue
+        # 同时移除配置后面添加的空行
+        if after_block and not stripped:
+            after_block = False
+            continue
+        after_block = False
+        result.append(line)
+    # 配置位于文件末尾时，移除配置前面添加的空行
+    if after_block and result and not result[-1].strip():
+        result.pop()
+    return result
+
+def generate_release_profile_block(profile, lines):
+    """生成发布优化配置，已有的段回收选项不再重复添加"""
+    content = ''.join(lines)
+    config = RELEASE_PROFILE_BEGIN + '\n' + RELEASE_PROFILE_CONFIG.format(opt=RELEASE_PROFILE_OPT[profile])
+    if not ('-ffunction-sections' in content and '-fdata-sections' in content):
+        config += RELEASE_PROFILE_FLAGS_CONFIG['sections']
+    if '--gc-sections' not in content:
+        config += RELEASE_PROFILE_FLAGS_CONFIG['gc-sections']
+    return config + RELEASE_PROFILE_END + '\n'
+
+# 网页资源构建规则（--web-assets 生成，追加在工具链文件末尾）
+WEB_ASSETS_BEGIN = '# cubemx-fix: web-assets begin（自动生成，请勿修改）'
+WEB_ASSETS_END = '# cubemx-fix: web-assets end'
+WEB_ASSETS_DIR_DEFAULT = 'web'
+# 转换脚本默认放在项目的 tools/ 目录中（相对路径，写入工具链文件和修复指纹的内容与本机路径无关），
+# 也可通过环境变量 CUBEMX_WEB_CONVERTER 或 -DCUBEMX_WEB_CONVERTER=... 指定
+WEB_CONVERTER_DEFAULT = 'tools/html_to_c_converter.py'
+WEB_CONVERTER_ENV = 'CUBEMX_WEB_CONVERTER'
+# 仓库中转换脚本的位置（只用于提示复制到项目中）
+WEB_CONVERTER_PATH = os.path.normpath(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..',
+                                                   'ESP32_WiFi_Provisioning_Page', 'html_to_c_converter.py'))
+
+# 工具链文件在 add_executable() 之前执行，所以用 cmake_language(DEFER) 推迟到顶层 CMakeLists.txt 处理完后
+# 再添加到可执行文件；工具链文件会被多次加载（包括 try_compile），只在第一次加载时注册
+WEB_ASSETS_CONFIG = '''# 网页资源：CUBEMX_WEB_DIR 下的 HTML/CSS/JS 由 html_to_c_converter.py 转换为 C 源文件
+# 每个文件单独生成和编译（带依赖文件），只在对应文件或转换脚本修改后重新生成，并与其他源文件并行编译
+# 转换脚本默认为项目中的 {converter}，可通过环境变量 {env} 或 -DCUBEMX_WEB_CONVERTER=... 指定
+set(CUBEMX_WEB_DIR "{web_dir}" CACHE PATH "Web asset directory, relative to the project source directory")
+if(DEFINED ENV{{{env}}})
+    set(CUBEMX_WEB_CONVERTER "$ENV{{{env}}}" CACHE FILEPATH "Script converting web assets into C sources")
+else()
+    set(CUBEMX_WEB_CONVERTER "{converter}" CACHE FILEPATH "Script converting web assets into C sources, relative to the project source directory")
+endif()
+get_property(_cubemx_in_try_compile GLOBAL PROPERTY IN_TRY_COMPILE)
+get_property(_cubemx_web_deferred GLOBAL PROPERTY CUBEMX_WEB_ASSETS_DEFERRED)
+if(NOT _cubemx_in_try_compile AND NOT _cubemx_web_deferred)
+    set_property(GLOBAL PROPERTY CUBEMX_WEB_ASSETS_DEFERRED TRUE)
+    function(cubemx_add_web_assets)
+        set(target "${{CMAKE_PROJECT_NAME}}")
+        if(NOT TARGET "${{target}}")
+            message(WARNING "cubemx-fix: target ${{target}} not found, web assets are not added")
+            return()
+        endif()
+        get_filename_component(web_dir "${{CUBEMX_WEB_DIR}}" ABSOLUTE BASE_DIR "${{CMAKE_SOURCE_DIR}}")
+        file(GLOB_RECURSE assets CONFIGURE_DEPENDS RELATIVE "${{CMAKE_SOURCE_DIR}}"
+            "${{web_dir}}/*.html" "${{web_dir}}/*.htm" "${{web_dir}}/*.css" "${{web_dir}}/*.js")
+        if(NOT assets)
+            return()
+        endif()
+        get_filename_component(converter "${{CUBEMX_WEB_CONVERTER}}" ABSOLUTE BASE_DIR "${{CMAKE_SOURCE_DIR}}")
+        if(NOT EXISTS "${{converter}}")
+            message(FATAL_ERROR "cubemx-fix: web asset converter ${{converter}} not found, "
+                "copy it into the project or set {env} / -DCUBEMX_WEB_CONVERTER=...")
+        endif()
+        find_package(Python3 COMPONENTS Interpreter REQUIRED)
+        list(SORT assets)
+        foreach(asset IN LISTS assets)
+            set(output "${{CMAKE_BINARY_DIR}}/${{asset}}.c")
+            add_custom_command(OUTPUT "${{output}}"
+                COMMAND Python3::Interpreter "${{converter}}" "${{asset}}" -o "${{output}}"
+                        --variable-from-path --depfile "${{output}}.d"
+                DEPENDS "${{asset}}" "${{converter}}"
+                DEPFILE "${{output}}.d"
+                WORKING_DIRECTORY "${{CMAKE_SOURCE_DIR}}"
+                COMMENT "Converting web asset ${{asset}}"
+                VERBATIM)
+            target_sources("${{target}}" PRIVATE "${{output}}")
+        endforeach()
+    endfunction()
+    cmake_language(DEFER CALL cubemx_add_web_assets)
+endif()
+'''
+
+def generate_web_assets_config(web_dir):
+    """网页资源构建规则（不含标记）"""
+    return WEB_ASSETS_CONFIG.format(web_dir=web_dir.replace('\\', '/').rstrip('/'),
+                                    converter=WEB_CONVERTER_DEFAULT, env=WEB_CONVERTER_ENV)
+
+def check_project_script(project_dir, name, script, env, source):
+    """检查构建时能否找到项目中的脚本（网页资源转换、编译耗时统计），找不到时提示复制或指定"""
+    if os.environ.get(env) or os.path.isfile(os.path.join(project_dir, script)):
+        return
+    print_warning(f"项目中没有{name} {script}，构建前请复制 {source} "
+                  f"到项目中，或通过环境变量 {env} / -D{env}=... 指定")
+
+def generate_web_assets_block(web_dir):
+    """生成网页资源构建规则"""
+    return WEB_ASSETS_BEGIN + '\n' + generate_web_assets_config(web_dir) + WEB_ASSETS_END + '\n'
+
+# 之前修复生成的工具链配置：以指纹标记开头，旧版本的修复没有标记，从环境变量判断开始
+TOOLCHAIN_ENV_CHECK = 'if(DEFINED ENV{ARM_TOOLCHAIN_PATH})'
+# 工具链配置末尾的工具链命令（CMAKE_C_COMPILER 到 CMAKE_SIZE，以及发布优化的 gcc-ar 等）
+TOOLCHAIN_COMMAND_PATTERN = re.compile(r'^\s*set\s*\(\s*CMAKE_\w+\s+\$\{(TOOLCHAIN_PREFIX|CMAKE_C_COMPILER)\}')
+
+def find_fixed_toolchain_block(lines):
+    """查找之前修复生成的工具链配置
+
+    返回 (起始行, 结束行的下一行)，包括末尾的一个空行；不是修复过的文件时返回 None
+    """
+    start = None
+    for i, line in enumerate(lines):
+        if _FIX_MARKER_RE.match(line):
+            start = i
+            break
+    if start is None:
+        for i, line in enumerate(lines):
+            if line.strip() == TOOLCHAIN_ENV_CHECK:
+                start = i
+                break
+        if start is None:
+            return None
+        # 同时替换模板中环境变量判断前面的注释
+        template_comments = TOOLCHAIN_CONFIG[:TOOLCHAIN_CONFIG.index(TOOLCHAIN_ENV_CHECK)].splitlines()
+        while start > 0 and lines[start - 1].rstrip('\r\n') in template_comments:
+            start -= 1
+
+    # 从 CMAKE_C_COMPILER 开始的连续工具链命令是配置的结尾
+    end = None
+    for i in range(start, len(lines)):
+        if re.match(r'^\s*set\s*\(\s*CMAKE_C_COMPILER\s+\$\{TOOLCHAIN_PREFIX\}', lines[i]):
+            end = i
+            break
+    if end is None:
+        return None
+    while end < len(lines) and TOOLCHAIN_COMMAND_PATTERN.match(lines[end]):
+        end += 1
+    if end < len(lines) and not lines[end].strip():
+        end += 1
+    return start, end
+
+def replace_cubemx_toolchain(lines, new_config):
+    """把 STM32CubeMX 生成的 TOOLCHAIN_PREFIX 和工具链命令替换为新的工具链配置
+
+    返回新的行列表，找不到 TOOLCHAIN_PREFIX 定义时返回 None
+    """
     # 查找 TOOLCHAIN_PREFIX 定义的位置
     toolchain_prefix_line = -1
     compiler_id_end_line = -1
@@ -123,7 +886,7 @@ def fix_cmake_toolchain(filepath):
     
     if toolchain_prefix_line == -1:
         print_error("无法找到 TOOLCHAIN_PREFIX 定义，可能不是标准的 STM32CubeMX CMake 工具链文件")
-        return False
+        return None
     
     print_info(f"找到 TOOLCHAIN_PREFIX 定义在第 {toolchain_prefix_line + 1} 行")
     
@@ -152,40 +915,6 @@ def fix_cmake_toolchain(filepath):
     
     print_info(f"工具链配置部分：第 {toolchain_prefix_line + 1} 行 到 第 {toolchain_config_end + 1} 行")
     
-    # 生成新的工具链配置
-    new_config = '''# 工具链路径配置（优先级：环境变量 > 相对路径 > 系统 PATH）
-# 优先级1：使用环境变量指定的工具链（推荐，支持全局配置）
-if(DEFINED ENV{ARM_TOOLCHAIN_PATH})
-    # 使用环境变量指定的工具链路径
-    set(TOOLCHAIN_DIR $ENV{ARM_TOOLCHAIN_PATH})
-    message(STATUS "Using toolchain from environment: ${TOOLCHAIN_DIR}")
-elseif(EXISTS "${CMAKE_CURRENT_LIST_DIR}/../../toolchain")
-    # 回退到相对路径（兼容旧项目结构）
-    get_filename_component(TOOLCHAIN_DIR "${CMAKE_CURRENT_LIST_DIR}/../../toolchain" ABSOLUTE)
-    message(STATUS "Using toolchain from relative path: ${TOOLCHAIN_DIR}")
-else()
-    # 尝试使用系统 PATH 中的工具链（可能缺少 newlib）
-    set(TOOLCHAIN_DIR "")
-    message(WARNING "ARM_TOOLCHAIN_PATH environment variable not set and ../../toolchain not found. Trying system PATH.")
-    message(WARNING "If compilation fails, set ARM_TOOLCHAIN_PATH environment variable to point to ARM GNU Toolchain with newlib.")
-endif()
-
-# 设置工具链前缀
-if(TOOLCHAIN_DIR)
-    set(TOOLCHAIN_PREFIX                ${TOOLCHAIN_DIR}/bin/arm-none-eabi-)
-else()
-    set(TOOLCHAIN_PREFIX                arm-none-eabi-)
-endif()
-
-set(CMAKE_C_COMPILER                ${TOOLCHAIN_PREFIX}gcc)
-set(CMAKE_ASM_COMPILER              ${CMAKE_C_COMPILER})
-set(CMAKE_CXX_COMPILER              ${TOOLCHAIN_PREFIX}g++)
-set(CMAKE_LINKER                    ${TOOLCHAIN_PREFIX}g++)
-set(CMAKE_OBJCOPY                   ${TOOLCHAIN_PREFIX}objcopy)
-set(CMAKE_SIZE                      ${TOOLCHAIN_PREFIX}size)
-
-'''
-    
     # 构建新的文件内容
     new_lines = []
     
@@ -212,7 +941,7 @@ set(CMAKE_SIZE                      ${TOOLCHAIN_PREFIX}size)
         # 跳过原有的 TOOLCHAIN_PREFIX 和工具链命令定义
         if (re.search(r'set\s*\(\s*TOOLCHAIN_PREFIX', line, re.IGNORECASE) or
             re.search(r'set\s*\(\s*CMAKE_(C|CXX|ASM)_COMPILER', line, re.IGNORECASE) or
-            re.search(r'set\s*\(\s*CMAKE_(LINKER|OBJCOPY|SIZE)', line, re.IGNORECASE)):
+            re.search(r'set\s*\(\s*CMAKE_(LINKER|OBJCOPY|SIZE|NM)\b', line, re.IGNORECASE)):
             skip_count += 1
             continue
         
@@ -236,103 +965,874 @@ set(CMAKE_SIZE                      ${TOOLCHAIN_PREFIX}size)
             # 跳过原有的工具链配置
             if (re.search(r'set\s*\(\s*TOOLCHAIN_PREFIX', line, re.IGNORECASE) or
                 re.search(r'set\s*\(\s*CMAKE_(C|CXX|ASM)_COMPILER', line, re.IGNORECASE) or
-                re.search(r'set\s*\(\s*CMAKE_(LINKER|OBJCOPY|SIZE)', line, re.IGNORECASE) or
+                re.search(r'set\s*\(\s*CMAKE_(LINKER|OBJCOPY|SIZE|NM)\b', line, re.IGNORECASE) or
                 'must be part of path' in line.lower()):
                 skip_count += 1
                 continue
             new_lines.append(line)
         if skip_count > 0:
             print_info(f"跳过了 {skip_count} 行工具链相关定义")
+
+    return new_lines
+
+def _with_newline(text, newline):
+    """把生成内容的换行符转换为文件使用的换行符"""
+    return text if newline == '\n' else text.replace('\n', newline)
+
+def fix_cmake_toolchain(filepath, **options):
+    """修复 CMake 工具链文件"""
+    try:
+        # 不转换换行符，保持原文件的 CRLF/LF
+        with open(filepath, 'r', encoding='utf-8', newline='') as f:
+            lines = f.read().splitlines(True)
+    except Exception as e:
+        print_error(f"读取文件失败: {e}")
+        return False
+    # 生成的内容使用与原文件第一行相同的换行符
+    newline = '\r\n' if lines and lines[0].endswith('\r\n') else '\n'
     
-    # 写入文件
+    # 移除之前生成的发布优化配置和网页资源构建规则（未指定对应选项时即撤销该配置）
+    original_count = len(lines)
+    lines = strip_generated_block(lines, RELEASE_PROFILE_BEGIN, RELEASE_PROFILE_END)
+    if len(lines) != original_count:
+        print_info("已移除之前生成的发布优化配置")
+    original_count = len(lines)
+    lines = strip_generated_block(lines, WEB_ASSETS_BEGIN, WEB_ASSETS_END)
+    if len(lines) != original_count:
+        print_info("已移除之前生成的网页资源构建规则")
+
+    # 生成新的工具链配置
+    new_config = _with_newline(generate_toolchain_block(**options), newline)
+
+    # 已修复过的文件直接替换之前生成的配置，否则替换 STM32CubeMX 生成的 TOOLCHAIN_PREFIX 部分
+    fixed_block = find_fixed_toolchain_block(lines)
+    if fixed_block:
+        start, end = fixed_block
+        print_info(f"找到之前生成的工具链配置：第 {start + 1} 行 到 第 {end} 行")
+        new_lines = lines[:start] + new_config.splitlines(True) + lines[end:]
+        print_info("已替换为新的工具链配置")
+    else:
+        new_lines = replace_cubemx_toolchain(lines, new_config)
+        if new_lines is None:
+            return False
+
+    release_profile = options.get('release_profile')
+    if release_profile:
+        if new_lines and not new_lines[-1].endswith('\n'):
+            new_lines[-1] += newline
+        new_lines.append(newline)
+        new_lines.extend(_with_newline(generate_release_profile_block(release_profile, new_lines), newline)
+                         .splitlines(True))
+        print_info(f"已添加发布优化配置（Release: {RELEASE_PROFILE_OPT[release_profile]}，LTO）")
+
+    web_assets = options.get('web_assets')
+    if web_assets:
+        if new_lines and not new_lines[-1].endswith('\n'):
+            new_lines[-1] += newline
+        new_lines.append(newline)
+        new_lines.extend(_with_newline(generate_web_assets_block(web_assets), newline).splitlines(True))
+        print_info(f"已添加网页资源构建规则（{web_assets}/ 下的 HTML/CSS/JS）")
+
+    project_dir = find_project_root(filepath) or os.path.dirname(os.path.dirname(os.path.abspath(filepath)))
+    if web_assets:
+        check_project_script(project_dir, '网页资源转换脚本', WEB_CONVERTER_DEFAULT, WEB_CONVERTER_ENV, WEB_CONVERTER_PATH)
+    if options.get('build_profile'):
+        check_project_script(project_dir, '编译耗时统计脚本', PROFILE_SCRIPT_DEFAULT, PROFILE_SCRIPT_ENV,
+                             os.path.abspath(__file__))
+
+    # 写入文件（临时文件 + rename，写入中断时不会留下不完整的工具链文件）
     try:
-        with open(filepath, 'w', encoding='utf-8') as f:
-            f.writelines(new_lines)
+        atomic_write(filepath, ''.join(new_lines).encode('utf-8'))
         return True
     except Exception as e:
         print_error(f"写入文件失败: {e}")
         return False
 
+def is_generated_cmake_file(filepath):
+    """是否为本工具生成的其他 CMake 文件（如 cubemx-fast-build.cmake），这些文件首行带有
+    # cubemx-fix: 标记但不是工具链文件的指纹标记"""
+    if os.path.basename(filepath) == FAST_BUILD_CMAKE_NAME:
+        return True
+    try:
+        with open(filepath, 'r', encoding='utf-8') as f:
+            first_line = f.readline()
+    except (OSError, UnicodeDecodeError):
+        return False
+    return first_line.startswith('# cubemx-fix:') and not first_line.startswith(FIX_MARKER_PREFIX)
+
+# 搜索工具链文件时跳过的目录（与 fix_cubemx_makefile.py 一致），以及 . 开头的隐藏目录
+WATCH_SKIP_DIRS = ('.git', BACKUP_DIR_NAME, 'build', 'node_modules')
+
+# 常见的工具链文件名
+TOOLCHAIN_FILE_NAMES = ('gcc-arm-none-eabi.cmake', 'arm-none-eabi.cmake', 'gnu-arm-none-eabi.cmake')
+
 def find_cmake_toolchain_files(search_dir='.'):
-    """查找 CMake 工具链文件"""
-    toolchain_files = []
-    seen_files = set()  # 用于去重
-    # 常见的工具链文件名
-    patterns = [
-        '**/gcc-arm-none-eabi.cmake',
-        '**/arm-none-eabi.cmake',
-        '**/gnu-arm-none-eabi.cmake',
-        'cmake/**/*.cmake'
-    ]
-    
-    for pattern in patterns:
-        for filepath in glob.glob(os.path.join(search_dir, pattern), recursive=True):
-            # 转换为绝对路径以便去重
-            abs_path = os.path.abspath(filepath)
-            if os.path.isfile(filepath) and abs_path not in seen_files:
-                toolchain_files.append(filepath)
-                seen_files.add(abs_path)
-    
-    return toolchain_files
+    """查找 CMake 工具链文件（跳过构建目录和备份目录，不包括本工具生成的其他 CMake 文件）
+
+    包括任意位置的常见工具链文件名，以及 cmake/ 目录下的所有 .cmake 文件
+    """
+    named_files = []
+    cmake_dir_files = []
+    cmake_dir = os.path.join(os.path.abspath(search_dir), 'cmake')
+    for dirpath, dirnames, filenames in os.walk(search_dir):
+        dirnames[:] = sorted(d for d in dirnames if d not in WATCH_SKIP_DIRS and not d.startswith('.'))
+        in_cmake_dir = (os.path.abspath(dirpath) + os.sep).startswith(cmake_dir + os.sep)
+        for filename in sorted(filenames):
+            if filename.startswith('.'):
+                continue
+            filepath = os.path.join(dirpath, filename)
+            if filename in TOOLCHAIN_FILE_NAMES:
+                named_files.append(filepath)
+            elif in_cmake_dir and filename.endswith('.cmake'):
+                cmake_dir_files.append(filepath)
+
+    return [filepath for filepath in named_files + cmake_dir_files if not is_generated_cmake_file(filepath)]
+
+# CMake 预设
+# 在工具链文件旁生成 cubemx-fast-build.cmake，并通过 CMakePresets.json 的
+# CMAKE_PROJECT_INCLUDE 引入：为 STM32CubeMX 生成的 HAL/CMSIS 驱动目标开启
+# Unity Build 和 HAL 头文件预编译，同时让预设使用 Ninja 生成器
+FAST_BUILD_CMAKE_NAME = 'cubemx-fast-build.cmake'
+PRESETS_FILE_NAME = 'CMakePresets.json'
+
+FAST_BUILD_CMAKE = '''# cubemx-fix: fast-build（自动生成，请勿修改）
+# 由 fix_cubemx_cmake.py --presets 生成，通过 CMakePresets.json 中的 CMAKE_PROJECT_INCLUDE 引入
+# 为 STM32CubeMX 生成的 HAL/CMSIS 驱动目标开启 Unity Build 和 HAL 头文件预编译
+include_guard(GLOBAL)
+
+# 预设中原有的 CMAKE_PROJECT_INCLUDE 转存在 CUBEMX_PROJECT_INCLUDE 中，由本文件继续引入
+if(CUBEMX_PROJECT_INCLUDE)
+    include("${{CUBEMX_PROJECT_INCLUDE}}")
+endif()
+
+option(CUBEMX_UNITY_BUILD "Enable unity build for STM32CubeMX driver targets" ON)
+set(CUBEMX_UNITY_BATCH_SIZE 8 CACHE STRING "Unity build batch size for STM32CubeMX driver targets")
+option(CUBEMX_PRECOMPILE_HAL "Precompile the HAL header for STM32CubeMX driver targets" ON)
+set(CUBEMX_HAL_HEADER "{hal_header}" CACHE STRING "HAL header to precompile for STM32CubeMX driver targets")
+
+function(cubemx_fast_build)
+    # STM32CubeMX 把驱动和中间件目标定义在 cmake/stm32cubemx 目录中
+    set(targets STM32_Drivers)
+    if(EXISTS "${{CMAKE_SOURCE_DIR}}/cmake/stm32cubemx/CMakeLists.txt")
+        get_property(dir_targets DIRECTORY "${{CMAKE_SOURCE_DIR}}/cmake/stm32cubemx" PROPERTY BUILDSYSTEM_TARGETS)
+        list(APPEND targets ${{dir_targets}})
+    endif()
+    list(REMOVE_DUPLICATES targets)
+
+    foreach(target IN LISTS targets)
+        if(NOT TARGET ${{target}})
+            continue()
+        endif()
+        get_target_property(target_type ${{target}} TYPE)
+        if(target_type STREQUAL "INTERFACE_LIBRARY")
+            continue()
+        endif()
+        if(CUBEMX_UNITY_BUILD)
+            set_target_properties(${{target}} PROPERTIES
+                UNITY_BUILD ON
+                UNITY_BUILD_MODE BATCH
+                UNITY_BUILD_BATCH_SIZE ${{CUBEMX_UNITY_BATCH_SIZE}})
+        endif()
+        if(CUBEMX_PRECOMPILE_HAL AND CUBEMX_HAL_HEADER)
+            target_precompile_headers(${{target}} PRIVATE "$<$<COMPILE_LANGUAGE:C>:<${{CUBEMX_HAL_HEADER}}>>")
+        endif()
+        message(STATUS "cubemx-fix: fast build enabled for ${{target}}")
+    endforeach()
+endfunction()
+
+# 等顶层 CMakeLists.txt 处理完、所有目标都已定义后再设置
+cmake_language(DEFER CALL cubemx_fast_build)
+'''
+
+def find_project_root(toolchain_path):
+    """根据工具链文件位置查找 CMake 项目根目录（包含 project() 的 CMakeLists.txt）"""
+    directory = os.path.dirname(os.path.abspath(toolchain_path))
+    for _ in range(4):
+        cmakelists = os.path.join(directory, 'CMakeLists.txt')
+        try:
+            with open(cmakelists, 'r', encoding='utf-8') as f:
+                if re.search(r'^\s*project\s*\(', f.read(), re.IGNORECASE | re.MULTILINE):
+                    return directory
+        except OSError:
+            pass
+        parent = os.path.dirname(directory)
+        if parent == directory:
+            break
+        directory = parent
+    return None
+
+def find_hal_header(project_root):
+    """查找 HAL 总头文件（如 stm32f1xx_hal.h），找不到时返回 None"""
+    pattern = os.path.join(project_root, 'Drivers', '*_HAL_Driver', 'Inc', 'stm32*_hal.h')
+    headers = sorted(os.path.basename(p) for p in glob.glob(pattern))
+    return headers[0] if headers else None
+
+def default_cmake_presets(toolchain_rel):
+    """与 STM32CubeMX 生成的预设结构一致的默认 CMakePresets.json"""
+    return {
+        'version': 3,
+        'configurePresets': [
+            {
+                'name': 'default',
+                'hidden': True,
+                'generator': 'Ninja',
+                'binaryDir': '${sourceDir}/build/${presetName}',
+                'toolchainFile': '${sourceDir}/' + toolchain_rel,
+                'cacheVariables': {},
+            },
+            {'name': 'Debug', 'inherits': 'default', 'cacheVariables': {'CMAKE_BUILD_TYPE': 'Debug'}},
+            {'name': 'Release', 'inherits': 'default', 'cacheVariables': {'CMAKE_BUILD_TYPE': 'Release'}},
+        ],
+        'buildPresets': [
+            {'name': 'Debug', 'configurePreset': 'Debug'},
+            {'name': 'Release', 'configurePreset': 'Release'},
+        ],
+    }
+
+def update_cmake_presets(toolchain_path, keep_backups=None):
+    """生成或更新项目的 CMakePresets.json 和 cubemx-fast-build.cmake"""
+    project_root = find_project_root(toolchain_path)
+    if project_root is None:
+        print_warning("没有找到包含 project() 的 CMakeLists.txt，跳过 CMakePresets.json")
+        return False
+
+    toolchain_dir = os.path.dirname(os.path.abspath(toolchain_path))
+    toolchain_rel = os.path.relpath(os.path.abspath(toolchain_path), project_root).replace(os.sep, '/')
+    fast_build_path = os.path.join(toolchain_dir, FAST_BUILD_CMAKE_NAME)
+    fast_build_rel = os.path.relpath(fast_build_path, project_root).replace(os.sep, '/')
+
+    hal_header = find_hal_header(project_root)
+    if hal_header:
+        print_info(f"预编译 HAL 头文件: {hal_header}")
+    else:
+        print_warning("没有找到 Drivers/*_HAL_Driver/Inc/stm32*_hal.h，不预编译 HAL 头文件")
+
+    if not shutil.which('ninja'):
+        print_warning("没有找到 ninja，使用预设前请先安装 Ninja")
 
-def check_environment():
-    """检查环境变量"""
+    presets_path = os.path.join(project_root, PRESETS_FILE_NAME)
+    if os.path.exists(presets_path):
+        try:
+            with open(presets_path, 'r', encoding='utf-8') as f:
+                presets = json.load(f)
+        except (OSError, ValueError) as e:
+            print_error(f"读取 {PRESETS_FILE_NAME} 失败: {e}")
+            return False
+    else:
+        presets = default_cmake_presets(toolchain_rel)
+
+    # 只修改不继承其他预设的基础预设，派生预设（Debug/Release 等）自动继承
+    configure_presets = presets.setdefault('configurePresets', [])
+    base_presets = [p for p in configure_presets if not p.get('inherits')]
+    if not base_presets:
+        print_warning(f"{PRESETS_FILE_NAME} 中没有基础配置预设，跳过")
+        return False
+    project_include = '${sourceDir}/' + fast_build_rel
+    for preset in base_presets:
+        preset['generator'] = 'Ninja'
+        cache_vars = preset.setdefault('cacheVariables', {})
+        # 预设中已有指向其他文件的 CMAKE_PROJECT_INCLUDE 时不覆盖，转存到 CUBEMX_PROJECT_INCLUDE 由快速构建配置引入
+        existing = cache_vars.get('CMAKE_PROJECT_INCLUDE')
+        if existing is not None and existing != project_include:
+            chained = cache_vars.get('CUBEMX_PROJECT_INCLUDE')
+            if chained is not None and chained != existing:
+                print_warning(f"预设 {preset.get('name')} 的 CMAKE_PROJECT_INCLUDE 和 CUBEMX_PROJECT_INCLUDE "
+                              f"都已设置，保留原有设置，不启用快速构建配置")
+                continue
+            print_warning(f"预设 {preset.get('name')} 已设置 CMAKE_PROJECT_INCLUDE: {existing}，"
+                          f"改为通过 CUBEMX_PROJECT_INCLUDE 由 {FAST_BUILD_CMAKE_NAME} 引入")
+            cache_vars['CUBEMX_PROJECT_INCLUDE'] = existing
+        cache_vars['CMAKE_PROJECT_INCLUDE'] = project_include
+        cache_vars.setdefault('CUBEMX_UNITY_BUILD', 'ON')
+        cache_vars.setdefault('CUBEMX_PRECOMPILE_HAL', 'ON' if hal_header else 'OFF')
+
+    fast_build_data = FAST_BUILD_CMAKE.format(hal_header=hal_header or '').encode('utf-8')
+    presets_data = (json.dumps(presets, ensure_ascii=False, indent=4) + '\n').encode('utf-8')
+
+    changed = False
+    for path, data in ((fast_build_path, fast_build_data), (presets_path, presets_data)):
+        try:
+            with open(path, 'rb') as f:
+                if f.read() == data:
+                    continue
+        except OSError:
+            pass
+        if os.path.exists(path):
+            backup_path = backup_file(path, keep=keep_backups)
+            if backup_path:
+                print_info(f"已备份 {os.path.basename(path)} 到: {backup_path}")
+        atomic_write(path, data)
+        changed = True
+        print_success(f"已更新: {path}")
+    if not changed:
+        print_info(f"{PRESETS_FILE_NAME} 已是最新")
+    return True
+
+# 编译耗时统计（--profile-build）
+# 生成的构建配置通过编译器启动器（launcher）以 --profile-exec 方式调用本脚本，
+# 记录每个编译单元的耗时、峰值内存、输出文件大小和包含的头文件（JSON Lines），
+# 再用 --profile-report 汇总最慢的编译单元和头文件
+PROFILE_EXEC_FLAG = '--profile-exec'
+PROFILE_LOG_NAME = 'build-profile.jsonl'
+# 构建时调用的统计脚本（相对项目根目录，可通过环境变量指定）
+PROFILE_SCRIPT_DEFAULT = 'tools/fix_cubemx_cmake.py'
+PROFILE_SCRIPT_ENV = 'CUBEMX_PROFILE_SCRIPT'
+PROFILE_TOP_DEFAULT = 20
+
+_SOURCE_EXTS = ('.c', '.cc', '.cpp', '.cxx', '.s', '.S', '.sx')
+
+def _compile_output(cmd):
+    """编译命令的输出文件（-o）"""
+    for i, arg in enumerate(cmd):
+        if arg == '-o' and i + 1 < len(cmd):
+            return cmd[i + 1]
+        if arg.startswith('-o') and len(arg) > 2:
+            return arg[2:]
+    return None
+
+def _compile_source(cmd):
+    """编译命令的源文件"""
+    for i in range(len(cmd) - 1, 0, -1):
+        if cmd[i].endswith(_SOURCE_EXTS) and cmd[i - 1] not in ('-o', '-MF', '-MT', '-MQ'):
+            return cmd[i]
+    return None
+
+def _compile_depfile(cmd, output):
+    """编译命令生成的依赖文件（-MF，或 -MD/-MMD 时与输出文件同名的 .d）"""
+    for i, arg in enumerate(cmd):
+        if arg == '-MF' and i + 1 < len(cmd):
+            return cmd[i + 1]
+        if arg.startswith('-MF') and len(arg) > 3:
+            return arg[3:].strip('"')
+    if output and ('-MD' in cmd or '-MMD' in cmd):
+        return os.path.splitext(output)[0] + '.d'
+    return None
+
+def read_depfile(depfile, source=None):
+    """读取 make 格式的依赖文件，返回头文件列表（不含源文件本身）"""
+    try:
+        with open(depfile, 'r', encoding='utf-8', errors='replace') as f:
+            content = f.read().replace('\\\n', ' ')
+    except OSError:
+        return []
+    # 只需要第一条规则（目标: 源文件 头文件...），-MP 生成的空规则可以忽略
+    for line in content.splitlines():
+        parts = re.split(r':(?=\s|$)', line, 1)
+        if len(parts) == 2:
+            return [dep for dep in dict.fromkeys(parts[1].split()) if dep != source]
+    return []
+
+def read_time_trace(trace_file, limit=50):
+    """读取 clang -ftime-trace 的结果，返回各头文件的解析耗时（秒）"""
+    try:
+        with open(trace_file, 'r', encoding='utf-8') as f:
+            events = json.load(f).get('traceEvents', [])
+    except (OSError, ValueError):
+        return None
+    durations = {}
+    for event in events:
+        if event.get('name') == 'Source' and event.get('dur'):
+            header = event.get('args', {}).get('detail')
+            if header:
+                durations[header] = durations.get(header, 0) + event['dur'] / 1e6
+    top = sorted(durations.items(), key=lambda item: item[1], reverse=True)[:limit]
+    return {header: round(seconds, 4) for header, seconds in top}
+
+def _peak_rss_kb():
+    """已结束子进程的峰值内存（KB），不支持的平台返回 None"""
+    try:
+        import resource
+    except ImportError:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    # macOS 的单位是字节，Linux 是 KB
+    return rss // 1024 if sys.platform == 'darwin' else rss
+
+def run_profiled(log_path, cmd):
+    """执行编译命令并记录耗时，返回编译命令的退出码"""
+    if cmd and cmd[0] == '--':
+        cmd = cmd[1:]
+    # 第一个参数为空时（如未找到编译器缓存）直接跳过
+    while cmd and not cmd[0]:
+        cmd = cmd[1:]
+    if not cmd:
+        print_error(f"{PROFILE_EXEC_FLAG} 缺少要执行的编译命令")
+        return 2
+
+    output = _compile_output(cmd)
+    trace_file = None
+    compiler = os.path.basename(next((arg for arg in cmd if not arg.endswith(('ccache', 'sccache'))), cmd[0]))
+    if 'clang' in compiler and output and '-c' in cmd:
+        # clang 的 -ftime-trace 会在输出文件旁生成同名的 .json
+        cmd = cmd + ['-ftime-trace']
+        trace_file = os.path.splitext(output)[0] + '.json'
+
+    start = time.perf_counter()
+    try:
+        returncode = subprocess.call(cmd)
+    except OSError as e:
+        print_error(f"无法执行编译命令 {cmd[0]}: {e}")
+        return 127
+    wall = time.perf_counter() - start
+
+    # 统计失败不能影响编译结果
+    try:
+        source = _compile_source(cmd)
+        record = {
+            'time': datetime.now().isoformat(timespec='seconds'),
+            'source': source,
+            'output': output,
+            'wall': round(wall, 4),
+            'peak_rss_kb': _peak_rss_kb(),
+            'output_size': os.path.getsize(output) if output and os.path.isfile(output) else None,
+            'returncode': returncode,
+        }
+        depfile = _compile_depfile(cmd, output)
+        if depfile:
+            record['includes'] = read_depfile(depfile, source)
+        if trace_file:
+            record['trace'] = read_time_trace(trace_file)
+        directory = os.path.dirname(os.path.abspath(log_path))
+        os.makedirs(directory, exist_ok=True)
+        # 一次写入一整行，并行编译时追加写入不会交错
+        with open(log_path, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(record, ensure_ascii=False) + '\n')
+    except Exception:
+        pass
+    return returncode
+
+def load_build_profile(log_path):
+    """读取编译耗时记录，同一个输出文件只保留最新的一条"""
+    records = {}
+    with open(log_path, 'r', encoding='utf-8') as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            if record.get('source'):
+                records[record.get('output') or record['source']] = record
+    return list(records.values())
+
+def _format_size(size):
+    """格式化文件大小"""
+    if size is None:
+        return '-'
+    for unit in ('B', 'KB', 'MB'):
+        if size < 1024 or unit == 'MB':
+            return f"{size:.0f}{unit}" if unit == 'B' else f"{size:.1f}{unit}"
+        size /= 1024
+
+def print_build_profile_report(log_path, top=PROFILE_TOP_DEFAULT):
+    """输出最慢的编译单元和头文件"""
+    records = load_build_profile(log_path)
+    if not records:
+        print_warning(f"没有编译耗时记录: {log_path}")
+        return False
+
+    total = sum(record['wall'] for record in records)
+    print_info(f"共 {len(records)} 个编译单元，编译耗时合计 {total:.1f}s（并行构建时大于实际构建时间）")
+    print()
+    print_info(f"最慢的 {min(top, len(records))} 个编译单元：")
+    print(f"  {'耗时':>6}  {'峰值内存':>4}  {'输出大小':>4}  文件")
+    for record in sorted(records, key=lambda r: r['wall'], reverse=True)[:top]:
+        rss = record.get('peak_rss_kb')
+        rss = _format_size(rss * 1024) if rss is not None else '-'
+        failed = '（编译失败）' if record.get('returncode') else ''
+        print(f"  {record['wall']:>7.2f}s  {rss:>8}  {_format_size(record.get('output_size')):>8}  "
+              f"{record['source']}{failed}")
+
+    # 有 -ftime-trace 数据时使用头文件的实际解析耗时，否则按包含该头文件的编译单元耗时估算
+    headers = {}
+    traced = [record for record in records if record.get('trace')]
+    if traced:
+        for record in traced:
+            for header, seconds in record['trace'].items():
+                cost, count = headers.get(header, (0, 0))
+                headers[header] = (cost + seconds, count + 1)
+        title = "解析最慢的头文件（-ftime-trace）："
+    else:
+        for record in records:
+            for header in record.get('includes') or []:
+                cost, count = headers.get(header, (0, 0))
+                headers[header] = (cost + record['wall'], count + 1)
+        title = "影响最大的头文件（按包含该头文件的编译单元耗时合计估算）："
+    if headers:
+        print()
+        print_info(title)
+        print(f"  {'耗时':>6}  {'编译单元':>4}  头文件")
+        for header, (cost, count) in sorted(headers.items(), key=lambda item: item[1][0], reverse=True)[:top]:
+            print(f"  {cost:>7.2f}s  {count:>8}  {header}")
+    return True
+
+# 监视模式（--watch）
+# 轮询项目目录中的 CMake 工具链文件，STM32CubeMX 重新生成（覆盖）后立即自动重新修复，不需要确认
+WATCH_INTERVAL = 0.1  # 秒，检查文件是否变化的间隔
+WATCH_RESCAN_INTERVAL = 2.0  # 秒，重新搜索新文件的间隔
+WATCH_SETTLE_TIME = 0.05  # 秒，文件在这段时间内不再变化才认为写入完成
+
+def _watch_stat(filepath):
+    """用于判断文件是否变化的 (inode, 大小, 修改时间)，文件不存在时返回 None"""
+    try:
+        st = os.stat(filepath)
+    except OSError:
+        return None
+    return (st.st_ino, st.st_size, st.st_mtime_ns)
+
+def watch_files(find_files, handle, interval=WATCH_INTERVAL):
+    """轮询监视文件，文件首次发现、被修改或删除后重新生成时调用 handle(文件路径)"""
+    known = {}  # 文件路径 -> 上次处理时的状态
+    last_scan = None
+    while True:
+        now = time.monotonic()
+        if last_scan is None or now - last_scan >= WATCH_RESCAN_INTERVAL:
+            for filepath in find_files():
+                known.setdefault(os.path.abspath(filepath), None)
+            last_scan = now
+        for filepath, previous in list(known.items()):
+            current = _watch_stat(filepath)
+            if current is None or current == previous:
+                # 文件被删除时继续监视，重新生成后立即处理
+                known[filepath] = current
+                continue
+            time.sleep(WATCH_SETTLE_TIME)
+            if _watch_stat(filepath) != current:
+                continue  # 仍在写入，下一轮再检查
+            handle(filepath)
+            known[filepath] = _watch_stat(filepath)
+        time.sleep(interval)
+
+# 配置验证（--verify）
+# 修复后在线程池中并行运行每个项目的 CMake 配置，每个项目使用独立的临时构建目录
+# （不影响项目自己的构建目录，验证后删除），汇总每个项目的配置耗时和错误
+VERIFY_BUILD_TYPE = 'Debug'
+VERIFY_TIMEOUT = 300  # 秒，单个项目配置的超时时间
+VERIFY_ERROR_LINES = 20  # 报告中每个项目最多列出的错误输出行数
+
+def _verify_errors(output):
+    """从 CMake 输出中提取错误信息（CMake Error 段落），没有时返回输出的最后几行"""
+    errors = []
+    capture = False
+    for line in output.splitlines():
+        if line.startswith('CMake Error'):
+            capture = True
+        elif capture and line and not line[0].isspace():
+            capture = False
+        if capture:
+            errors.append(line.rstrip())
+    if not errors:
+        errors = [line.rstrip() for line in output.splitlines()[-VERIFY_ERROR_LINES:]]
+    errors = errors[:VERIFY_ERROR_LINES]
+    while errors and not errors[-1]:
+        errors.pop()
+    return errors
+
+def verify_configure(toolchain_path, generator=None, timeout=VERIFY_TIMEOUT):
+    """在独立的临时构建目录中运行一次 CMake 配置，返回验证结果"""
+    toolchain_path = os.path.abspath(toolchain_path)
+    project_root = find_project_root(toolchain_path)
+    result = {'toolchain': toolchain_path, 'project': project_root, 'ok': False, 'time': 0.0, 'errors': []}
+    if not project_root:
+        result['errors'] = ['没有找到包含 project() 的 CMakeLists.txt']
+        return result
+
+    build_dir = tempfile.mkdtemp(prefix='cubemx-verify-')
+    cmd = ['cmake', '-S', project_root, '-B', build_dir,
+           f'-DCMAKE_TOOLCHAIN_FILE={toolchain_path}', f'-DCMAKE_BUILD_TYPE={VERIFY_BUILD_TYPE}']
+    if generator:
+        cmd += ['-G', generator]
+    start = time.perf_counter()
+    try:
+        process = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+                                 encoding='utf-8', errors='replace', timeout=timeout)
+        result['ok'] = process.returncode == 0
+        if not result['ok']:
+            result['errors'] = _verify_errors(process.stdout)
+    except subprocess.TimeoutExpired:
+        result['errors'] = [f'配置超时（{timeout} 秒）']
+    except OSError as e:
+        result['errors'] = [f'无法运行 cmake: {e}']
+    finally:
+        result['time'] = time.perf_counter() - start
+        shutil.rmtree(build_dir, ignore_errors=True)
+    return result
+
+def verify_projects(toolchain_files, jobs=None, timeout=VERIFY_TIMEOUT):
+    """并行验证多个项目的 CMake 配置，返回按工具链文件路径排序的结果"""
+    jobs = jobs or os.cpu_count() or 1
+    # 有 Ninja 时使用 Ninja（与生成的 CMake 预设一致，生成构建文件也更快）
+    generator = 'Ninja' if shutil.which('ninja') else None
+    print_info(f"开始验证 {len(toolchain_files)} 个项目的 CMake 配置（{min(jobs, len(toolchain_files))} 个并行任务）")
+    results = []
+    with ThreadPoolExecutor(max_workers=jobs) as pool:
+        futures = [pool.submit(verify_configure, path, generator, timeout) for path in toolchain_files]
+        for future in as_completed(futures):
+            result = future.result()
+            name = result['project'] or result['toolchain']
+            if result['ok']:
+                print_success(f"配置通过（{result['time']:.2f}s）: {name}")
+            else:
+                print_error(f"配置失败（{result['time']:.2f}s）: {name}")
+            results.append(result)
+    return sorted(results, key=lambda result: result['toolchain'])
+
+def print_verify_report(results, elapsed):
+    """输出配置验证报告，全部通过时返回 True"""
+    print_info(f"配置验证报告（{len(results)} 个项目，总耗时 {elapsed:.2f}s）：")
+    print(f"  {'结果':<4}  {'耗时':>8}  项目")
+    for result in results:
+        status = '通过' if result['ok'] else '失败'
+        print(f"  {status:<4}  {result['time']:>7.2f}s  {result['project'] or result['toolchain']}")
+
+    failed = [result for result in results if not result['ok']]
+    for result in failed:
+        print()
+        print_error(f"{result['project'] or result['toolchain']}（{result['toolchain']}）：")
+        for line in result['errors']:
+            print(f"    {line}")
+
+    print()
+    serial_time = sum(result['time'] for result in results)
+    if failed:
+        print_error(f"{len(failed)} 个项目配置失败，{len(results) - len(failed)} 个通过")
+    else:
+        print_success(f"全部 {len(results)} 个项目配置通过（逐个运行合计 {serial_time:.2f}s，并行实际 {elapsed:.2f}s）")
+    return not failed
+
+def auto_fix_cmake_toolchain(filepath, options, keep_backups=None, state_cache=None, presets=False):
+    """不询问直接修复：只处理 STM32CubeMX 生成的、尚未修复或修复模板已变化的工具链文件"""
+    state_cache = state_cache or FixStateCache()
+    fingerprint = toolchain_fingerprint(**options)
+    if state_cache.is_current(filepath, fingerprint):
+        return False
+    status = get_fix_status(filepath, fingerprint)
+    if status == 'current':
+        state_cache.record(filepath, fingerprint)
+        return False
+    if status == 'legacy':
+        print_warning(f"{filepath} 似乎已经手动修复过（包含 ARM_TOOLCHAIN_PATH），跳过")
+        return False
+    if status is None and not is_cubemx_cmake_toolchain(filepath):
+        return False
+
+    start = time.perf_counter()
+    if status is None:
+        print_info(f"检测到 STM32CubeMX 生成的工具链文件: {filepath}")
+    else:
+        print_info(f"工具链文件使用旧版本的模板修复过: {filepath}")
+    backup_file(filepath, keep=keep_backups)
+    if not fix_cmake_toolchain(filepath, **options):
+        print_error(f"修复失败: {filepath}")
+        return False
+    state_cache.record(filepath, fingerprint)
+    print_success(f"已自动修复: {filepath}（{(time.perf_counter() - start) * 1000:.0f} ms）")
+    if presets:
+        update_cmake_presets(filepath, keep_backups=keep_backups)
+    return True
+
+def check_environment(toolchain_pin=None):
+    """检查环境变量和工具链"""
+    if toolchain_pin:
+        print_success(f"固定使用工具链: {toolchain_pin}")
+        return True
     arm_toolchain = os.environ.get('ARM_TOOLCHAIN_PATH')
     if not arm_toolchain:
         print_warning("环境变量 ARM_TOOLCHAIN_PATH 未设置")
+        best = select_best_toolchain()
+        if best:
+            print_info(f"找到推荐的工具链: {format_toolchain(best)}")
         print_info("建议执行以下命令：")
-        print("  export ARM_TOOLCHAIN_PATH=\"$HOME/toolchains/arm-gnu-toolchain-14.2.1\"")
+        suggestion = best['path'] if best else '$HOME/toolchains/arm-gnu-toolchain-14.2.1'
+        print(f"  export ARM_TOOLCHAIN_PATH=\"{suggestion}\"")
         print("  # 或添加到 ~/.zshrc 或 ~/.bashrc")
+        if best:
+            print_info("或使用 --pin-toolchain 将推荐的工具链写入配置")
         print()
         response = input("是否继续修复工具链文件？(y/n): ")
         if response.lower() != 'y':
             return False
     else:
         print_success(f"环境变量已设置: {arm_toolchain}")
-        toolchain_gcc = os.path.join(arm_toolchain, 'bin', 'arm-none-eabi-gcc')
+        toolchain_gcc = os.path.join(arm_toolchain, 'bin', TOOLCHAIN_GCC)
         if not os.path.exists(toolchain_gcc):
             print_warning("工具链文件不存在，请检查路径是否正确")
+        else:
+            cache = ToolchainProbeCache()
+            info = cache.probe(arm_toolchain)
+            cache.save()
+            print_info(f"工具链: {format_toolchain(info)}")
+            if info['error'] is None and not info['newlib']:
+                print_warning("该工具链缺少 newlib，链接时可能失败")
     return True
 
+# 支持的编译器缓存（按优先顺序）
+COMPILER_CACHES = ('ccache', 'sccache')
+
+def resolve_compiler_cache(value):
+    """解析 --compiler-cache 参数，'auto' 表示使用找到的第一个编译器缓存"""
+    if not value or value == 'none':
+        return None
+    names = COMPILER_CACHES if value == 'auto' else (value,)
+    for name in names:
+        path = shutil.which(name)
+        if path:
+            print_info(f"使用编译器缓存: {path}")
+            return name
+    print_warning(f"没有找到编译器缓存（{', '.join(names)}），不添加编译器缓存配置")
+    return None
+
+def resolve_toolchain_pin(value):
+    """解析 --pin-toolchain 参数，'auto' 表示自动选择推荐的工具链"""
+    if not value:
+        return None
+    if value == 'auto':
+        best = select_best_toolchain()
+        if best is None:
+            print_error("没有找到可用的 ARM GNU 工具链，无法自动固定")
+            sys.exit(1)
+        print_info(f"自动选择工具链: {format_toolchain(best)}")
+        return os.path.abspath(best['path'])
+    if not os.path.isfile(os.path.join(value, 'bin', TOOLCHAIN_GCC)):
+        print_error(f"不是有效的工具链目录（缺少 bin/{TOOLCHAIN_GCC}）: {value}")
+        sys.exit(1)
+    return os.path.abspath(value)
+
+def parse_args(argv=None):
+    """解析命令行参数"""
+    parser = argparse.ArgumentParser(
+        description="STM32CubeMX CMake 工具链文件自动修复工具",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+使用示例:
+  python3 fix_cubemx_cmake.py
+  python3 fix_cubemx_cmake.py /path/to/project/cmake/gcc-arm-none-eabi.cmake
+  python3 fix_cubemx_cmake.py cmake/gcc-arm-none-eabi.cmake --restore
+  python3 fix_cubemx_cmake.py --prune-backups --keep-backups 3
+  python3 fix_cubemx_cmake.py --verify --jobs 8
+        """
+    )
+    parser.add_argument('filepath', nargs='?',
+                        help='工具链文件路径（不指定时在当前目录自动搜索）')
+    parser.add_argument('--keep-backups', type=int, default=None, metavar='N',
+                        help=f'每个文件保留的备份数量（默认: {BACKUP_KEEP_DEFAULT}）')
+    parser.add_argument('--restore', action='store_true',
+                        help='从最新的备份恢复工具链文件')
+    parser.add_argument('--prune-backups', action='store_true',
+                        help='按保留策略清理备份后退出')
+    parser.add_argument('--force', action='store_true',
+                        help='即使已是最新的修复也重新修复')
+    parser.add_argument('--list-toolchains', action='store_true',
+                        help='列出找到的 ARM GNU 工具链后退出')
+    parser.add_argument('--pin-toolchain', nargs='?', const='auto', metavar='DIR',
+                        help='将工具链路径写入配置（不指定 DIR 时自动选择推荐的工具链）')
+    parser.add_argument('--presets', action='store_true',
+                        help='生成或更新 CMakePresets.json（Ninja、驱动目标 Unity Build、HAL 头文件预编译）')
+    parser.add_argument('--compiler-cache', nargs='?', const='auto', choices=('auto', 'none') + COMPILER_CACHES,
+                        help='为编译器添加 ccache/sccache 缓存（默认: auto，使用找到的第一个）')
+    parser.add_argument('--watch', nargs='?', const='.', metavar='DIR',
+                        help='监视目录（默认: 当前目录）中的工具链文件，STM32CubeMX 重新生成后自动修复（Ctrl+C 退出）')
+    parser.add_argument('--profile-build', action='store_true',
+                        help=f'为编译器添加耗时统计启动器，记录每个文件的编译耗时到构建目录的 {PROFILE_LOG_NAME}')
+    parser.add_argument('--profile-report', metavar='LOG',
+                        help='汇总编译耗时记录，列出最慢的编译单元和头文件后退出')
+    parser.add_argument('--profile-top', type=int, default=PROFILE_TOP_DEFAULT, metavar='N',
+                        help=f'--profile-report 列出的数量（默认: {PROFILE_TOP_DEFAULT}）')
+    parser.add_argument('--release-profile', nargs='?', const='size', choices=tuple(RELEASE_PROFILE_OPT),
+                        help='添加发布优化配置：Release 使用 -Os（size，默认）或 -O2（speed）、LTO 和段回收')
+    parser.add_argument('--verify', action='store_true',
+                        help='修复后在独立的临时构建目录中并行运行每个项目的 CMake 配置，汇总配置耗时和错误')
+    parser.add_argument('-j', '--jobs', type=int, default=None, metavar='N',
+                        help='--verify 的并行任务数（默认: CPU 核心数）')
+    parser.add_argument('--web-assets', nargs='?', const=WEB_ASSETS_DIR_DEFAULT, metavar='DIR',
+                        help=f'添加网页资源构建规则：将项目中 DIR（默认: {WEB_ASSETS_DIR_DEFAULT}）下的 HTML/CSS/JS 逐个转换为 C 源文件并编译链接')
+    args = parser.parse_args(argv)
+    # 在修改任何文件之前检查参数
+    if args.jobs is not None and args.jobs < 1:
+        parser.error('--jobs 必须大于 0')
+    return args
+
 def main():
     """主函数"""
+    # 作为编译器启动器运行（由 --profile-build 生成的配置调用），不输出其他信息
+    if len(sys.argv) > 2 and sys.argv[1] == PROFILE_EXEC_FLAG:
+        sys.exit(run_profiled(sys.argv[2], sys.argv[3:]))
+    
     print_info("=" * 50)
     print_info("STM32CubeMX CMake 工具链文件自动修复工具")
     print_info("=" * 50)
     print()
     
+    args = parse_args()
+    
+    # 列出工具链
+    if args.list_toolchains:
+        print_toolchains(discover_toolchains())
+        sys.exit(0)
+    
+    # 汇总编译耗时
+    if args.profile_report:
+        if not os.path.isfile(args.profile_report):
+            print_error(f"文件不存在: {args.profile_report}")
+            sys.exit(1)
+        sys.exit(0 if print_build_profile_report(args.profile_report, args.profile_top) else 1)
+    
+    # 工具链配置选项
+    options = {
+        'toolchain_pin': resolve_toolchain_pin(args.pin_toolchain),
+        'compiler_cache': resolve_compiler_cache(args.compiler_cache),
+        'release_profile': args.release_profile,
+        'build_profile': args.profile_build,
+        'web_assets': args.web_assets,
+    }
+    
+    # 监视模式
+    if args.watch:
+        if not options['toolchain_pin'] and not os.environ.get('ARM_TOOLCHAIN_PATH'):
+            print_warning("环境变量 ARM_TOOLCHAIN_PATH 未设置，编译时将使用系统 PATH 中的工具链")
+        print_info(f"开始监视 {os.path.abspath(args.watch)} 中的 CMake 工具链文件（Ctrl+C 退出）")
+        state_cache = FixStateCache()
+        try:
+            watch_files(lambda: find_cmake_toolchain_files(args.watch),
+                        lambda path: auto_fix_cmake_toolchain(path, options, args.keep_backups,
+                                                              state_cache, presets=args.presets))
+        except KeyboardInterrupt:
+            print()
+            print_info("已停止监视")
+        sys.exit(0)
+    
+    # 清理备份
+    if args.prune_backups:
+        search_files = [args.filepath] if args.filepath else find_cmake_toolchain_files('.')
+        removed = 0
+        for root in sorted({BackupStore.for_file(f).root for f in search_files}):
+            removed += BackupStore(root, keep=args.keep_backups).prune()
+        print_success(f"备份清理完成，删除了 {removed} 份不再保留的备份")
+        sys.exit(0)
+    
     # 获取文件路径
-    if len(sys.argv) > 1:
-        filepath = sys.argv[1]
+    if args.filepath:
+        filepath = args.filepath
         # 转换为绝对路径，支持从任何位置运行
         if not os.path.isabs(filepath):
             # 如果是相对路径，基于当前工作目录解析
             filepath = os.path.abspath(filepath)
-        if not os.path.exists(filepath):
-            print_error(f"文件不存在: {filepath}")
-            # 检查是否有备份文件
-            backup_files = []
-            file_dir = os.path.dirname(filepath) if os.path.dirname(filepath) else '.'
-            if os.path.exists(file_dir):
-                for f in os.listdir(file_dir):
-                    if f.startswith(os.path.basename(filepath) + '.backup.'):
-                        backup_files.append(os.path.join(file_dir, f))
-            
-            if backup_files:
-                print_warning("发现备份文件：")
-                for bf in sorted(backup_files):
-                    print(f"  - {bf}")
+        store = BackupStore.for_file(filepath, keep=args.keep_backups)
+        if args.restore or not os.path.exists(filepath):
+            if not os.path.exists(filepath):
+                print_error(f"文件不存在: {filepath}")
+            # 通过备份索引直接找到最新的备份
+            entry = store.latest(filepath)
+            if entry:
+                print_warning(f"发现备份：{store.object_path(entry['hash'])}（{entry['time']}）")
                 print()
-                response = input("是否从最新的备份文件恢复？(y/n): ")
-                if response.lower() == 'y':
-                    latest_backup = sorted(backup_files)[-1]
-                    import shutil
-                    shutil.copy2(latest_backup, filepath)
-                    print_success(f"已从备份恢复: {latest_backup} -> {filepath}")
+                if args.restore or input("是否从最新的备份文件恢复？(y/n): ").lower() == 'y':
+                    backup_path = store.restore(filepath)
+                    print_success(f"已从备份恢复: {backup_path} -> {filepath}")
                     print_info("现在可以重新运行修复脚本")
+                    sys.exit(0)
                 else:
                     print_info("提示：")
-                    print_info("  1. 从备份恢复：cp <备份文件> <目标文件>")
+                    print_info(f"  1. 从备份恢复：python3 fix_cubemx_cmake.py {filepath} --restore")
                     print_info("  2. 或从 STM32CubeMX 重新生成项目")
             else:
                 print_info("提示：如果文件被删除，可以：")
@@ -351,8 +1851,8 @@ def main():
             print_info("  2. 文件不在常见位置")
             print_info("")
             print_info("解决方法：")
-            print_info("  1. 检查备份文件：ls cmake/*.backup.*")
-            print_info("  2. 从备份恢复：cp cmake/gcc-arm-none-eabi.cmake.backup.* cmake/gcc-arm-none-eabi.cmake")
+            print_info("  1. 检查备份索引：cat cmake/.cubemx-fix/index.json")
+            print_info("  2. 从备份恢复：python3 fix_cubemx_cmake.py cmake/gcc-arm-none-eabi.cmake --restore")
             print_info("  3. 或从 STM32CubeMX 重新生成项目")
             print_info("  4. 或手动指定文件路径：python3 fix_cubemx_cmake.py <文件路径>")
             print()
@@ -361,8 +1861,10 @@ def main():
                 # 尝试搜索更广泛的模式
                 all_cmake_files = []
                 for root, dirs, files in os.walk('.'):
+                    dirs[:] = [d for d in dirs if d not in WATCH_SKIP_DIRS]
                     for file in files:
-                        if file.endswith('.cmake') and 'toolchain' in file.lower():
+                        if (file.endswith('.cmake') and 'toolchain' in file.lower() and
+                                not is_generated_cmake_file(os.path.join(root, file))):
                             all_cmake_files.append(os.path.join(root, file))
                 if all_cmake_files:
                     print_info(f"找到 {len(all_cmake_files)} 个可能的工具链文件：")
@@ -375,12 +1877,21 @@ def main():
                 sys.exit(1)
         print_info(f"找到 {len(toolchain_files)} 个可能的工具链文件")
     
+    # 验证配置需要 cmake，在修改文件之前检查
+    if args.verify and not shutil.which('cmake'):
+        print_error("没有找到 cmake，无法验证配置")
+        sys.exit(1)
+
     # 检查环境变量
-    if not check_environment():
+    if not check_environment(options['toolchain_pin']):
         sys.exit(0)
     
     # 处理每个文件（去重，使用绝对路径）
     fixed_count = 0
+    fingerprint = toolchain_fingerprint(**options)
+    state_cache = FixStateCache()
+    up_to_date_files = []  # 已是最新修复或本次修复成功的文件
+    failed_files = []  # 修复失败的文件（--verify 报告中列为失败）
     processed_files = set()  # 用于跟踪已处理的文件
     
     for filepath in toolchain_files:
@@ -394,16 +1905,31 @@ def main():
         print()
         print_info(f"处理文件: {filepath}")
         
+        # 快速检查：文件自上次修复后未变化时无需读取即可跳过
+        if not args.force and state_cache.is_current(filepath, fingerprint):
+            print_success("文件未变化，且已是最新的修复，跳过")
+            up_to_date_files.append(filepath)
+            continue
+        
+        # 检查是否已经修复过
+        status = get_fix_status(filepath, fingerprint)
+        if status == 'current' and not args.force:
+            state_cache.record(filepath, fingerprint)
+            print_success("工具链文件已是最新的修复，跳过（使用 --force 强制重新修复）")
+            up_to_date_files.append(filepath)
+            continue
+        
         # 检查是否是 STM32CubeMX 生成的
-        if not is_cubemx_cmake_toolchain(filepath):
+        if status is None and not is_cubemx_cmake_toolchain(filepath):
             print_warning("这可能不是 STM32CubeMX 生成的 CMake 工具链文件")
             response = input("是否继续修复此文件？(y/n): ")
             if response.lower() != 'y':
                 print_info(f"跳过文件: {filepath}")
                 continue
         
-        # 检查是否已经修复过
-        if is_already_fixed(filepath):
+        if status == 'outdated':
+            print_info("工具链文件使用旧版本的模板修复过，自动重新修复")
+        elif status == 'legacy' and not args.force:
             print_warning("工具链文件似乎已经修复过（包含 ARM_TOOLCHAIN_PATH）")
             print_info("提示：如果这是新工程，可能是文件内容已包含 ARM_TOOLCHAIN_PATH 配置")
             response = input("是否重新修复此文件？(y/n): ")
@@ -412,19 +1938,29 @@ def main():
                 continue
         
         # 备份文件
-        backup_path = backup_file(filepath)
+        backup_path = backup_file(filepath, keep=args.keep_backups)
         if backup_path:
             print_info(f"已备份原文件到: {backup_path}")
         
         # 修复文件
         print_info(f"开始修复工具链文件: {filepath}")
-        if fix_cmake_toolchain(filepath):
+        if fix_cmake_toolchain(filepath, **options):
+            state_cache.record(filepath, fingerprint)
             print_success("工具链文件修复完成！")
             fixed_count += 1
+            up_to_date_files.append(filepath)
             if backup_path:
                 print_info(f"备份文件: {backup_path}")
         else:
             print_error("修复失败")
+            failed_files.append(filepath)
+    
+    # 生成 CMake 预设
+    if args.presets:
+        for filepath in up_to_date_files:
+            print()
+            print_info(f"更新 CMake 预设: {filepath}")
+            update_cmake_presets(filepath, keep_backups=args.keep_backups)
     
     # 总结
     print()
@@ -445,6 +1981,22 @@ def main():
         print_info("  1. 所有文件都已修复过")
         print_info("  2. 跳过了所有文件")
         print_info("  3. 文件不是标准的 STM32CubeMX 工具链文件")
+    
+    # 验证配置
+    if args.verify:
+        print()
+        if not up_to_date_files and not failed_files:
+            print_warning("没有可以验证的工具链文件")
+            sys.exit(1)
+        start = time.perf_counter()
+        results = verify_projects(up_to_date_files, args.jobs) if up_to_date_files else []
+        # 修复失败的文件不运行配置，直接列为失败
+        results = sorted(results + [{'toolchain': path, 'project': find_project_root(path), 'ok': False, 'time': 0.0,
+                                     'errors': ['修复工具链文件失败，没有验证配置']} for path in failed_files],
+                         key=lambda result: result['toolchain'])
+        print()
+        if not print_verify_report(results, time.perf_counter() - start):
+            sys.exit(1)
 
 if __name__ == '__main__':
     main()
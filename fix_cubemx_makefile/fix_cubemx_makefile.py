@@ -18,7 +18,15 @@
 import sys
 import os
 import re
-from datetime import datetime
+import glob
+import argparse
+import hashlib
+import json
+import subprocess
+import shutil
+import tempfile
+import time
+from datetime import datetime, timedelta
 from pathlib import Path
 
 # 颜色输出
@@ -65,131 +73,473 @@ def is_already_fixed(filepath):
     except:
         return False
 
-def backup_file(filepath):
-    """备份文件"""
-    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-    backup_path = f"{filepath}.backup.{timestamp}"
+# 备份仓库
+# 备份按内容哈希（SHA-256）存放在被修复文件所在目录的 .cubemx-fix/ 中，
+# 相同内容只保存一份；index.json 记录每个文件的备份历史（最新的在最后），
+# 所有写入都先写临时文件再 rename，保证中途中断不会留下损坏的备份
+BACKUP_DIR_NAME = '.cubemx-fix'
+BACKUP_INDEX_NAME = 'index.json'
+# 每个文件默认保留的备份数量，可通过 --keep-backups 或环境变量 CUBEMX_FIX_BACKUP_KEEP 修改
+BACKUP_KEEP_DEFAULT = 10
+
+_invalid_env_warned = set()
+
+def backup_setting_from_env(name, convert, default):
+    """读取备份保留策略的环境变量，值无效时给出警告（每个变量只提示一次）并使用默认值"""
+    value = os.environ.get(name)
+    if not value:
+        return default
+    try:
+        return convert(value)
+    except ValueError:
+        if name not in _invalid_env_warned:
+            _invalid_env_warned.add(name)
+            fallback = f"，使用默认值 {default}" if default is not None else ""
+            print_warning(f"环境变量 {name} 的值无效: {value}（需要是数字），已忽略{fallback}")
+        return default
+
+def atomic_write(filepath, data):
+    """原子写入文件（临时文件 + rename）"""
+    directory = os.path.dirname(os.path.abspath(filepath))
+    fd, tmp_path = tempfile.mkstemp(prefix='.tmp-', dir=directory)
+    try:
+        # 覆盖已有文件时保留其权限（mkstemp 创建的临时文件只有所有者可读写）
+        if os.path.exists(filepath):
+            shutil.copymode(filepath, tmp_path)
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, filepath)
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+        raise
+
+class BackupStore:
+    """按内容哈希寻址的备份仓库
+
+    目录结构：
+        .cubemx-fix/index.json            备份索引
+        .cubemx-fix/objects/ab/abcdef...  备份内容（文件名为 SHA-256）
+    """
+    def __init__(self, root, keep=None, max_age_days=None):
+        self.root = root
+        self.objects_dir = os.path.join(root, 'objects')
+        self.index_path = os.path.join(root, BACKUP_INDEX_NAME)
+        if keep is None:
+            keep = backup_setting_from_env('CUBEMX_FIX_BACKUP_KEEP', int, BACKUP_KEEP_DEFAULT)
+        if max_age_days is None:
+            max_age_days = backup_setting_from_env('CUBEMX_FIX_BACKUP_MAX_AGE_DAYS', float, None)
+        self.keep = keep
+        self.max_age_days = max_age_days
+        self._index = None
+
+    @classmethod
+    def for_file(cls, filepath, **kwargs):
+        """获取文件所在目录的备份仓库"""
+        directory = os.path.dirname(os.path.abspath(filepath))
+        return cls(os.path.join(directory, BACKUP_DIR_NAME), **kwargs)
+
+    def _load_index(self):
+        if self._index is None:
+            try:
+                with open(self.index_path, 'r', encoding='utf-8') as f:
+                    self._index = json.load(f)
+            except (OSError, ValueError):
+                self._index = {}
+            self._index.setdefault('version', 1)
+            self._index.setdefault('files', {})
+        return self._index
+
+    def _save_index(self):
+        data = json.dumps(self._load_index(), ensure_ascii=False, indent=2, sort_keys=True)
+        atomic_write(self.index_path, data.encode('utf-8'))
+
+    def _ensure_root(self):
+        if not os.path.isdir(self.root):
+            os.makedirs(self.objects_dir, exist_ok=True)
+            # 备份目录不应被提交到版本库
+            atomic_write(os.path.join(self.root, '.gitignore'), b'*\n')
+        else:
+            os.makedirs(self.objects_dir, exist_ok=True)
+
+    def object_path(self, digest):
+        """备份内容的存放路径"""
+        return os.path.join(self.objects_dir, digest[:2], digest)
+
+    def entries(self, filepath):
+        """文件的备份历史（按时间从旧到新）"""
+        return list(self._load_index()['files'].get(os.path.basename(filepath), []))
+
+    def latest(self, filepath):
+        """文件最新的备份记录，没有时返回 None"""
+        entries = self.entries(filepath)
+        return entries[-1] if entries else None
+
+    def save(self, filepath):
+        """备份文件，返回备份内容的路径；内容与已有备份相同时不会重复存储"""
+        with open(filepath, 'rb') as f:
+            data = f.read()
+        digest = hashlib.sha256(data).hexdigest()
+        self._ensure_root()
+
+        object_path = self.object_path(digest)
+        if not os.path.exists(object_path):
+            os.makedirs(os.path.dirname(object_path), exist_ok=True)
+            atomic_write(object_path, data)
+
+        files = self._load_index()['files']
+        history = files.setdefault(os.path.basename(filepath), [])
+        entry = {
+            'hash': digest,
+            'size': len(data),
+            'time': datetime.now().strftime('%Y-%m-%dT%H:%M:%S'),
+        }
+        # 与最新备份相同则只刷新时间，不新增记录
+        if history and history[-1]['hash'] == digest:
+            history[-1] = entry
+        else:
+            history.append(entry)
+        self.prune(save=False)
+        self._save_index()
+        return object_path
+
+    def restore(self, filepath, digest=None):
+        """从备份恢复文件（默认恢复最新的备份），返回使用的备份路径"""
+        if digest is None:
+            entry = self.latest(filepath)
+            if entry is None:
+                return None
+            digest = entry['hash']
+        object_path = self.object_path(digest)
+        with open(object_path, 'rb') as f:
+            atomic_write(filepath, f.read())
+        return object_path
+
+    def prune(self, save=True):
+        """按保留策略清理旧备份，并删除不再被引用的备份内容，返回删除的内容数量"""
+        files = self._load_index()['files']
+        cutoff = None
+        if self.max_age_days is not None:
+            cutoff = (datetime.now() - timedelta(days=self.max_age_days)).strftime('%Y-%m-%dT%H:%M:%S')
+        for name, history in list(files.items()):
+            # 最新的一份总是保留
+            kept = history[-max(self.keep, 1):]
+            if cutoff is not None:
+                kept = [e for e in kept[:-1] if e['time'] >= cutoff] + kept[-1:]
+            files[name] = kept
+
+        referenced = {e['hash'] for history in files.values() for e in history}
+        removed = 0
+        if os.path.isdir(self.objects_dir):
+            for bucket in os.listdir(self.objects_dir):
+                bucket_dir = os.path.join(self.objects_dir, bucket)
+                if not os.path.isdir(bucket_dir):
+                    continue
+                for digest in os.listdir(bucket_dir):
+                    if digest not in referenced:
+                        os.unlink(os.path.join(bucket_dir, digest))
+                        removed += 1
+        if save:
+            self._save_index()
+        return removed
+
+def backup_file(filepath, keep=None):
+    """备份文件到 .cubemx-fix/ 备份仓库"""
     try:
-        import shutil
-        shutil.copy2(filepath, backup_path)
-        return backup_path
+        return BackupStore.for_file(filepath, keep=keep).save(filepath)
     except Exception as e:
         print_error(f"备份失败: {e}")
         return None
 
-def fix_makefile(filepath):
-    """修复 Makefile"""
+# 修复指纹
+# 生成的工具链配置首行带有版本化的指纹标记，指纹为配置内容的哈希，
+# 模板或选项变化后指纹随之变化，据此区分“已是最新修复”和“旧版本修复”
+FIX_TEMPLATE_VERSION = 1
+FIX_MARKER_PREFIX = '# cubemx-fix: toolchain'
+_FIX_MARKER_RE = re.compile(r'^\s*# cubemx-fix: toolchain v(\d+) ([0-9a-f]+)')
+
+def block_fingerprint(block):
+    """计算工具链配置的指纹"""
+    data = f"v{FIX_TEMPLATE_VERSION}\n{block}".encode('utf-8')
+    return hashlib.sha256(data).hexdigest()[:16]
+
+def fix_marker(fingerprint):
+    """生成工具链配置的指纹标记行"""
+    return f"{FIX_MARKER_PREFIX} v{FIX_TEMPLATE_VERSION} {fingerprint}（自动生成的标记，请勿修改）\n"
+
+def read_fix_marker(filepath):
+    """读取文件中的指纹标记，返回 (版本, 指纹)，没有标记时返回 None"""
     try:
         with open(filepath, 'r', encoding='utf-8') as f:
-            content = f.read()
-            lines = content.splitlines(True)
-    except Exception as e:
-        print_error(f"读取文件失败: {e}")
-        return False
-    
-    # 查找 PREFIX 定义的位置
-    prefix_line = -1
-    for i, line in enumerate(lines):
-        if re.match(r'^\s*PREFIX\s*=\s*arm-none-eabi-', line):
-            prefix_line = i
-            break
-    
-    if prefix_line == -1:
-        print_error("无法找到 PREFIX 定义，可能不是标准的 STM32CubeMX Makefile")
-        return False
-    
-    print_info(f"找到 PREFIX 定义在第 {prefix_line + 1} 行")
-    
-    # 查找 binaries 部分开始（在 PREFIX 之前）
-    binaries_start = -1
-    for i in range(prefix_line, -1, -1):
-        if '# binaries' in lines[i] or '#######################################' in lines[i]:
-            binaries_start = i
-            break
-    
-    if binaries_start != -1:
-        print_info(f"找到 binaries 部分标题在第 {binaries_start + 1} 行")
-    
-    # 查找工具链配置部分的结束位置
-    # 策略：查找从 PREFIX 开始到工具链命令定义结束的所有行
-    # 典型的 STM32CubeMX 结构：
-    #   PREFIX = arm-none-eabi-
-    #   ifdef GCC_PATH
-    #   CC = $(GCC_PATH)/$(PREFIX)gcc
-    #   AS = ...
-    #   CP = ...
-    #   SZ = ...
-    #   else
-    #   CC = $(PREFIX)gcc
-    #   AS = ...
-    #   CP = ...
-    #   SZ = ...
-    #   endif
-    #   HEX = ...
-    #   BIN = ...
-    
-    # 查找 ifdef GCC_PATH 和对应的 endif
-    gcc_path_start = -1
-    gcc_path_end = -1
-    else_line = -1
-    
-    # 首先查找 ifdef GCC_PATH
-    for i in range(prefix_line, min(prefix_line + 50, len(lines))):
-        if 'ifdef GCC_PATH' in lines[i]:
-            gcc_path_start = i
-            break
-    
-    # 如果找到 ifdef，查找对应的 else 和 endif
-    if gcc_path_start != -1:
-        print_info(f"找到 ifdef GCC_PATH 在第 {gcc_path_start + 1} 行")
-        # 查找 else
-        for i in range(gcc_path_start + 1, min(gcc_path_start + 30, len(lines))):
-            if re.match(r'^\s*else\s*$', lines[i]):
-                else_line = i
-                break
-        # 查找 endif
-        if else_line != -1:
-            for i in range(else_line + 1, min(else_line + 20, len(lines))):
-                if re.match(r'^\s*endif\s*$', lines[i]):
-                    gcc_path_end = i
-                    break
-        else:
-            # 没有 else，直接找 endif
-            for i in range(gcc_path_start + 1, min(gcc_path_start + 20, len(lines))):
-                if re.match(r'^\s*endif\s*$', lines[i]):
-                    gcc_path_end = i
-                    break
-    
-    # 如果没有找到 GCC_PATH 部分，查找下一个重要标记
-    if gcc_path_end == -1:
-        # 查找 HEX 或 BIN 定义（这些通常在工具链配置之后）
-        for i in range(prefix_line + 1, min(prefix_line + 30, len(lines))):
-            if re.match(r'^\s*HEX\s*=', lines[i]) or re.match(r'^\s*BIN\s*=', lines[i]):
-                gcc_path_end = i - 1
-                print_info(f"通过 HEX/BIN 定义定位，工具链配置结束于第 {gcc_path_end + 1} 行")
-                break
-        
-        # 如果还是没找到，查找空行或注释行（作为分隔符）
-        if gcc_path_end == -1:
-            for i in range(prefix_line + 1, min(prefix_line + 25, len(lines))):
-                # 跳过工具链命令定义行
-                if re.match(r'^\s*(CC|AS|CP|SZ)\s*=', lines[i]):
-                    continue
-                # 如果遇到空行或注释行，且前面有工具链定义
-                if (lines[i].strip() == '' or lines[i].strip().startswith('#')) and i > prefix_line + 3:
-                    gcc_path_end = i - 1
-                    print_info(f"通过空行/注释定位，工具链配置结束于第 {gcc_path_end + 1} 行")
-                    break
-    
-    # 如果还是没找到，使用默认范围（但给出警告）
-    if gcc_path_end == -1:
-        gcc_path_end = prefix_line + 15
-        print_warning(f"无法准确定位工具链配置结束位置，使用默认范围（第 {gcc_path_end + 1} 行）")
-    
-    print_info(f"工具链配置部分：第 {prefix_line + 1} 行 到 第 {gcc_path_end + 1} 行")
-    
-    # 生成新的配置
-    new_config = '''# 工具链路径配置（优先级：环境变量 > GCC_PATH > 系统 PATH）
+            for line in f:
+                m = _FIX_MARKER_RE.match(line)
+                if m:
+                    return int(m.group(1)), m.group(2)
+    except (OSError, UnicodeDecodeError):
+        pass
+    return None
+
+def get_fix_status(filepath, fingerprint):
+    """检查文件的修复状态
+
+    返回值：
+        'current'  已使用当前模板修复
+        'outdated' 已修复，但模板版本或选项已变化
+        'legacy'   包含 ARM_TOOLCHAIN_PATH 但没有指纹标记（旧版脚本或手动修改）
+        None       尚未修复
+    """
+    marker = read_fix_marker(filepath)
+    if marker is not None:
+        return 'current' if marker[1] == fingerprint else 'outdated'
+    if is_already_fixed(filepath):
+        return 'legacy'
+    return None
+
+def get_cache_dir():
+    """本工具的缓存目录（可通过环境变量 CUBEMX_FIX_CACHE_DIR 指定）"""
+    cache_dir = os.environ.get('CUBEMX_FIX_CACHE_DIR')
+    if not cache_dir:
+        base = os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+        cache_dir = os.path.join(base, 'cubemx-fix')
+    return cache_dir
+
+class FixStateCache:
+    """已修复文件的状态缓存
+
+    以 (路径, inode, 大小, mtime) 为键记录文件修复时的指纹，
+    文件未变化且指纹与当前模板一致时无需打开文件即可跳过。
+    """
+    def __init__(self, path=None):
+        self.path = path or os.path.join(get_cache_dir(), 'fixed-files.json')
+        self._entries = None
+
+    def _load(self):
+        if self._entries is None:
+            try:
+                with open(self.path, 'r', encoding='utf-8') as f:
+                    self._entries = json.load(f).get('files', {})
+            except (OSError, ValueError):
+                self._entries = {}
+        return self._entries
+
+    @staticmethod
+    def _stat_key(filepath):
+        st = os.stat(filepath)
+        return [st.st_ino, st.st_size, st.st_mtime_ns]
+
+    def is_current(self, filepath, fingerprint):
+        """文件自上次修复后未变化，且指纹与当前模板一致"""
+        entry = self._load().get(os.path.abspath(filepath))
+        if not entry or entry.get('fingerprint') != fingerprint:
+            return False
+        try:
+            return entry.get('stat') == self._stat_key(filepath)
+        except OSError:
+            return False
+
+    def record(self, filepath, fingerprint):
+        """记录文件当前状态"""
+        try:
+            self._load()[os.path.abspath(filepath)] = {
+                'stat': self._stat_key(filepath),
+                'fingerprint': fingerprint,
+            }
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            data = json.dumps({'version': 1, 'files': self._entries}, ensure_ascii=False, indent=1)
+            atomic_write(self.path, data.encode('utf-8'))
+        except OSError as e:
+            print_warning(f"写入修复状态缓存失败: {e}")
+
+# 工具链发现
+# 在常见安装位置中查找 ARM GNU 工具链，探测版本、multilib 和 newlib 支持，
+# 探测结果按 gcc 可执行文件的 mtime 缓存，后续运行无需重复调用编译器
+TOOLCHAIN_GCC = 'arm-none-eabi-gcc' + ('.exe' if os.name == 'nt' else '')
+TOOLCHAIN_PROBE_TIMEOUT = 10  # 秒
+
+def toolchain_search_roots():
+    """工具链搜索位置，返回 [(目录, 搜索深度)]"""
+    home = os.path.expanduser('~')
+    roots = []
+    for var in ('ARM_TOOLCHAIN_PATH', 'GCC_PATH'):
+        if os.environ.get(var):
+            path = os.environ[var].rstrip('/\\')
+            if os.path.basename(path) == 'bin':
+                path = os.path.dirname(path)
+            roots.append((path, 0))
+    # 额外的搜索位置（多个目录用路径分隔符隔开）
+    for path in os.environ.get('CUBEMX_FIX_TOOLCHAIN_ROOTS', '').split(os.pathsep):
+        if path:
+            roots.append((path, 2))
+    roots += [
+        (os.path.join(home, 'toolchains'), 2),
+        (os.path.join(home, 'toolchain'), 1),
+        (os.path.join(home, 'opt'), 2),
+        ('/opt', 2),
+        ('/opt/st', 4),                                              # Linux STM32CubeIDE
+        ('/Applications/ArmGNUToolchain', 2),                        # macOS 官方安装包
+        ('/Applications/STM32CubeIDE.app/Contents/Eclipse/plugins', 2),
+        ('/usr/local', 0),
+        ('/usr', 0),
+        ('C:\\Program Files (x86)\\GNU Arm Embedded Toolchain', 1),
+        ('C:\\Program Files (x86)\\Arm GNU Toolchain arm-none-eabi', 1),
+        ('C:\\Program Files\\Arm GNU Toolchain arm-none-eabi', 1),
+        ('C:\\ST', 4),
+    ]
+    # PATH 中的工具链
+    for path in os.environ.get('PATH', '').split(os.pathsep):
+        if path and os.path.isfile(os.path.join(path, TOOLCHAIN_GCC)):
+            roots.append((os.path.dirname(path.rstrip('/\\')), 0))
+    return roots
+
+def find_toolchain_dirs(roots=None):
+    """查找包含 bin/arm-none-eabi-gcc 的工具链目录（按真实路径去重）"""
+    found = []
+    seen = set()
+
+    def visit(path, depth):
+        if os.path.isfile(os.path.join(path, 'bin', TOOLCHAIN_GCC)):
+            real = os.path.realpath(path)
+            if real not in seen:
+                seen.add(real)
+                found.append(path)
+            return
+        if depth <= 0:
+            return
+        try:
+            entries = sorted(os.scandir(path), key=lambda e: e.name)
+        except OSError:
+            return
+        for entry in entries:
+            if entry.is_dir() and not entry.name.startswith('.'):
+                visit(entry.path, depth - 1)
+
+    for root, depth in (roots if roots is not None else toolchain_search_roots()):
+        if os.path.isdir(root):
+            visit(root, depth)
+    return found
+
+def _run_gcc(gcc, *args):
+    result = subprocess.run([gcc] + list(args), stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+                            universal_newlines=True, timeout=TOOLCHAIN_PROBE_TIMEOUT)
+    return result.stdout.strip()
+
+def _version_key(version):
+    return tuple(int(x) for x in re.findall(r'\d+', version or ''))
+
+def probe_toolchain(toolchain_dir):
+    """调用 arm-none-eabi-gcc 探测工具链的版本、multilib 和 newlib 支持"""
+    gcc = os.path.join(toolchain_dir, 'bin', TOOLCHAIN_GCC)
+    info = {'path': toolchain_dir, 'gcc': gcc, 'version': None,
+            'multilibs': [], 'newlib': False, 'newlib_nano': False, 'error': None}
+    try:
+        first_line = _run_gcc(gcc, '--version').splitlines()[0]
+        # 例如：arm-none-eabi-gcc (Arm GNU Toolchain 14.2.Rel1 (Build arm-14.52)) 14.2.1 20241119
+        m = re.search(r'\)\s+(\d+\.\d+(?:\.\d+)?)', first_line) or \
+            re.search(r'(\d+\.\d+(?:\.\d+)?)', first_line)
+        info['version'] = m.group(1) if m else None
+        info['description'] = first_line
+        info['multilibs'] = [line.split(';')[0] for line in _run_gcc(gcc, '-print-multi-lib').splitlines()
+                             if ';' in line]
+        # 找不到库文件时 gcc 只会原样输出文件名
+        info['newlib'] = os.path.isabs(_run_gcc(gcc, '-print-file-name=libc.a'))
+        info['newlib_nano'] = os.path.isabs(_run_gcc(gcc, '-print-file-name=nano.specs'))
+    except (OSError, IndexError, subprocess.SubprocessError) as e:
+        info['error'] = str(e) or e.__class__.__name__
+    return info
+
+class ToolchainProbeCache:
+    """工具链探测结果缓存，以 gcc 可执行文件的真实路径为键，mtime 和大小变化时重新探测"""
+    def __init__(self, path=None):
+        self.path = path or os.path.join(get_cache_dir(), 'toolchains.json')
+        self._entries = None
+        self._dirty = False
+
+    def _load(self):
+        if self._entries is None:
+            try:
+                with open(self.path, 'r', encoding='utf-8') as f:
+                    self._entries = json.load(f).get('toolchains', {})
+            except (OSError, ValueError):
+                self._entries = {}
+        return self._entries
+
+    def probe(self, toolchain_dir):
+        """探测工具链（优先使用缓存）"""
+        gcc = os.path.realpath(os.path.join(toolchain_dir, 'bin', TOOLCHAIN_GCC))
+        try:
+            st = os.stat(gcc)
+        except OSError:
+            return probe_toolchain(toolchain_dir)
+        stamp = [st.st_mtime_ns, st.st_size]
+        entry = self._load().get(gcc)
+        if entry and entry.get('stamp') == stamp:
+            info = dict(entry['info'])
+            info['path'] = toolchain_dir
+            return info
+        info = probe_toolchain(toolchain_dir)
+        if not info['error']:
+            self._entries[gcc] = {'stamp': stamp, 'info': info}
+            self._dirty = True
+        return info
+
+    def save(self):
+        if not self._dirty:
+            return
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            data = json.dumps({'version': 1, 'toolchains': self._entries}, ensure_ascii=False, indent=1)
+            atomic_write(self.path, data.encode('utf-8'))
+            self._dirty = False
+        except OSError as e:
+            print_warning(f"写入工具链缓存失败: {e}")
+
+def toolchain_rank(info):
+    """工具链排序键：可用 > 带 newlib > 带 newlib-nano > multilib 数量 > 版本号"""
+    return (info['error'] is None, info['newlib'], info['newlib_nano'],
+            len(info['multilibs']), _version_key(info['version']))
+
+def discover_toolchains(roots=None):
+    """查找并探测所有工具链，按推荐程度从高到低排序"""
+    cache = ToolchainProbeCache()
+    infos = [cache.probe(path) for path in find_toolchain_dirs(roots)]
+    cache.save()
+    return sorted(infos, key=toolchain_rank, reverse=True)
+
+def select_best_toolchain(roots=None):
+    """选择推荐的工具链，找不到可用的工具链时返回 None"""
+    for info in discover_toolchains(roots):
+        if info['error'] is None:
+            return info
+    return None
+
+def format_toolchain(info):
+    """工具链的单行描述"""
+    if info['error']:
+        return f"{info['path']}（无法运行: {info['error']}）"
+    features = [f"GCC {info['version'] or '?'}"]
+    features.append('newlib' if info['newlib'] else '缺少 newlib')
+    if info['newlib_nano']:
+        features.append('nano.specs')
+    features.append(f"{len(info['multilibs'])} 个 multilib")
+    return f"{info['path']}（{', '.join(features)}）"
+
+def print_toolchains(infos):
+    """打印发现的工具链列表"""
+    if not infos:
+        print_warning("没有找到 ARM GNU 工具链")
+        print_info("可通过环境变量 CUBEMX_FIX_TOOLCHAIN_ROOTS 指定额外的搜索目录")
+        return
+    print_info(f"找到 {len(infos)} 个 ARM GNU 工具链（按推荐程度排序）：")
+    for i, info in enumerate(infos):
+        mark = '*' if i == 0 and info['error'] is None else ' '
+        print(f"  {mark} {format_toolchain(info)}")
+
+# 新的工具链配置
+TOOLCHAIN_CONFIG = '''# 工具链路径配置（优先级：环境变量 > GCC_PATH > 系统 PATH）
 # 优先级1：使用环境变量指定的工具链（推荐，支持全局配置）
 ifdef ARM_TOOLCHAIN_PATH
     # 使用环境变量指定的工具链（推荐）
@@ -213,156 +563,1905 @@ else
     endif
 endif
 
-CC = $(PREFIX)gcc
-AS = $(PREFIX)gcc -x assembler-with-cpp
+'''
+
+# 工具链命令（{launcher} 为编译器缓存前缀）
+TOOLCHAIN_COMMANDS = '''CC = {launcher}$(PREFIX)gcc
+AS = {launcher}$(PREFIX)gcc -x assembler-with-cpp
 CP = $(PREFIX)objcopy
 SZ = $(PREFIX)size
 '''
-    
-    # 构建新的文件内容
-    new_lines = []
-    
-    # 保留 PREFIX 之前的内容（包括 binaries 部分标题）
-    if binaries_start != -1:
-        new_lines.extend(lines[:binaries_start + 1])
-        print_info(f"保留 binaries 部分标题之前的内容（{binaries_start + 1} 行）")
-    else:
-        new_lines.extend(lines[:prefix_line])
-        print_info(f"保留 PREFIX 之前的内容（{prefix_line} 行）")
-    
-    # 添加新的配置
-    new_lines.extend(new_config.splitlines(True))
-    print_info("已添加新的工具链配置")
-    
-    # 跳过原有的工具链配置部分，找到下一个重要部分
-    skip_end = gcc_path_end
-    
-    # 查找下一个重要部分（HEX, BIN, 或新的章节）
-    # 需要跳过所有原有的工具链相关定义
-    found_next_section = False
-    skip_count = 0
-    
-    for i in range(skip_end + 1, len(lines)):
-        line = lines[i]
-        stripped = line.strip()
-        
-        # 跳过原有的 CC, AS, CP, SZ 定义（可能在 ifdef 块内或块外）
-        if re.match(r'^\s*(CC|AS|CP|SZ)\s*=', line):
-            skip_count += 1
+
+# 编译器缓存（--compiler-cache 生成，构建时未安装则自动跳过，make COMPILER_CACHE= 可临时关闭）
+COMPILER_CACHE_CONFIG = '''# 编译器缓存（未安装时自动跳过）
+ifeq ($(origin COMPILER_CACHE),undefined)
+    COMPILER_CACHE := $(shell which {program} 2>/dev/null)
+endif
+'''
+
+# 固定使用的工具链（--pin-toolchain 生成，设置了环境变量 ARM_TOOLCHAIN_PATH 时仍以环境变量为准）
+TOOLCHAIN_PIN_CONFIG = '''# 固定使用的工具链（环境变量 ARM_TOOLCHAIN_PATH 优先）
+ifndef ARM_TOOLCHAIN_PATH
+    ifneq ($(wildcard {path}/bin/arm-none-eabi-gcc*),)
+        ARM_TOOLCHAIN_PATH = {path}
+    endif
+endif
+'''
+
+# 链接时优化需要使用带 LTO 插件的 gcc-ar/gcc-nm（--release-profile 生成）
+RELEASE_TOOLCHAIN_COMMANDS = '''AR = $(PREFIX)gcc-ar
+NM = $(PREFIX)gcc-nm
+'''
+
+# 编译耗时统计（--profile-build 生成，make BUILD_PROFILE= 可临时关闭）
+# 统计脚本和 Python 在构建时查找，Makefile 和修复指纹中不包含本机路径
+BUILD_PROFILE_CONFIG = '''# 编译耗时统计（记录到 $(BUILD_PROFILE)，make BUILD_PROFILE= 可临时关闭）
+# 统计脚本默认为项目中的 {script}（找不到时不统计），可通过环境变量或 make {env}=... 指定
+{env} ?= {script}
+BUILD_PROFILE ?= $(BUILD_DIR)/{log}
+BUILD_PROFILER = $(if $(and $(BUILD_PROFILE),$(wildcard $({env}))),$(or $(PYTHON),python3) "$({env})" {flag} "$(BUILD_PROFILE)" -- )
+'''
+
+def toolchain_config(toolchain_pin=None, compiler_cache=None, release_profile=None, build_profile=False):
+    """按选项生成工具链配置（不含指纹标记）"""
+    config = TOOLCHAIN_CONFIG
+    if toolchain_pin:
+        config = TOOLCHAIN_PIN_CONFIG.format(path=toolchain_pin.replace('\\', '/')) + config
+    launcher = ''
+    if build_profile:
+        config += BUILD_PROFILE_CONFIG.format(log=PROFILE_LOG_NAME, flag=PROFILE_EXEC_FLAG,
+                                              script=PROFILE_SCRIPT_DEFAULT, env=PROFILE_SCRIPT_ENV)
+        launcher = '$(BUILD_PROFILER)'
+    if compiler_cache:
+        config += COMPILER_CACHE_CONFIG.format(program=compiler_cache)
+        launcher += '$(COMPILER_CACHE) '
+    config += TOOLCHAIN_COMMANDS.format(launcher=launcher)
+    if release_profile:
+        config += RELEASE_TOOLCHAIN_COMMANDS
+    return config
+
+def generate_toolchain_block(fast_build=False, web_assets=None, **options):
+    """生成新的工具链配置（首行为指纹标记）"""
+    return fix_marker(toolchain_fingerprint(fast_build, web_assets, **options)) + toolchain_config(**options)
+
+def toolchain_fingerprint(fast_build=False, web_assets=None, **options):
+    """当前模板和选项下的修复指纹（包括工具链配置、构建加速配置、发布优化配置和网页资源构建规则）"""
+    content = toolchain_config(**options)
+    if fast_build:
+        content += FAST_BUILD_CONFIG + ''.join(FAST_BUILD_DEPS_CONFIG.values())
+    if web_assets:
+        content += generate_web_assets_config(web_assets)
+    if options.get('release_profile'):
+        content += (RELEASE_PROFILE_CONFIG.format(opt=RELEASE_PROFILE_OPT[options['release_profile']]) +
+                    ''.join(RELEASE_PROFILE_FLAGS_CONFIG.values()))
+    return block_fingerprint(content)
+
+# 构建加速配置（--fast-build 生成，追加在 Makefile 末尾）
+FAST_BUILD_BEGIN = '# cubemx-fix: fast-build begin（自动生成，请勿修改）'
+FAST_BUILD_END = '# cubemx-fix: fast-build end'
+# 导致串行构建的写法加上此前缀注释掉，撤销构建加速配置时恢复
+FAST_BUILD_DISABLED = '# cubemx-fix: fast-build disabled: '
+
+FAST_BUILD_CONFIG = '''# 并行构建：默认使用全部 CPU 核心，可通过 make JOBS=N 指定并行数
+NPROCS := $(shell nproc 2>/dev/null || sysctl -n hw.ncpu 2>/dev/null || echo 1)
+JOBS ?= $(NPROCS)
+MAKEFLAGS += -j$(JOBS)
+# GNU make 4.0 及以上按目标整理输出，避免并行编译的输出交错
+ifneq ($(filter 4.% 5.%,$(MAKE_VERSION)),)
+    MAKEFLAGS += --output-sync=target
+endif
+'''
+
+# 头文件依赖跟踪（原 Makefile 缺少时才添加）
+FAST_BUILD_DEPS_CONFIG = {
+    'flags': '''# 生成头文件依赖（-MMD -MP），只重新编译受修改影响的文件
+CFLAGS += -MMD -MP -MF"$(@:%.o=%.d)"
+''',
+    'mp': '''# 为每个头文件生成空规则，删除头文件时不会导致构建失败
+CFLAGS += -MP
+''',
+    'include': '''# 引入编译器生成的依赖文件
+-include $(wildcard $(BUILD_DIR)/*.d)
+''',
+}
+
+# 发布优化配置（--release-profile 生成，放在 LDFLAGS 定义之后）
+RELEASE_PROFILE_BEGIN = '# cubemx-fix: release-profile begin（自动生成，请勿修改）'
+RELEASE_PROFILE_END = '# cubemx-fix: release-profile end'
+
+# 发布构建（DEBUG=0）的优化级别：size 按体积优化，speed 按速度优化
+RELEASE_PROFILE_OPT = {
+    'size': '-Os',
+    'speed': '-O2',
+}
+
+RELEASE_PROFILE_CONFIG = '''# 发布构建（make DEBUG=0）：使用 {opt} 优化并开启链接时优化（LTO）
+# 可通过 make DEBUG=0 RELEASE_OPT=-O2 调整优化级别，make DEBUG=0 LTO=0 关闭 LTO（-flto=auto 需要 GCC 10 及以上）
+RELEASE_OPT ?= {opt}
+ifneq ($(DEBUG), 1)
+    OPT = $(RELEASE_OPT)
+    LTO ?= 1
+endif
+ifeq ($(LTO), 1)
+    CFLAGS += -flto=auto
+    LDFLAGS += $(OPT) -flto=auto
+endif
+'''
+
+# 未使用代码/数据的段回收（原 Makefile 缺少时才添加）
+RELEASE_PROFILE_FLAGS_CONFIG = {
+    'sections': '''# 每个函数/变量单独放在一个段中，便于链接时回收
+CFLAGS += -ffunction-sections -fdata-sections
+''',
+    'gc-sections': '''# 链接时删除未使用的段
+LDFLAGS += -Wl,--gc-sections
+''',
+}
+
+# 网页资源构建规则（--web-assets 生成，追加在 Makefile 末尾）
+WEB_ASSETS_BEGIN = '# cubemx-fix: web-assets begin（自动生成，请勿修改）'
+WEB_ASSETS_END = '# cubemx-fix: web-assets end'
+WEB_ASSETS_DIR_DEFAULT = 'web'
+# 转换脚本默认放在项目的 tools/ 目录中（相对路径，写入 Makefile 和修复指纹的内容与本机路径无关），
+# 也可通过环境变量 CUBEMX_WEB_CONVERTER 或 make WEB_CONVERTER=... 指定
+WEB_CONVERTER_DEFAULT = 'tools/html_to_c_converter.py'
+WEB_CONVERTER_ENV = 'CUBEMX_WEB_CONVERTER'
+# 仓库中转换脚本的位置（只用于提示复制到项目中）
+WEB_CONVERTER_PATH = os.path.normpath(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..',
+                                                   'ESP32_WiFi_Provisioning_Page', 'html_to_c_converter.py'))
+
+WEB_ASSETS_CONFIG = '''# 网页资源：$(WEB_DIR) 下的 HTML/CSS/JS 由 html_to_c_converter.py 转换为 C 源文件
+# 每个文件单独生成和编译（带依赖文件），只在对应文件或转换脚本修改后重新生成，并与其他源文件并行编译
+# 转换脚本默认为项目中的 {converter}，可通过环境变量 {env} 或 make WEB_CONVERTER=... 指定
+WEB_DIR ?= {web_dir}
+WEB_CONVERTER ?= $(or $({env}),{converter})
+PYTHON ?= python3
+WEB_ASSETS := $(shell find $(WEB_DIR) -type f \\( -name '*.html' -o -name '*.htm' -o -name '*.css' -o -name '*.js' \\) 2>/dev/null | sort)
+ifneq ($(WEB_ASSETS),)
+WEB_SOURCES := $(WEB_ASSETS:%=$(BUILD_DIR)/%.c)
+WEB_OBJECTS := $(WEB_SOURCES:.c=.o)
+OBJECTS += $(WEB_OBJECTS)
+$(BUILD_DIR)/$(TARGET).elf: $(WEB_OBJECTS)
+
+$(WEB_SOURCES): $(BUILD_DIR)/%.c: % Makefile
+\t$(if $(wildcard $(WEB_CONVERTER)),,$(error 没有找到网页资源转换脚本 $(WEB_CONVERTER)，请复制到项目中或通过 {env}/WEB_CONVERTER 指定))
+\t$(PYTHON) "$(WEB_CONVERTER)" $< -o $@ --variable-from-path --depfile $@.d
+
+$(WEB_OBJECTS): %.o: %.c
+\t$(CC) -c $(CFLAGS) $< -o $@
+
+-include $(wildcard $(WEB_SOURCES:=.d) $(WEB_OBJECTS:.o=.d))
+endif
+'''
+
+def generate_web_assets_config(web_dir):
+    """网页资源构建规则（不含标记）"""
+    return WEB_ASSETS_CONFIG.format(web_dir=web_dir.replace('\\', '/').rstrip('/'),
+                                    converter=WEB_CONVERTER_DEFAULT, env=WEB_CONVERTER_ENV)
+
+def check_project_script(project_dir, name, script, env, source, override):
+    """检查构建时能否找到项目中的脚本（网页资源转换、编译耗时统计），找不到时提示复制或指定"""
+    if os.environ.get(env) or os.path.isfile(os.path.join(project_dir, script)):
+        return
+    print_warning(f"项目中没有{name} {script}，构建前请复制 {source} "
+                  f"到项目中，或通过环境变量 {env} / {override} 指定")
+
+# Makefile 结构解析
+# 将 Makefile 解析为逻辑行（合并 \\ 续行）与嵌套条件块组成的结构树，
+# 每个节点都记录其在原文件中的物理行范围，便于只替换工具链部分
+
+# 工具链部分涉及的变量（BINPATH 为 STM32CubeMX 4.x 使用的工具链路径）
+TOOLCHAIN_VARS = ('PREFIX', 'BINPATH', 'TOOLCHAIN_DIR', 'CC', 'AS', 'CP', 'SZ', 'AR', 'NM', 'COMPILER_CACHE',
+                  'BUILD_PROFILE', 'BUILD_PROFILER', 'CUBEMX_PROFILE_SCRIPT')
+
+# 工具链部分的条件判断会引用的变量
+TOOLCHAIN_COND_VARS = ('GCC_PATH', 'ARM_TOOLCHAIN_PATH', 'COMPILER_CACHE')
+
+_COND_OPEN_RE = re.compile(r'^\s*(ifdef|ifndef|ifeq|ifneq)(?=[\s(]|$)\s*(.*)$')
+_COND_ELSE_RE = re.compile(r'^\s*else(?=\s|$)\s*(.*)$')
+_COND_END_RE = re.compile(r'^\s*endif(?=\s|$)')
+_DEFINE_RE = re.compile(r'^\s*(?:(?:override|export)\s+)*define(?=\s|$)')
+_ENDEF_RE = re.compile(r'^\s*endef(?=\s|$)')
+_ASSIGN_RE = re.compile(
+    r'^\s*((?:(?:override|export|private)\s+)*)'
+    r'([^\s:#=+?!]+)\s*(:::=|::=|:=|\+=|\?=|!=|=)\s*(.*)$', re.DOTALL)
+
+class MakefileParseError(Exception):
+    """Makefile 结构错误（如条件块不匹配）"""
+
+class MakeNode:
+    """Makefile 逻辑行节点
+
+    kind: blank / comment / assign / rule / recipe / define / directive
+    start, end: 在原文件中的物理行范围（0 起始，闭区间）
+    text: 合并续行后的逻辑行内容
+    """
+    def __init__(self, kind, start, end, text, name=None, op=None, value=None):
+        self.kind = kind
+        self.start = start
+        self.end = end
+        self.text = text
+        self.name = name
+        self.op = op
+        self.value = value
+
+    def __repr__(self):
+        return f"MakeNode({self.kind}, {self.start}-{self.end}, {self.text.strip()[:40]!r})"
+
+class MakeConditional:
+    """Makefile 条件块（ifdef/ifndef/ifeq/ifneq ... else ... endif）
+
+    branches: [(条件指令行, 子节点列表)]，else 分支的条件指令为 'else'
+    """
+    kind = 'conditional'
+
+    def __init__(self, start, directive):
+        self.start = start
+        self.end = start
+        self.branches = [(directive, [])]
+
+    @property
+    def condition(self):
+        return self.branches[0][0]
+
+    def iter_nodes(self):
+        """递归遍历条件块内所有节点"""
+        for _, children in self.branches:
+            for node in iter_make_nodes(children):
+                yield node
+
+    def __repr__(self):
+        return f"MakeConditional({self.condition!r}, {self.start}-{self.end})"
+
+def iter_make_nodes(nodes):
+    """递归遍历节点列表（包括条件块内部的节点）"""
+    for node in nodes:
+        yield node
+        if isinstance(node, MakeConditional):
+            for child in node.iter_nodes():
+                yield child
+
+def _logical_lines(lines):
+    """合并以反斜杠结尾的续行，生成 (起始行, 结束行, 逻辑行文本)"""
+    i = 0
+    while i < len(lines):
+        start = i
+        parts = []
+        while True:
+            line = lines[i].rstrip('\r\n')
+            trailing = len(line) - len(line.rstrip('\\'))
+            if trailing % 2 == 1 and i + 1 < len(lines):
+                parts.append(line[:-1])
+                i += 1
+                continue
+            parts.append(line)
+            break
+        yield start, i, ' '.join(p.strip() if n else p.rstrip() for n, p in enumerate(parts))
+        i += 1
+
+def parse_makefile(lines):
+    """解析 Makefile 结构，返回顶层节点列表
+
+    只需解析一次，后续通过节点的行范围定位和改写内容。
+    """
+    root = []
+    stack = []  # 打开的条件块
+    in_rule = False
+    logical = iter(_logical_lines(lines))
+
+    def current():
+        return stack[-1].branches[-1][1] if stack else root
+
+    for start, end, text in logical:
+        stripped = text.strip()
+
+        # 规则的命令行（以 Tab 开头）
+        if text.startswith('\t') and in_rule:
+            current().append(MakeNode('recipe', start, end, text))
+            continue
+
+        if not stripped:
+            current().append(MakeNode('blank', start, end, text))
+            continue
+
+        if stripped.startswith('#'):
+            current().append(MakeNode('comment', start, end, text))
+            continue
+
+        m = _COND_OPEN_RE.match(text)
+        if m:
+            cond = MakeConditional(start, stripped)
+            current().append(cond)
+            stack.append(cond)
+            continue
+
+        m = _COND_ELSE_RE.match(text)
+        if m:
+            if not stack:
+                raise MakefileParseError(f"第 {start + 1} 行的 else 没有对应的条件块")
+            stack[-1].branches.append((stripped, []))
+            continue
+
+        if _COND_END_RE.match(text):
+            if not stack:
+                raise MakefileParseError(f"第 {start + 1} 行的 endif 没有对应的条件块")
+            cond = stack.pop()
+            cond.end = end
+            continue
+
+        # define ... endef 多行变量，内容原样保留不解析
+        if _DEFINE_RE.match(text):
+            body_end = end
+            for body_start, body_end, body_text in logical:
+                if _ENDEF_RE.match(body_text):
+                    break
+            else:
+                raise MakefileParseError(f"第 {start + 1} 行的 define 没有对应的 endef")
+            current().append(MakeNode('define', start, body_end, text))
+            in_rule = False
             continue
-        
-        # 跳过 ifdef/else/endif 行（如果还没处理完）
-        if re.match(r'^\s*(ifdef|else|endif)\s', line):
-            skip_count += 1
+
+        m = _ASSIGN_RE.match(text)
+        if m:
+            current().append(MakeNode('assign', start, end, text,
+                                      name=m.group(2), op=m.group(3), value=m.group(4).strip()))
+            in_rule = False
+            continue
+
+        if ':' in stripped and not stripped.startswith(('include', '-include', 'sinclude', 'vpath')):
+            current().append(MakeNode('rule', start, end, text))
+            in_rule = True
             continue
-        
-        # 如果遇到 HEX 或 BIN 定义，说明已经过了工具链配置部分
-        if re.match(r'^\s*(HEX|BIN)\s*=', line):
-            new_lines.extend(lines[i:])
-            found_next_section = True
-            print_info(f"找到 HEX/BIN 定义，从第 {i + 1} 行开始保留后续内容（跳过了 {skip_count} 行）")
+
+        current().append(MakeNode('directive', start, end, text))
+        in_rule = False
+
+    if stack:
+        raise MakefileParseError(f"第 {stack[-1].start + 1} 行的条件块缺少 endif")
+    return root
+
+def _is_separator(line):
+    """是否是章节分隔线（#######...）"""
+    return line.strip().startswith('#####')
+
+def _is_toolchain_node(node):
+    """判断节点是否属于工具链配置部分"""
+    if node.kind == 'assign':
+        return node.name in TOOLCHAIN_VARS
+    if node.kind == 'conditional':
+        if any(var in node.condition for var in TOOLCHAIN_COND_VARS):
+            return True
+        # 条件块内只有工具链变量赋值（以及 $(info)/$(warning) 等提示）
+        assigns = [n for n in node.iter_nodes() if n.kind == 'assign']
+        others = [n for n in node.iter_nodes()
+                  if n.kind not in ('assign', 'blank', 'comment', 'directive', 'conditional')]
+        return bool(assigns) and not others and all(n.name in TOOLCHAIN_VARS for n in assigns)
+    return False
+
+def find_toolchain_block(lines, nodes):
+    """在顶层节点中定位工具链配置部分，返回 (起始行, 结束行)，找不到时返回 None
+
+    锚点为顶层的 PREFIX = arm-none-eabi- 定义，或已修复文件中的
+    ifdef ARM_TOOLCHAIN_PATH 条件块；之后连续的工具链变量定义、
+    GCC_PATH 条件块以及夹在其中的注释/空行都属于该部分。
+    """
+    anchor = -1
+    for i, node in enumerate(nodes):
+        if node.kind == 'assign' and node.name == 'PREFIX' and node.value.startswith('arm-none-eabi-'):
+            anchor = i
             break
-        
-        # 如果遇到新的章节标题（多个 # 号）
-        if '#######################################' in line and i > skip_end + 3:
-            new_lines.extend(lines[i:])
-            found_next_section = True
-            print_info(f"找到新的章节标题，从第 {i + 1} 行开始保留后续内容（跳过了 {skip_count} 行）")
+        if node.kind == 'conditional' and 'ARM_TOOLCHAIN_PATH' in node.condition:
+            anchor = i
             break
-        
-        # 如果遇到 CFLAGS 或其他编译选项定义（说明已经过了工具链部分）
-        if re.match(r'^\s*(CFLAGS|LDFLAGS|ASFLAGS)\s*=', line) and i > skip_end + 5:
-            new_lines.extend(lines[i:])
-            found_next_section = True
-            print_info(f"找到编译选项定义，从第 {i + 1} 行开始保留后续内容（跳过了 {skip_count} 行）")
+    if anchor == -1:
+        return None
+
+    # 向前合并紧贴锚点的说明注释（不包括章节分隔线和夹在分隔线之间的章节标题）
+    first = anchor
+    while first > 0:
+        prev = nodes[first - 1]
+        if prev.kind != 'comment' or _is_separator(prev.text):
             break
-    
-    # 如果没有找到明显的分界，保留 skip_end 之后的所有行（跳过工具链相关）
-    if not found_next_section:
-        print_warning("未找到明显的分界标记，将保留所有后续内容（跳过工具链相关行）")
-        for i in range(skip_end + 1, len(lines)):
-            line = lines[i]
-            # 跳过原有的工具链命令定义和 ifdef/else/endif
-            if (re.match(r'^\s*(CC|AS|CP|SZ)\s*=', line) or 
-                re.match(r'^\s*(ifdef|else|endif)\s', line)):
-                skip_count += 1
-                continue
-            new_lines.append(line)
-        if skip_count > 0:
-            print_info(f"跳过了 {skip_count} 行工具链相关定义")
-    
-    # 写入文件
+        if (prev.start > 0 and _is_separator(lines[prev.start - 1]) and
+                prev.end + 1 < len(lines) and _is_separator(lines[prev.end + 1])):
+            break
+        first -= 1
+
+    # 向后合并工具链相关节点，注释/空行只有在其后仍有工具链节点时才合并
+    last = anchor
+    for i in range(anchor + 1, len(nodes)):
+        node = nodes[i]
+        if node.kind in ('blank', 'comment'):
+            if _is_separator(node.text):
+                break
+            continue
+        if not _is_toolchain_node(node):
+            break
+        last = i
+
+    return nodes[first].start, nodes[last].end
+
+def strip_generated_block(lines, begin, end):
+    """移除之前生成的 begin/end 标记之间的配置，返回剩余的行"""
+    result = []
+    inside = False
+    after_block = False
+    for line in lines:
+        stripped = line.strip()
+        if stripped == begin:
+            inside = True
+            continue
+        if inside:
+            if stripped == end:
+                inside = False
+                after_block = True
+            continue
+        # 同时移除配置后面添加的空行
+        if after_block and not stripped:
+            after_block = False
+            continue
+        after_block = False
+        result.append(line)
+    # 配置位于文件末尾时，移除配置前面添加的空行
+    if after_block and result and not result[-1].strip():
+        result.pop()
+    return result
+
+def analyze_build_speed(nodes):
+    """检查 Makefile 的依赖跟踪配置和会导致串行构建的写法
+
+    返回 (缺少的依赖配置列表, 需要删除的串行化节点列表)
+    """
+    has_md = has_mp = has_include = False
+    serial_nodes = []
+    for node in iter_make_nodes(nodes):
+        if node.kind == 'assign' and node.name == 'CFLAGS':
+            has_md = has_md or bool(re.search(r'(^|\s)-MM?D(\s|$)', node.value))
+            has_mp = has_mp or bool(re.search(r'(^|\s)-MP(\s|$)', node.value))
+        elif node.kind == 'assign' and node.name == 'MAKEFLAGS':
+            # 强制单线程构建
+            if re.search(r'(^|\s)(-j\s*1|--jobs=1)(\s|$)', node.value):
+                serial_nodes.append(node)
+        elif node.kind == 'directive' and re.match(r'^\s*-?s?include\s', node.text) and '.d' in node.text:
+            has_include = True
+        elif node.kind == 'rule' and node.text.strip().startswith('.NOTPARALLEL'):
+            serial_nodes.append(node)
+
+    missing = []
+    if not has_md:
+        missing.append('flags')
+    elif not has_mp:
+        missing.append('mp')
+    if not has_include:
+        missing.append('include')
+    return missing, serial_nodes
+
+def analyze_release_profile(nodes):
+    """检查 Makefile 已有的段回收配置
+
+    返回 (缺少的配置列表, 最后一个顶层 LDFLAGS 定义节点)
+    """
+    cflags = ldflags = ''
+    for node in iter_make_nodes(nodes):
+        if node.kind == 'assign' and node.name == 'CFLAGS':
+            cflags += ' ' + node.value
+        elif node.kind == 'assign' and node.name == 'LDFLAGS':
+            ldflags += ' ' + node.value
+
+    missing = []
+    if not ('-ffunction-sections' in cflags and '-fdata-sections' in cflags):
+        missing.append('sections')
+    if '--gc-sections' not in ldflags:
+        missing.append('gc-sections')
+
+    ldflags_node = None
+    for node in nodes:
+        if node.kind == 'assign' and node.name == 'LDFLAGS':
+            ldflags_node = node
+    return missing, ldflags_node
+
+def generate_release_profile_block(profile, missing):
+    """生成发布优化配置"""
+    config = RELEASE_PROFILE_BEGIN + '\n' + RELEASE_PROFILE_CONFIG.format(opt=RELEASE_PROFILE_OPT[profile])
+    for key in missing:
+        config += RELEASE_PROFILE_FLAGS_CONFIG[key]
+    return config + RELEASE_PROFILE_END + '\n'
+
+def generate_fast_build_block(missing):
+    """生成构建加速配置"""
+    config = FAST_BUILD_BEGIN + '\n' + FAST_BUILD_CONFIG
+    for key in missing:
+        config += FAST_BUILD_DEPS_CONFIG[key]
+    return config + FAST_BUILD_END + '\n'
+
+def generate_web_assets_block(web_dir):
+    """生成网页资源构建规则"""
+    return WEB_ASSETS_BEGIN + '\n' + generate_web_assets_config(web_dir) + WEB_ASSETS_END + '\n'
+
+def _find_eof_line(lines):
+    """文件结尾标记（# *** EOF ***）所在行，没有时为文件末尾"""
+    for i in range(len(lines) - 1, -1, -1):
+        if lines[i].strip() == '# *** EOF ***':
+            return i
+        if lines[i].strip():
+            break
+    return len(lines)
+
+def _with_newline(text, newline):
+    """把生成内容的换行符转换为文件使用的换行符"""
+    return text if newline == '\n' else text.replace('\n', newline)
+
+def fix_makefile(filepath, fast_build=False, web_assets=None, **options):
+    """修复 Makefile"""
+    try:
+        # 不转换换行符，保持原文件的 CRLF/LF
+        with open(filepath, 'r', encoding='utf-8', newline='') as f:
+            lines = f.read().splitlines(True)
+    except Exception as e:
+        print_error(f"读取文件失败: {e}")
+        return False
+    # 生成的内容使用与原文件第一行相同的换行符
+    newline = '\r\n' if lines and lines[0].endswith('\r\n') else '\n'
+
+    # 移除之前生成的构建加速、发布优化配置和网页资源构建规则（未指定对应选项时即撤销该配置）
+    original_count = len(lines)
+    lines = strip_generated_block(lines, FAST_BUILD_BEGIN, FAST_BUILD_END)
+    if len(lines) != original_count:
+        print_info("已移除之前生成的构建加速配置")
+    original_count = len(lines)
+    lines = strip_generated_block(lines, RELEASE_PROFILE_BEGIN, RELEASE_PROFILE_END)
+    if len(lines) != original_count:
+        print_info("已移除之前生成的发布优化配置")
+    original_count = len(lines)
+    lines = strip_generated_block(lines, WEB_ASSETS_BEGIN, WEB_ASSETS_END)
+    if len(lines) != original_count:
+        print_info("已移除之前生成的网页资源构建规则")
+    disabled = [i for i, line in enumerate(lines) if line.startswith(FAST_BUILD_DISABLED)]
+    for i in disabled:
+        lines[i] = lines[i][len(FAST_BUILD_DISABLED):]
+    if disabled:
+        print_info("已恢复之前注释掉的串行构建配置")
+
     try:
-        with open(filepath, 'w', encoding='utf-8') as f:
-            f.writelines(new_lines)
+        nodes = parse_makefile(lines)
+    except MakefileParseError as e:
+        print_error(f"解析 Makefile 失败: {e}")
+        return False
+
+    block = find_toolchain_block(lines, nodes)
+    if block is None:
+        print_error("无法找到 PREFIX 定义，可能不是标准的 STM32CubeMX Makefile")
+        return False
+
+    block_start, block_end = block
+    print_info(f"工具链配置部分：第 {block_start + 1} 行 到 第 {block_end + 1} 行")
+
+    # 需要修改的行范围：[(起始行, 结束行, 替换内容)]
+    toolchain_block = generate_toolchain_block(fast_build, web_assets, **options)
+    # 旧版本（4.x）生成的 Makefile 在工具链部分定义了 AR，始终保留（--release-profile 生成的
+    # gcc-ar 不是原有定义，不算在内）。启用发布优化时放在 gcc-ar 之前，由后者覆盖，
+    # 这样撤销发布优化后仍能识别出原有定义，恢复为原来的内容
+    if any(node.kind == 'assign' and node.name == 'AR' and block_start <= node.start <= block_end
+           and 'gcc-ar' not in node.value
+           for node in iter_make_nodes(nodes)):
+        if options.get('release_profile'):
+            toolchain_block = (toolchain_block[:-len(RELEASE_TOOLCHAIN_COMMANDS)] +
+                               'AR = $(PREFIX)ar\n' + RELEASE_TOOLCHAIN_COMMANDS)
+        else:
+            toolchain_block += 'AR = $(PREFIX)ar\n'
+    edits = [(block_start, block_end, _with_newline(toolchain_block, newline))]
+
+    fast_build_block = None
+    if fast_build:
+        missing, serial_nodes = analyze_build_speed(nodes)
+        for node in serial_nodes:
+            print_info(f"注释掉导致串行构建的配置（第 {node.start + 1} 行）: {node.text.strip()}")
+            edits.append((node.start, node.end,
+                          ''.join(FAST_BUILD_DISABLED + line for line in lines[node.start:node.end + 1])))
+        if missing:
+            print_info("添加头文件依赖跟踪配置")
+        fast_build_block = generate_fast_build_block(missing)
+
+    release_profile = options.get('release_profile')
+    if release_profile:
+        missing, ldflags_node = analyze_release_profile(nodes)
+        # 放在 LDFLAGS 定义之后（插入用结束行为起始行前一行的空范围表示），没有时放在文件结尾
+        insert_at = ldflags_node.end + 1 if ldflags_node else _find_eof_line(lines)
+        if insert_at > 0 and not lines[insert_at - 1].endswith('\n'):
+            lines[insert_at - 1] += newline
+        block = generate_release_profile_block(release_profile, missing)
+        edits.append((insert_at, insert_at - 1, _with_newline('\n' + block, newline)))
+        print_info(f"添加发布优化配置（{RELEASE_PROFILE_OPT[release_profile]}、LTO"
+                   f"{'、段回收' if missing else ''}）")
+
+    # 从后往前修改，保证前面的行号不变
+    new_lines = list(lines)
+    for start, end, content in sorted(edits, reverse=True):
+        new_lines[start:end + 1] = content.splitlines(True)
+    print_info(f"已替换工具链配置（原 {block_end - block_start + 1} 行）")
+
+    if fast_build_block:
+        # 放在文件结尾标记（# *** EOF ***）之前
+        insert_at = _find_eof_line(new_lines)
+        if insert_at > 0 and not new_lines[insert_at - 1].endswith('\n'):
+            new_lines[insert_at - 1] += newline
+        new_lines[insert_at:insert_at] = _with_newline(fast_build_block, newline).splitlines(True) + [newline]
+        print_info("已添加并行构建配置")
+
+    if web_assets:
+        # 与构建加速配置一样放在文件结尾标记之前
+        insert_at = _find_eof_line(new_lines)
+        if insert_at > 0 and not new_lines[insert_at - 1].endswith('\n'):
+            new_lines[insert_at - 1] += newline
+        new_lines[insert_at:insert_at] = (_with_newline(generate_web_assets_block(web_assets), newline).splitlines(True) +
+                                          [newline])
+        print_info(f"已添加网页资源构建规则（{web_assets}/ 下的 HTML/CSS/JS）")
+        check_project_script(os.path.dirname(os.path.abspath(filepath)), '网页资源转换脚本', WEB_CONVERTER_DEFAULT,
+                             WEB_CONVERTER_ENV, WEB_CONVERTER_PATH, 'make WEB_CONVERTER=...')
+    if options.get('build_profile'):
+        check_project_script(os.path.dirname(os.path.abspath(filepath)), '编译耗时统计脚本', PROFILE_SCRIPT_DEFAULT,
+                             PROFILE_SCRIPT_ENV, os.path.abspath(__file__), f'make {PROFILE_SCRIPT_ENV}=...')
+
+    # 写入文件（临时文件 + rename，写入中断时不会留下不完整的 Makefile）
+    try:
+        atomic_write(filepath, ''.join(new_lines).encode('utf-8'))
         return True
     except Exception as e:
         print_error(f"写入文件失败: {e}")
         return False
 
-def check_environment():
-    """检查环境变量"""
+# Makefile 转换为 CMake 项目（--to-cmake）
+# 解析 STM32CubeMX Makefile 中的源文件、头文件路径、宏定义、链接脚本和 MCU 选项，
+# 按 STM32CubeMX CMake 项目的结构生成 CMakeLists.txt、cmake/stm32cubemx/CMakeLists.txt、
+# 已修复的 cmake/gcc-arm-none-eabi.cmake 工具链文件和使用 Ninja 的 CMakePresets.json
+CMAKE_TOOLCHAIN_FILE_REL = 'cmake/gcc-arm-none-eabi.cmake'
+CMAKE_MX_LISTS_REL = 'cmake/stm32cubemx/CMakeLists.txt'
+
+# 与 fix_cubemx_cmake.py 生成的工具链配置一致（指纹相同，fix_cubemx_cmake.py 会识别为已是最新的修复）
+CMAKE_TOOLCHAIN_CONFIG = '''# 工具链路径配置（优先级：环境变量 > 相对路径 > 系统 PATH）
+# 优先级1：使用环境变量指定的工具链（推荐，支持全局配置）
+if(DEFINED ENV{ARM_TOOLCHAIN_PATH})
+    # 使用环境变量指定的工具链路径
+    set(TOOLCHAIN_DIR $ENV{ARM_TOOLCHAIN_PATH})
+    message(STATUS "Using toolchain from environment: ${TOOLCHAIN_DIR}")
+elseif(EXISTS "${CMAKE_CURRENT_LIST_DIR}/../../toolchain")
+    # 回退到相对路径（兼容旧项目结构）
+    get_filename_component(TOOLCHAIN_DIR "${CMAKE_CURRENT_LIST_DIR}/../../toolchain" ABSOLUTE)
+    message(STATUS "Using toolchain from relative path: ${TOOLCHAIN_DIR}")
+else()
+    # 尝试使用系统 PATH 中的工具链（可能缺少 newlib）
+    set(TOOLCHAIN_DIR "")
+    message(WARNING "ARM_TOOLCHAIN_PATH environment variable not set and ../../toolchain not found. Trying system PATH.")
+    message(WARNING "If compilation fails, set ARM_TOOLCHAIN_PATH environment variable to point to ARM GNU Toolchain with newlib.")
+endif()
+
+# 设置工具链前缀
+if(TOOLCHAIN_DIR)
+    set(TOOLCHAIN_PREFIX                ${TOOLCHAIN_DIR}/bin/arm-none-eabi-)
+else()
+    set(TOOLCHAIN_PREFIX                arm-none-eabi-)
+endif()
+
+set(CMAKE_C_COMPILER                ${TOOLCHAIN_PREFIX}gcc)
+set(CMAKE_ASM_COMPILER              ${CMAKE_C_COMPILER})
+set(CMAKE_CXX_COMPILER              ${TOOLCHAIN_PREFIX}g++)
+set(CMAKE_LINKER                    ${TOOLCHAIN_PREFIX}g++)
+set(CMAKE_OBJCOPY                   ${TOOLCHAIN_PREFIX}objcopy)
+set(CMAKE_SIZE                      ${TOOLCHAIN_PREFIX}size)
+
+'''
+
+CMAKE_TOOLCHAIN_FILE = '''set(CMAKE_SYSTEM_NAME               Generic)
+set(CMAKE_SYSTEM_PROCESSOR          arm)
+
+set(CMAKE_C_COMPILER_ID GNU)
+set(CMAKE_CXX_COMPILER_ID GNU)
+{toolchain_block}set(CMAKE_EXECUTABLE_SUFFIX_ASM     ".elf")
+set(CMAKE_EXECUTABLE_SUFFIX_C       ".elf")
+set(CMAKE_EXECUTABLE_SUFFIX_CXX     ".elf")
+
+set(CMAKE_TRY_COMPILE_TARGET_TYPE STATIC_LIBRARY)
+
+# MCU specific flags
+set(TARGET_FLAGS "{target_flags} ")
+
+set(CMAKE_C_FLAGS "${{CMAKE_C_FLAGS}} ${{TARGET_FLAGS}}")
+set(CMAKE_ASM_FLAGS "${{CMAKE_C_FLAGS}} -x assembler-with-cpp -MMD -MP")
+set(CMAKE_C_FLAGS "${{CMAKE_C_FLAGS}} -Wall -fdata-sections -ffunction-sections")
+
+set(CMAKE_C_FLAGS_DEBUG "-O0 -g3")
+set(CMAKE_C_FLAGS_RELEASE "-Os -g0")
+set(CMAKE_CXX_FLAGS_DEBUG "-O0 -g3")
+set(CMAKE_CXX_FLAGS_RELEASE "-Os -g0")
+
+set(CMAKE_CXX_FLAGS "${{CMAKE_CXX_FLAGS}} -fno-rtti -fno-exceptions -fno-threadsafe-statics")
+
+set(CMAKE_C_LINK_FLAGS "${{TARGET_FLAGS}}")
+{link_flags}
+
+set(CMAKE_CXX_LINK_FLAGS "${{CMAKE_C_LINK_FLAGS}} -Wl,--start-group -lstdc++ -lsupc++ -Wl,--end-group")
+'''
+
+CMAKE_PROJECT_LISTS = '''cmake_minimum_required(VERSION 3.22)
+
+# 由 fix_cubemx_makefile.py --to-cmake 根据 Makefile 生成
+
+# Setup compiler settings
+set(CMAKE_C_STANDARD 11)
+set(CMAKE_C_STANDARD_REQUIRED ON)
+set(CMAKE_C_EXTENSIONS ON)
+
+# Define the build type
+if(NOT CMAKE_BUILD_TYPE)
+    set(CMAKE_BUILD_TYPE "Debug")
+endif()
+
+# Set the project name
+set(CMAKE_PROJECT_NAME {target})
+
+# Include toolchain file
+include("{toolchain}")
+
+# Enable compile command to ease indexing with e.g. clangd
+set(CMAKE_EXPORT_COMPILE_COMMANDS TRUE)
+
+# Core project settings
+project(${{CMAKE_PROJECT_NAME}})
+message("Build type: " ${{CMAKE_BUILD_TYPE}})
+
+# Enable CMake support for ASM and C languages
+enable_language(C ASM)
+
+# Create an executable object type
+add_executable(${{CMAKE_PROJECT_NAME}})
+
+# Add STM32CubeMX generated sources
+add_subdirectory(cmake/stm32cubemx)
+
+# Link directories setup
+target_link_directories(${{CMAKE_PROJECT_NAME}} PRIVATE
+    # Add user defined library search paths
+)
+
+# Add sources to executable
+target_sources(${{CMAKE_PROJECT_NAME}} PRIVATE
+    # Add user sources here
+)
+
+# Add include paths
+target_include_directories(${{CMAKE_PROJECT_NAME}} PRIVATE
+    # Add user defined include paths
+)
+
+# Add project symbols (macros)
+target_compile_definitions(${{CMAKE_PROJECT_NAME}} PRIVATE
+    # Add user defined symbols
+)
+
+# Add linked libraries
+target_link_libraries(${{CMAKE_PROJECT_NAME}}
+    stm32cubemx
+
+    # Add user defined libraries
+)
+'''
+
+CMAKE_MX_LISTS = '''cmake_minimum_required(VERSION 3.22)
+# Enable CMake support for ASM and C languages
+enable_language(C ASM)
+# STM32CubeMX generated symbols (macros)
+set(MX_Defines_Syms
+{defines}
+)
+
+# STM32CubeMX generated include paths
+set(MX_Include_Dirs
+{includes}
+)
+
+# STM32CubeMX generated application sources
+set(MX_Application_Src
+{app_sources}
+)
+
+# STM32 HAL/LL Drivers
+set(STM32_Drivers_Src
+{driver_sources}
+)
+
+# Link directories setup
+set(MX_LINK_DIRS
+{link_dirs}
+)
+# Project static libraries
+set(MX_LINK_LIBS
+    STM32_Drivers
+)
+# Interface library for includes and symbols
+add_library(stm32cubemx INTERFACE)
+target_include_directories(stm32cubemx INTERFACE ${{MX_Include_Dirs}})
+target_compile_definitions(stm32cubemx INTERFACE ${{MX_Defines_Syms}})
+
+# Create STM32_Drivers static library
+add_library(STM32_Drivers OBJECT)
+target_sources(STM32_Drivers PRIVATE ${{STM32_Drivers_Src}})
+target_link_libraries(STM32_Drivers PUBLIC stm32cubemx)
+
+# Add STM32CubeMX generated application sources to the project
+target_sources(${{CMAKE_PROJECT_NAME}} PRIVATE ${{MX_Application_Src}})
+
+# Link directories setup
+target_link_directories(${{CMAKE_PROJECT_NAME}} PRIVATE ${{MX_LINK_DIRS}})
+
+# Add libraries to the project
+target_link_libraries(${{CMAKE_PROJECT_NAME}} ${{MX_LINK_LIBS}})
+
+# Add the map file to the list of files to be removed with 'clean' target
+set_target_properties(${{CMAKE_PROJECT_NAME}} PROPERTIES ADDITIONAL_CLEAN_FILES ${{CMAKE_PROJECT_NAME}}.map)
+
+# Validate that STM32CubeMX code is compatible with C standard
+if((CMAKE_C_STANDARD EQUAL 90) OR (CMAKE_C_STANDARD EQUAL 99))
+    message(ERROR "Generated code requires C11 or higher")
+endif()
+'''
+
+_MAKE_VAR_RE = re.compile(r'\$(?:\(([A-Za-z0-9_.-]+)\)|\{([A-Za-z0-9_.-]+)\})')
+_MAKE_COMMENT_RE = re.compile(r'(?<!\\)#.*$')
+
+def collect_make_variables(nodes):
+    """收集顶层的变量定义（不展开，条件块内的定义不计入）"""
+    variables = {}
+    for node in nodes:
+        if node.kind != 'assign':
+            continue
+        value = _MAKE_COMMENT_RE.sub('', node.value).strip()
+        if node.op == '+=':
+            variables[node.name] = (variables.get(node.name, '') + ' ' + value).strip()
+        elif node.op == '?=':
+            variables.setdefault(node.name, value)
+        elif node.op != '!=':
+            variables[node.name] = value
+    return variables
+
+def expand_make_value(value, variables, depth=0):
+    """展开 $(VAR) / ${VAR} 变量引用（不支持 make 函数），未定义的变量展开为空"""
+    if depth > 16:
+        return value
+    def replace(m):
+        name = m.group(1) or m.group(2)
+        return expand_make_value(variables.get(name, ''), variables, depth + 1)
+    return _MAKE_VAR_RE.sub(replace, value)
+
+def make_list(variables, name, prefix=''):
+    """展开变量并拆分为列表（去除前缀和重复项，保持顺序），返回 (列表, 无法转换的项)"""
+    items = []
+    skipped = []
+    for token in expand_make_value(variables.get(name, ''), variables).split():
+        if '$' in token:
+            skipped.append(token)
+            continue
+        if prefix and token.startswith(prefix):
+            token = token[len(prefix):]
+        token = token.strip('"')
+        if token and token not in items:
+            items.append(token)
+    return items, skipped
+
+def _cmake_path(path):
+    """Makefile 中的相对路径转为 CMake 路径"""
+    path = path.replace('\\', '/')
+    if path.startswith('./'):
+        path = path[2:]
+    if os.path.isabs(path):
+        return path
+    return '${CMAKE_SOURCE_DIR}/' + path
+
+def _cmake_lines(items):
+    """格式化为 CMake 列表内容（每行一项）"""
+    return '\n'.join(f"    {item}" for item in items)
+
+def parse_cubemx_project(filepath):
+    """从 STM32CubeMX Makefile 中读取 CMake 项目需要的信息，失败时返回 None"""
+    try:
+        with open(filepath, 'r', encoding='utf-8') as f:
+            lines = f.read().splitlines(True)
+        nodes = parse_makefile(lines)
+    except (OSError, UnicodeDecodeError) as e:
+        print_error(f"读取文件失败: {e}")
+        return None
+    except MakefileParseError as e:
+        print_error(f"解析 Makefile 失败: {e}")
+        return None
+
+    variables = collect_make_variables(nodes)
+    missing = [name for name in ('TARGET', 'C_SOURCES', 'MCU', 'LDSCRIPT') if not variables.get(name)]
+    if missing:
+        print_error(f"Makefile 中缺少 {', '.join(missing)} 定义，可能不是标准的 STM32CubeMX Makefile")
+        return None
+
+    project = {'target': expand_make_value(variables['TARGET'], variables).strip()}
+    skipped = []
+    for key, names, prefix in (('c_sources', ('C_SOURCES',), ''),
+                               ('asm_sources', ('ASM_SOURCES', 'ASMM_SOURCES'), ''),
+                               ('includes', ('C_INCLUDES', 'AS_INCLUDES'), '-I'),
+                               ('defines', ('C_DEFS',), '-D'),
+                               ('asm_defines', ('AS_DEFS',), '-D'),
+                               ('lib_dirs', ('LIBDIR',), '-L'),
+                               ('libs', ('LIBS',), '-l')):
+        project[key] = []
+        for name in names:
+            items, unknown = make_list(variables, name, prefix)
+            project[key] += [item for item in items if item not in project[key]]
+            skipped += unknown
+    if skipped:
+        print_warning(f"以下内容使用了 make 函数或未定义的变量，未能转换: {' '.join(skipped)}")
+
+    project['target_flags'] = ' '.join(expand_make_value(variables['MCU'], variables).split())
+    project['ldscript'] = expand_make_value(variables['LDSCRIPT'], variables).strip()
+    ldflags = expand_make_value(variables.get('LDFLAGS', ''), variables).split()
+    project['specs'] = ['--' + flag.lstrip('-') for flag in ldflags if flag.lstrip('-').startswith('specs=')]
+    return project
+
+def generate_cmake_project(project):
+    """生成 CMake 项目文件，返回 {相对路径: 内容}"""
+    app_sources = []
+    driver_sources = []
+    for source in project['c_sources']:
+        if os.path.normpath(source).replace('\\', '/').startswith('Drivers/'):
+            driver_sources.append(_cmake_path(source))
+        else:
+            app_sources.append(_cmake_path(source))
+    app_sources += [_cmake_path(source) for source in project['asm_sources']]
+
+    defines = list(project['defines'])
+    defines += [f"$<$<COMPILE_LANGUAGE:ASM>:{define}>" for define in project['asm_defines']]
+    defines.append('$<$<CONFIG:Debug>:DEBUG>')
+
+    link_flags = [
+        f'set(CMAKE_C_LINK_FLAGS "${{CMAKE_C_LINK_FLAGS}} -T \\"{_cmake_path(project["ldscript"])}\\"")',
+    ]
+    for specs in project['specs']:
+        link_flags.append(f'set(CMAKE_C_LINK_FLAGS "${{CMAKE_C_LINK_FLAGS}} {specs}")')
+    link_flags.append('set(CMAKE_C_LINK_FLAGS "${CMAKE_C_LINK_FLAGS} '
+                      '-Wl,-Map=${CMAKE_PROJECT_NAME}.map -Wl,--gc-sections")')
+    libs = ' '.join('-l' + lib for lib in project['libs']) or '-lc -lm'
+    link_flags.append(f'set(CMAKE_C_LINK_FLAGS "${{CMAKE_C_LINK_FLAGS}} -Wl,--start-group {libs} -Wl,--end-group")')
+    link_flags.append('set(CMAKE_C_LINK_FLAGS "${CMAKE_C_LINK_FLAGS} -Wl,--print-memory-usage")')
+
+    fingerprint = block_fingerprint(CMAKE_TOOLCHAIN_CONFIG)
+    toolchain_block = fix_marker(fingerprint) + CMAKE_TOOLCHAIN_CONFIG
+    return {
+        'CMakeLists.txt': CMAKE_PROJECT_LISTS.format(target=project['target'], toolchain=CMAKE_TOOLCHAIN_FILE_REL),
+        CMAKE_MX_LISTS_REL: CMAKE_MX_LISTS.format(
+            defines=_cmake_lines(defines),
+            includes=_cmake_lines(_cmake_path(path) for path in project['includes']),
+            app_sources=_cmake_lines(app_sources),
+            driver_sources=_cmake_lines(driver_sources),
+            link_dirs=_cmake_lines(_cmake_path(path) for path in project['lib_dirs'])),
+        CMAKE_TOOLCHAIN_FILE_REL: CMAKE_TOOLCHAIN_FILE.format(
+            toolchain_block=toolchain_block,
+            target_flags=project['target_flags'],
+            link_flags='\n'.join(link_flags)),
+        'CMakePresets.json': json.dumps(default_cmake_presets(CMAKE_TOOLCHAIN_FILE_REL), indent=4) + '\n',
+    }
+
+def default_cmake_presets(toolchain_rel):
+    """与 STM32CubeMX 生成的预设结构一致的默认 CMakePresets.json"""
+    return {
+        'version': 3,
+        'configurePresets': [
+            {
+                'name': 'default',
+                'hidden': True,
+                'generator': 'Ninja',
+                'binaryDir': '${sourceDir}/build/${presetName}',
+                'toolchainFile': '${sourceDir}/' + toolchain_rel,
+                'cacheVariables': {},
+            },
+            {'name': 'Debug', 'inherits': 'default', 'cacheVariables': {'CMAKE_BUILD_TYPE': 'Debug'}},
+            {'name': 'Release', 'inherits': 'default', 'cacheVariables': {'CMAKE_BUILD_TYPE': 'Release'}},
+        ],
+        'buildPresets': [
+            {'name': 'Debug', 'configurePreset': 'Debug'},
+            {'name': 'Release', 'configurePreset': 'Release'},
+        ],
+    }
+
+def convert_makefile_to_cmake(filepath, force=False, keep_backups=None):
+    """将 STM32CubeMX Makefile 项目转换为 CMake 项目（Makefile 保持不变）"""
+    project = parse_cubemx_project(filepath)
+    if project is None:
+        return False
+    print_info(f"项目 {project['target']}：{len(project['c_sources'])} 个 C 源文件，"
+               f"{len(project['asm_sources'])} 个汇编源文件，MCU 选项 {project['target_flags']}")
+
+    project_dir = os.path.dirname(os.path.abspath(filepath))
+    files = generate_cmake_project(project)
+    existing = [rel for rel in files if os.path.exists(os.path.join(project_dir, rel))]
+    if existing and not force:
+        print_error(f"以下文件已存在: {', '.join(existing)}")
+        print_info("使用 --force 覆盖（覆盖前会先备份）")
+        return False
+
+    for rel, content in files.items():
+        path = os.path.join(project_dir, rel)
+        data = content.encode('utf-8')
+        if rel in existing:
+            with open(path, 'rb') as f:
+                if f.read() == data:
+                    print_info(f"{rel} 已是最新")
+                    continue
+            backup_path = backup_file(path, keep=keep_backups)
+            if backup_path is None:
+                return False
+            print_info(f"已备份 {rel} 到: {backup_path}")
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        atomic_write(path, data)
+        print_info(f"已生成 {rel}")
+    return True
+
+# 生成 compile_commands.json（--compile-commands）
+# 不运行 make，按 make 的规则求值 Makefile（包括条件块和常用函数），
+# 得到修复后的工具链部分实际使用的 PREFIX 以及 CFLAGS，供 clangd 等工具直接索引
+COMPILE_COMMANDS_NAME = 'compile_commands.json'
+
+# 依赖文件生成选项（引用了 $@，对索引没有意义）
+_DEPFILE_FLAGS = ('-MMD', '-MD', '-MP')
+_DEPFILE_ARG_FLAGS = ('-MF', '-MT', '-MQ')
+
+def _find_make_close(text, start, close):
+    """查找与 text[start - 1] 处的括号匹配的右括号位置"""
+    opening = '(' if close == ')' else '{'
+    depth = 1
+    for i in range(start, len(text)):
+        if text[i] == opening:
+            depth += 1
+        elif text[i] == close:
+            depth -= 1
+            if depth == 0:
+                return i
+    return -1
+
+def _split_make_args(text):
+    """按顶层逗号拆分函数参数"""
+    args = []
+    depth = 0
+    current = ''
+    for ch in text:
+        if ch in '({':
+            depth += 1
+        elif ch in ')}':
+            depth -= 1
+        elif ch == ',' and depth == 0:
+            args.append(current)
+            current = ''
+            continue
+        current += ch
+    args.append(current)
+    return args
+
+class MakeEvaluator:
+    """简化的 make 求值器：处理变量赋值、条件块和常用函数，不执行规则
+
+    $(shell ...) 只支持 which（用于检查工具是否存在），其余命令展开为空，
+    避免生成索引时执行 Makefile 中的任意命令。
+    """
+    def __init__(self, directory='.', environ=None):
+        self.directory = directory
+        self.variables = {}
+        self.origins = {}
+        self.simple = set()
+        for name, value in (os.environ if environ is None else environ).items():
+            self.variables[name] = value.replace('$', '$$')
+            self.origins[name] = 'environment'
+
+    def define(self, name, op, value):
+        """按赋值运算符定义变量"""
+        value = _MAKE_COMMENT_RE.sub('', value).strip()
+        if op == '?=' and self.origins.get(name, 'undefined') != 'undefined':
+            return
+        if op == '!=':
+            op, value = ':=', ''
+        if op == '+=' and self.origins.get(name, 'undefined') != 'undefined':
+            if name in self.simple:
+                value = self.expand(value).replace('$', '$$')
+            self.variables[name] = (self.variables[name] + ' ' + value).strip()
+        elif op in (':=', '::=', ':::='):
+            self.variables[name] = self.expand(value).replace('$', '$$')
+            self.simple.add(name)
+        else:
+            self.variables[name] = value
+            self.simple.discard(name)
+        self.origins[name] = 'file'
+
+    def value(self, name):
+        """展开后的变量值，未定义时为空"""
+        return self.expand(self.variables.get(name, ''))
+
+    def expand(self, text, depth=0):
+        """展开变量引用和函数调用"""
+        if depth > 32 or '$' not in text:
+            return text
+        result = []
+        i = 0
+        while i < len(text):
+            ch = text[i]
+            if ch != '$' or i + 1 >= len(text):
+                result.append(ch)
+                i += 1
+                continue
+            nxt = text[i + 1]
+            if nxt == '$':
+                result.append('$')
+                i += 2
+                continue
+            if nxt not in '({':
+                # 单字符变量（包括 $@、$< 等自动变量，求值时为空）
+                result.append(self.expand(self.variables.get(nxt, ''), depth + 1))
+                i += 2
+                continue
+            close = _find_make_close(text, i + 2, ')' if nxt == '(' else '}')
+            if close == -1:
+                result.append(text[i:])
+                break
+            result.append(self._expand_reference(text[i + 2:close], depth + 1))
+            i = close + 1
+        return ''.join(result)
+
+    def _expand_reference(self, inner, depth):
+        """展开 $(...) 的内容：函数调用、替换引用或变量引用"""
+        name, _, rest = inner.partition(' ')
+        function = getattr(self, '_func_' + name.replace('-', '_'), None) if rest else None
+        if function is not None:
+            return function(rest.lstrip(), depth)
+        name = self.expand(inner, depth)
+        if ':' in name and '=' in name:
+            # 替换引用 $(VAR:.c=.o)
+            var, _, pattern = name.partition(':')
+            old, _, new = pattern.partition('=')
+            if '%' not in old:
+                old, new = '%' + old, '%' + new
+            return ' '.join(_patsubst(old, new, word) for word in self.value(var).split())
+        return self.expand(self.variables.get(name, ''), depth)
+
+    def _args(self, text, depth, count):
+        """拆分并展开函数参数（多余的逗号并入最后一个参数，缺少的参数为空）"""
+        args = _split_make_args(text)
+        if len(args) > count:
+            args = args[:count - 1] + [','.join(args[count - 1:])]
+        args += [''] * (count - len(args))
+        return [self.expand(arg, depth) for arg in args]
+
+    def _func_if(self, text, depth):
+        args = _split_make_args(text)
+        if self.expand(args[0], depth).strip():
+            return self.expand(args[1], depth) if len(args) > 1 else ''
+        return self.expand(','.join(args[2:]), depth) if len(args) > 2 else ''
+
+    def _func_findstring(self, text, depth):
+        find, within = self._args(text, depth, 2)
+        return find if find in within else ''
+
+    def _func_filter(self, text, depth):
+        patterns, words = self._args(text, depth, 2)
+        return ' '.join(w for w in words.split() if any(_pattern_match(p, w) for p in patterns.split()))
+
+    def _func_strip(self, text, depth):
+        return ' '.join(self.expand(text, depth).split())
+
+    def _func_sort(self, text, depth):
+        return ' '.join(sorted(set(self.expand(text, depth).split())))
+
+    def _func_dir(self, text, depth):
+        return ' '.join((os.path.dirname(w) or '.') + '/' for w in self.expand(text, depth).split())
+
+    def _func_notdir(self, text, depth):
+        return ' '.join(os.path.basename(w) for w in self.expand(text, depth).split())
+
+    def _func_addprefix(self, text, depth):
+        prefix, words = self._args(text, depth, 2)
+        return ' '.join(prefix + w for w in words.split())
+
+    def _func_patsubst(self, text, depth):
+        old, new, words = self._args(text, depth, 3)
+        return ' '.join(_patsubst(old, new, w) for w in words.split())
+
+    def _func_wildcard(self, text, depth):
+        matches = []
+        for pattern in self.expand(text, depth).split():
+            full = pattern if os.path.isabs(pattern) else os.path.join(self.directory, pattern)
+            matches += sorted(os.path.relpath(p, self.directory) if not os.path.isabs(pattern) else p
+                              for p in glob.glob(full))
+        return ' '.join(matches)
+
+    def _func_origin(self, text, depth):
+        return self.origins.get(self.expand(text, depth).strip(), 'undefined')
+
+    def _func_shell(self, text, depth):
+        command = self.expand(text, depth).split()
+        if len(command) >= 2 and command[0] == 'which':
+            return shutil.which(command[1]) or ''
+        return ''
+
+    def _func_info(self, text, depth):
+        return ''
+
+    _func_warning = _func_info
+    _func_error = _func_info
+
+    def condition(self, directive):
+        """求值条件指令（ifdef/ifndef/ifeq/ifneq）"""
+        m = _COND_OPEN_RE.match(directive)
+        if not m:
+            return False
+        keyword, arg = m.group(1), m.group(2).strip()
+        if keyword in ('ifdef', 'ifndef'):
+            defined = bool(self.variables.get(self.expand(arg).strip()))
+            return defined if keyword == 'ifdef' else not defined
+        if arg.startswith('('):
+            close = _find_make_close(arg, 1, ')')
+            left, right = (_split_make_args(arg[1:close]) + [''])[:2]
+        else:
+            quoted = re.findall(r'"([^"]*)"|\'([^\']*)\'', arg)
+            left, right = ([a or b for a, b in quoted] + ['', ''])[:2]
+        equal = self.expand(left).strip() == self.expand(right).strip()
+        return equal if keyword == 'ifeq' else not equal
+
+    def evaluate(self, nodes):
+        """按顺序求值节点（只处理赋值和条件块）"""
+        for node in nodes:
+            if node.kind == 'assign':
+                self.define(node.name, node.op, node.value)
+            elif node.kind == 'conditional':
+                for directive, children in node.branches:
+                    m = _COND_ELSE_RE.match(directive)
+                    test = m.group(1) if m else directive
+                    if not test or self.condition(test):
+                        self.evaluate(children)
+                        break
+
+def _pattern_match(pattern, word):
+    """make 模式（最多一个 %）是否匹配"""
+    if '%' not in pattern:
+        return pattern == word
+    prefix, _, suffix = pattern.partition('%')
+    return len(word) >= len(prefix) + len(suffix) and word.startswith(prefix) and word.endswith(suffix)
+
+def _patsubst(old, new, word):
+    """make 的 patsubst 替换（不匹配时原样返回）"""
+    if not _pattern_match(old, word):
+        return word
+    if '%' not in old:
+        return new
+    prefix, _, suffix = old.partition('%')
+    stem = word[len(prefix):len(word) - len(suffix)]
+    return new.replace('%', stem, 1)
+
+def _strip_depfile_flags(flags):
+    """去除依赖文件生成选项"""
+    result = []
+    skip = False
+    for flag in flags:
+        if skip:
+            skip = False
+            continue
+        if flag in _DEPFILE_FLAGS:
+            continue
+        if flag in _DEPFILE_ARG_FLAGS:
+            skip = True
+            continue
+        if flag.startswith(_DEPFILE_ARG_FLAGS):
+            continue
+        result.append(flag)
+    return result
+
+def generate_compile_commands(filepath, environ=None):
+    """按 Makefile 求值结果生成 compile_commands.json 的条目，失败时返回 None"""
+    try:
+        with open(filepath, 'r', encoding='utf-8') as f:
+            lines = f.read().splitlines(True)
+        nodes = parse_makefile(lines)
+    except (OSError, UnicodeDecodeError) as e:
+        print_error(f"读取文件失败: {e}")
+        return None
+    except MakefileParseError as e:
+        print_error(f"解析 Makefile 失败: {e}")
+        return None
+
+    directory = os.path.dirname(os.path.abspath(filepath))
+    evaluator = MakeEvaluator(directory, environ)
+    evaluator.evaluate(nodes)
+
+    missing = [name for name in ('C_SOURCES', 'PREFIX') if not evaluator.variables.get(name)]
+    if missing:
+        print_error(f"Makefile 中缺少 {', '.join(missing)} 定义，可能不是标准的 STM32CubeMX Makefile")
+        return None
+
+    # CubeMX 的 CFLAGS 已包含 MCU、C_DEFS 和 C_INCLUDES，手动修改过的 Makefile 中没有时再补上
+    cflags = _strip_depfile_flags(evaluator.value('CFLAGS').split())
+    for name in ('MCU', 'C_DEFS', 'C_INCLUDES'):
+        for flag in evaluator.value(name).split():
+            if flag not in cflags:
+                cflags.append(flag)
+    cflags = [flag.replace('"', '') for flag in cflags]
+
+    compiler = evaluator.value('PREFIX').strip() + 'gcc'
+    if not os.path.isabs(compiler):
+        # clangd 的 --query-driver 按编译器的完整路径匹配
+        compiler = shutil.which(compiler) or compiler
+    build_dir = evaluator.value('BUILD_DIR').strip() or 'build'
+
+    entries = []
+    seen = set()
+    for source in evaluator.value('C_SOURCES').split():
+        if source in seen:
+            continue
+        seen.add(source)
+        output = f"{build_dir}/{os.path.splitext(os.path.basename(source))[0]}.o"
+        entries.append({
+            'directory': directory,
+            'arguments': [compiler, '-c'] + cflags + [source, '-o', output],
+            'file': source,
+            'output': output,
+        })
+    return entries
+
+def write_compile_commands(filepath, environ=None):
+    """在 Makefile 所在目录生成 compile_commands.json"""
+    entries = generate_compile_commands(filepath, environ)
+    if entries is None:
+        return False
+    if read_fix_marker(filepath) is None:
+        print_warning("Makefile 尚未修复，使用 STM32CubeMX 原始的工具链配置")
+    compiler = entries[0]['arguments'][0] if entries else ''
+    print_info(f"{len(entries)} 个 C 源文件，编译器 {compiler}")
+
+    path = os.path.join(os.path.dirname(os.path.abspath(filepath)), COMPILE_COMMANDS_NAME)
+    data = (json.dumps(entries, indent=2, ensure_ascii=False) + '\n').encode('utf-8')
+    try:
+        with open(path, 'rb') as f:
+            if f.read() == data:
+                print_info(f"{COMPILE_COMMANDS_NAME} 已是最新")
+                return True
+    except OSError:
+        pass
+    atomic_write(path, data)
+    print_info(f"已生成 {path}")
+    return True
+
+# 编译耗时统计（--profile-build）
+# 生成的构建配置通过编译器启动器（launcher）以 --profile-exec 方式调用本脚本，
+# 记录每个编译单元的耗时、峰值内存、输出文件大小和包含的头文件（JSON Lines），
+# 再用 --profile-report 汇总最慢的编译单元和头文件
+PROFILE_EXEC_FLAG = '--profile-exec'
+PROFILE_LOG_NAME = 'build-profile.jsonl'
+# 构建时调用的统计脚本（相对项目目录，可通过环境变量指定）
+PROFILE_SCRIPT_DEFAULT = 'tools/fix_cubemx_makefile.py'
+PROFILE_SCRIPT_ENV = 'CUBEMX_PROFILE_SCRIPT'
+PROFILE_TOP_DEFAULT = 20
+
+_SOURCE_EXTS = ('.c', '.cc', '.cpp', '.cxx', '.s', '.S', '.sx')
+
+def _compile_output(cmd):
+    """编译命令的输出文件（-o）"""
+    for i, arg in enumerate(cmd):
+        if arg == '-o' and i + 1 < len(cmd):
+            return cmd[i + 1]
+        if arg.startswith('-o') and len(arg) > 2:
+            return arg[2:]
+    return None
+
+def _compile_source(cmd):
+    """编译命令的源文件"""
+    for i in range(len(cmd) - 1, 0, -1):
+        if cmd[i].endswith(_SOURCE_EXTS) and cmd[i - 1] not in ('-o', '-MF', '-MT', '-MQ'):
+            return cmd[i]
+    return None
+
+def _compile_depfile(cmd, output):
+    """编译命令生成的依赖文件（-MF，或 -MD/-MMD 时与输出文件同名的 .d）"""
+    for i, arg in enumerate(cmd):
+        if arg == '-MF' and i + 1 < len(cmd):
+            return cmd[i + 1]
+        if arg.startswith('-MF') and len(arg) > 3:
+            return arg[3:].strip('"')
+    if output and ('-MD' in cmd or '-MMD' in cmd):
+        return os.path.splitext(output)[0] + '.d'
+    return None
+
+def read_depfile(depfile, source=None):
+    """读取 make 格式的依赖文件，返回头文件列表（不含源文件本身）"""
+    try:
+        with open(depfile, 'r', encoding='utf-8', errors='replace') as f:
+            content = f.read().replace('\\\n', ' ')
+    except OSError:
+        return []
+    # 只需要第一条规则（目标: 源文件 头文件...），-MP 生成的空规则可以忽略
+    for line in content.splitlines():
+        parts = re.split(r':(?=\s|$)', line, 1)
+        if len(parts) == 2:
+            return [dep for dep in dict.fromkeys(parts[1].split()) if dep != source]
+    return []
+
+def read_time_trace(trace_file, limit=50):
+    """读取 clang -ftime-trace 的结果，返回各头文件的解析耗时（秒）"""
+    try:
+        with open(trace_file, 'r', encoding='utf-8') as f:
+            events = json.load(f).get('traceEvents', [])
+    except (OSError, ValueError):
+        return None
+    durations = {}
+    for event in events:
+        if event.get('name') == 'Source' and event.get('dur'):
+            header = event.get('args', {}).get('detail')
+            if header:
+                durations[header] = durations.get(header, 0) + event['dur'] / 1e6
+    top = sorted(durations.items(), key=lambda item: item[1], reverse=True)[:limit]
+    return {header: round(seconds, 4) for header, seconds in top}
+
+def _peak_rss_kb():
+    """已结束子进程的峰值内存（KB），不支持的平台返回 None"""
+    try:
+        import resource
+    except ImportError:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    # macOS 的单位是字节，Linux 是 KB
+    return rss // 1024 if sys.platform == 'darwin' else rss
+
+def run_profiled(log_path, cmd):
+    """执行编译命令并记录耗时，返回编译命令的退出码"""
+    if cmd and cmd[0] == '--':
+        cmd = cmd[1:]
+    # 第一个参数为空时（如未找到编译器缓存）直接跳过
+    while cmd and not cmd[0]:
+        cmd = cmd[1:]
+    if not cmd:
+        print_error(f"{PROFILE_EXEC_FLAG} 缺少要执行的编译命令")
+        return 2
+
+    output = _compile_output(cmd)
+    trace_file = None
+    compiler = os.path.basename(next((arg for arg in cmd if not arg.endswith(('ccache', 'sccache'))), cmd[0]))
+    if 'clang' in compiler and output and '-c' in cmd:
+        # clang 的 -ftime-trace 会在输出文件旁生成同名的 .json
+        cmd = cmd + ['-ftime-trace']
+        trace_file = os.path.splitext(output)[0] + '.json'
+
+    start = time.perf_counter()
+    try:
+        returncode = subprocess.call(cmd)
+    except OSError as e:
+        print_error(f"无法执行编译命令 {cmd[0]}: {e}")
+        return 127
+    wall = time.perf_counter() - start
+
+    # 统计失败不能影响编译结果
+    try:
+        source = _compile_source(cmd)
+        record = {
+            'time': datetime.now().isoformat(timespec='seconds'),
+            'source': source,
+            'output': output,
+            'wall': round(wall, 4),
+            'peak_rss_kb': _peak_rss_kb(),
+            'output_size': os.path.getsize(output) if output and os.path.isfile(output) else None,
+            'returncode': returncode,
+        }
+        depfile = _compile_depfile(cmd, output)
+        if depfile:
+            record['includes'] = read_depfile(depfile, source)
+        if trace_file:
+            record['trace'] = read_time_trace(trace_file)
+        directory = os.path.dirname(os.path.abspath(log_path))
+        os.makedirs(directory, exist_ok=True)
+        # 一次写入一整行，并行编译时追加写入不会交错
+        with open(log_path, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(record, ensure_ascii=False) + '\n')
+    except Exception:
+        pass
+    return returncode
+
+def load_build_profile(log_path):
+    """读取编译耗时记录，同一个输出文件只保留最新的一条"""
+    records = {}
+    with open(log_path, 'r', encoding='utf-8') as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            if record.get('source'):
+                records[record.get('output') or record['source']] = record
+    return list(records.values())
+
+def _format_size(size):
+    """格式化文件大小"""
+    if size is None:
+        return '-'
+    for unit in ('B', 'KB', 'MB'):
+        if size < 1024 or unit == 'MB':
+            return f"{size:.0f}{unit}" if unit == 'B' else f"{size:.1f}{unit}"
+        size /= 1024
+
+def print_build_profile_report(log_path, top=PROFILE_TOP_DEFAULT):
+    """输出最慢的编译单元和头文件"""
+    records = load_build_profile(log_path)
+    if not records:
+        print_warning(f"没有编译耗时记录: {log_path}")
+        return False
+
+    total = sum(record['wall'] for record in records)
+    print_info(f"共 {len(records)} 个编译单元，编译耗时合计 {total:.1f}s（并行构建时大于实际构建时间）")
+    print()
+    print_info(f"最慢的 {min(top, len(records))} 个编译单元：")
+    print(f"  {'耗时':>6}  {'峰值内存':>4}  {'输出大小':>4}  文件")
+    for record in sorted(records, key=lambda r: r['wall'], reverse=True)[:top]:
+        rss = record.get('peak_rss_kb')
+        rss = _format_size(rss * 1024) if rss is not None else '-'
+        failed = '（编译失败）' if record.get('returncode') else ''
+        print(f"  {record['wall']:>7.2f}s  {rss:>8}  {_format_size(record.get('output_size')):>8}  "
+              f"{record['source']}{failed}")
+
+    # 有 -ftime-trace 数据时使用头文件的实际解析耗时，否则按包含该头文件的编译单元耗时估算
+    headers = {}
+    traced = [record for record in records if record.get('trace')]
+    if traced:
+        for record in traced:
+            for header, seconds in record['trace'].items():
+                cost, count = headers.get(header, (0, 0))
+                headers[header] = (cost + seconds, count + 1)
+        title = "解析最慢的头文件（-ftime-trace）："
+    else:
+        for record in records:
+            for header in record.get('includes') or []:
+                cost, count = headers.get(header, (0, 0))
+                headers[header] = (cost + record['wall'], count + 1)
+        title = "影响最大的头文件（按包含该头文件的编译单元耗时合计估算）："
+    if headers:
+        print()
+        print_info(title)
+        print(f"  {'耗时':>6}  {'编译单元':>4}  头文件")
+        for header, (cost, count) in sorted(headers.items(), key=lambda item: item[1][0], reverse=True)[:top]:
+            print(f"  {cost:>7.2f}s  {count:>8}  {header}")
+    return True
+
+# 监视模式（--watch）
+# 轮询项目目录中的 Makefile，STM32CubeMX 重新生成（覆盖）后立即自动重新修复，不需要确认
+WATCH_INTERVAL = 0.1  # 秒，检查文件是否变化的间隔
+WATCH_RESCAN_INTERVAL = 2.0  # 秒，重新搜索新文件的间隔
+WATCH_SETTLE_TIME = 0.05  # 秒，文件在这段时间内不再变化才认为写入完成
+
+def _watch_stat(filepath):
+    """用于判断文件是否变化的 (inode, 大小, 修改时间)，文件不存在时返回 None"""
+    try:
+        st = os.stat(filepath)
+    except OSError:
+        return None
+    return (st.st_ino, st.st_size, st.st_mtime_ns)
+
+def watch_files(find_files, handle, interval=WATCH_INTERVAL):
+    """轮询监视文件，文件首次发现、被修改或删除后重新生成时调用 handle(文件路径)"""
+    known = {}  # 文件路径 -> 上次处理时的状态
+    last_scan = None
+    while True:
+        now = time.monotonic()
+        if last_scan is None or now - last_scan >= WATCH_RESCAN_INTERVAL:
+            for filepath in find_files():
+                known.setdefault(os.path.abspath(filepath), None)
+            last_scan = now
+        for filepath, previous in list(known.items()):
+            current = _watch_stat(filepath)
+            if current is None or current == previous:
+                # 文件被删除时继续监视，重新生成后立即处理
+                known[filepath] = current
+                continue
+            time.sleep(WATCH_SETTLE_TIME)
+            if _watch_stat(filepath) != current:
+                continue  # 仍在写入，下一轮再检查
+            handle(filepath)
+            known[filepath] = _watch_stat(filepath)
+        time.sleep(interval)
+
+WATCH_SKIP_DIRS = ('.git', BACKUP_DIR_NAME, 'build', 'node_modules')
+
+def find_makefiles(root='.'):
+    """查找目录中的 Makefile（跳过构建目录和备份目录）"""
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames[:] = [d for d in dirnames if d not in WATCH_SKIP_DIRS]
+        if 'Makefile' in filenames:
+            yield os.path.join(dirpath, 'Makefile')
+
+def auto_fix_makefile(filepath, options, keep_backups=None, state_cache=None):
+    """不询问直接修复：只处理 STM32CubeMX 生成的、尚未修复或修复模板已变化的 Makefile"""
+    state_cache = state_cache or FixStateCache()
+    fingerprint = toolchain_fingerprint(**options)
+    if state_cache.is_current(filepath, fingerprint):
+        return False
+    status = get_fix_status(filepath, fingerprint)
+    if status == 'current':
+        state_cache.record(filepath, fingerprint)
+        return False
+    if status == 'legacy':
+        print_warning(f"{filepath} 似乎已经手动修复过（包含 ARM_TOOLCHAIN_PATH），跳过")
+        return False
+    if status is None and not is_cubemx_makefile(filepath):
+        return False
+
+    start = time.perf_counter()
+    if status is None:
+        print_info(f"检测到 STM32CubeMX 生成的 Makefile: {filepath}")
+    else:
+        print_info(f"Makefile 使用旧版本的模板修复过: {filepath}")
+    backup_file(filepath, keep=keep_backups)
+    if not fix_makefile(filepath, **options):
+        print_error(f"修复失败: {filepath}")
+        return False
+    state_cache.record(filepath, fingerprint)
+    print_success(f"已自动修复: {filepath}（{(time.perf_counter() - start) * 1000:.0f} ms）")
+    return True
+
+def check_environment(toolchain_pin=None):
+    """检查环境变量和工具链"""
+    if toolchain_pin:
+        print_success(f"固定使用工具链: {toolchain_pin}")
+        return True
     arm_toolchain = os.environ.get('ARM_TOOLCHAIN_PATH')
     if not arm_toolchain:
         print_warning("环境变量 ARM_TOOLCHAIN_PATH 未设置")
+        best = select_best_toolchain()
+        if best:
+            print_info(f"找到推荐的工具链: {format_toolchain(best)}")
         print_info("建议执行以下命令：")
-        print("  export ARM_TOOLCHAIN_PATH=\"$HOME/toolchains/arm-gnu-toolchain-14.2.1\"")
+        suggestion = best['path'] if best else '$HOME/toolchains/arm-gnu-toolchain-14.2.1'
+        print(f"  export ARM_TOOLCHAIN_PATH=\"{suggestion}\"")
         print("  # 或添加到 ~/.zshrc 或 ~/.bashrc")
+        if best:
+            print_info("或使用 --pin-toolchain 将推荐的工具链写入配置")
         print()
         response = input("是否继续修复 Makefile？(y/n): ")
         if response.lower() != 'y':
             return False
     else:
         print_success(f"环境变量已设置: {arm_toolchain}")
-        toolchain_gcc = os.path.join(arm_toolchain, 'bin', 'arm-none-eabi-gcc')
+        toolchain_gcc = os.path.join(arm_toolchain, 'bin', TOOLCHAIN_GCC)
         if not os.path.exists(toolchain_gcc):
             print_warning("工具链文件不存在，请检查路径是否正确")
+        else:
+            cache = ToolchainProbeCache()
+            info = cache.probe(arm_toolchain)
+            cache.save()
+            print_info(f"工具链: {format_toolchain(info)}")
+            if info['error'] is None and not info['newlib']:
+                print_warning("该工具链缺少 newlib，链接时可能失败")
     return True
 
+# 支持的编译器缓存（按优先顺序）
+COMPILER_CACHES = ('ccache', 'sccache')
+
+def resolve_compiler_cache(value):
+    """解析 --compiler-cache 参数，'auto' 表示使用找到的第一个编译器缓存"""
+    if not value or value == 'none':
+        return None
+    names = COMPILER_CACHES if value == 'auto' else (value,)
+    for name in names:
+        path = shutil.which(name)
+        if path:
+            print_info(f"使用编译器缓存: {path}")
+            return name
+    print_warning(f"没有找到编译器缓存（{', '.join(names)}），不添加编译器缓存配置")
+    return None
+
+def resolve_toolchain_pin(value):
+    """解析 --pin-toolchain 参数，'auto' 表示自动选择推荐的工具链"""
+    if not value:
+        return None
+    if value == 'auto':
+        best = select_best_toolchain()
+        if best is None:
+            print_error("没有找到可用的 ARM GNU 工具链，无法自动固定")
+            sys.exit(1)
+        print_info(f"自动选择工具链: {format_toolchain(best)}")
+        return os.path.abspath(best['path'])
+    if not os.path.isfile(os.path.join(value, 'bin', TOOLCHAIN_GCC)):
+        print_error(f"不是有效的工具链目录（缺少 bin/{TOOLCHAIN_GCC}）: {value}")
+        sys.exit(1)
+    return os.path.abspath(value)
+
+def parse_args(argv=None):
+    """解析命令行参数"""
+    parser = argparse.ArgumentParser(
+        description="STM32CubeMX Makefile 自动修复工具",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+使用示例:
+  python3 fix_cubemx_makefile.py
+  python3 fix_cubemx_makefile.py /path/to/Makefile
+  python3 fix_cubemx_makefile.py Makefile --restore
+  python3 fix_cubemx_makefile.py Makefile --prune-backups --keep-backups 3
+  python3 fix_cubemx_makefile.py Makefile --compile-commands
+        """
+    )
+    parser.add_argument('makefile', nargs='?', default='Makefile',
+                        help='Makefile 路径（默认: 当前目录的 Makefile）')
+    parser.add_argument('--keep-backups', type=int, default=None, metavar='N',
+                        help=f'每个文件保留的备份数量（默认: {BACKUP_KEEP_DEFAULT}）')
+    parser.add_argument('--restore', action='store_true',
+                        help='从最新的备份恢复 Makefile')
+    parser.add_argument('--prune-backups', action='store_true',
+                        help='按保留策略清理备份后退出')
+    parser.add_argument('--force', action='store_true',
+                        help='即使已是最新的修复也重新修复')
+    parser.add_argument('--list-toolchains', action='store_true',
+                        help='列出找到的 ARM GNU 工具链后退出')
+    parser.add_argument('--pin-toolchain', nargs='?', const='auto', metavar='DIR',
+                        help='将工具链路径写入配置（不指定 DIR 时自动选择推荐的工具链）')
+    parser.add_argument('--fast-build', action='store_true',
+                        help='添加并行构建和头文件依赖跟踪配置，并移除导致串行构建的写法')
+    parser.add_argument('--compiler-cache', nargs='?', const='auto', choices=('auto', 'none') + COMPILER_CACHES,
+                        help='为编译器添加 ccache/sccache 缓存（默认: auto，使用找到的第一个）')
+    parser.add_argument('--release-profile', nargs='?', const='size', choices=tuple(RELEASE_PROFILE_OPT),
+                        help='添加发布优化配置：DEBUG=0 时使用 -Os（size，默认）或 -O2（speed）、LTO 和段回收')
+    parser.add_argument('--profile-build', action='store_true',
+                        help=f'为编译器添加耗时统计启动器，记录每个文件的编译耗时到 $(BUILD_DIR)/{PROFILE_LOG_NAME}')
+    parser.add_argument('--profile-report', metavar='LOG',
+                        help='汇总编译耗时记录，列出最慢的编译单元和头文件后退出')
+    parser.add_argument('--profile-top', type=int, default=PROFILE_TOP_DEFAULT, metavar='N',
+                        help=f'--profile-report 列出的数量（默认: {PROFILE_TOP_DEFAULT}）')
+    parser.add_argument('--web-assets', nargs='?', const=WEB_ASSETS_DIR_DEFAULT, metavar='DIR',
+                        help=f'添加网页资源构建规则：将 DIR（默认: {WEB_ASSETS_DIR_DEFAULT}）下的 HTML/CSS/JS 逐个转换为 C 源文件并编译链接')
+    parser.add_argument('--watch', nargs='?', const='.', metavar='DIR',
+                        help='监视目录（默认: 当前目录）中的 Makefile，STM32CubeMX 重新生成后自动修复（Ctrl+C 退出）')
+    parser.add_argument('--to-cmake', action='store_true',
+                        help='将 Makefile 项目转换为使用 Ninja 的 CMake 项目（Makefile 保持不变，已有文件需配合 --force 覆盖）')
+    parser.add_argument('--compile-commands', action='store_true',
+                        help=f'不运行 make，直接根据 Makefile 生成 {COMPILE_COMMANDS_NAME}（供 clangd 等工具使用）')
+    return parser.parse_args(argv)
+
 def main():
     """主函数"""
+    # 作为编译器启动器运行（由 --profile-build 生成的配置调用），不输出其他信息
+    if len(sys.argv) > 2 and sys.argv[1] == PROFILE_EXEC_FLAG:
+        sys.exit(run_profiled(sys.argv[2], sys.argv[3:]))
+    
     print_info("=" * 50)
     print_info("STM32CubeMX Makefile 自动修复工具")
     print_info("=" * 50)
     print()
     
-    # 获取 Makefile 路径
-    if len(sys.argv) > 1:
-        makefile_path = sys.argv[1]
-    else:
-        makefile_path = 'Makefile'
+    args = parse_args()
+    
+    # 列出工具链
+    if args.list_toolchains:
+        print_toolchains(discover_toolchains())
+        sys.exit(0)
+    
+    # 汇总编译耗时
+    if args.profile_report:
+        if not os.path.isfile(args.profile_report):
+            print_error(f"文件不存在: {args.profile_report}")
+            sys.exit(1)
+        sys.exit(0 if print_build_profile_report(args.profile_report, args.profile_top) else 1)
+    
+    # 工具链配置选项
+    options = {
+        'toolchain_pin': resolve_toolchain_pin(args.pin_toolchain),
+        'compiler_cache': resolve_compiler_cache(args.compiler_cache),
+        'fast_build': args.fast_build,
+        'release_profile': args.release_profile,
+        'build_profile': args.profile_build,
+        'web_assets': args.web_assets,
+    }
+    makefile_path = args.makefile
+    
+    # 监视模式
+    if args.watch:
+        if not options['toolchain_pin'] and not os.environ.get('ARM_TOOLCHAIN_PATH'):
+            print_warning("环境变量 ARM_TOOLCHAIN_PATH 未设置，编译时将使用系统 PATH 中的工具链")
+        print_info(f"开始监视 {os.path.abspath(args.watch)} 中的 Makefile（Ctrl+C 退出）")
+        state_cache = FixStateCache()
+        try:
+            watch_files(lambda: find_makefiles(args.watch),
+                        lambda path: auto_fix_makefile(path, options, args.keep_backups, state_cache))
+        except KeyboardInterrupt:
+            print()
+            print_info("已停止监视")
+        sys.exit(0)
+    
+    store = BackupStore.for_file(makefile_path, keep=args.keep_backups)
+    
+    # 清理备份
+    if args.prune_backups:
+        removed = store.prune()
+        print_success(f"备份清理完成，删除了 {removed} 份不再保留的备份")
+        sys.exit(0)
+    
+    # 从备份恢复
+    if args.restore:
+        entry = store.latest(makefile_path)
+        if entry is None:
+            print_error(f"没有找到 {makefile_path} 的备份")
+            sys.exit(1)
+        backup_path = store.restore(makefile_path)
+        print_success(f"已从备份恢复（{entry['time']}）: {backup_path} -> {makefile_path}")
+        sys.exit(0)
     
     # 检查文件是否存在
     if not os.path.exists(makefile_path):
         print_error(f"文件不存在: {makefile_path}")
+        if store.latest(makefile_path):
+            print_info("发现备份，可执行以下命令恢复：")
+            print(f"  python3 fix_cubemx_makefile.py {makefile_path} --restore")
         sys.exit(1)
     
+    # 转换为 CMake 项目
+    if args.to_cmake:
+        if read_fix_marker(makefile_path) is None and not is_cubemx_makefile(makefile_path):
+            print_warning("这可能不是 STM32CubeMX 生成的 Makefile")
+            response = input("是否继续？(y/n): ")
+            if response.lower() != 'y':
+                sys.exit(0)
+        print_info(f"开始转换为 CMake 项目: {makefile_path}")
+        if not convert_makefile_to_cmake(makefile_path, force=args.force, keep_backups=args.keep_backups):
+            print_error("转换失败")
+            sys.exit(1)
+        print_success("转换完成！")
+        print_info("现在可以使用 CMake + Ninja 编译：")
+        print("  cmake --preset Debug")
+        print("  cmake --build --preset Debug")
+        sys.exit(0)
+    
+    # 生成 compile_commands.json
+    if args.compile_commands:
+        print_info(f"开始生成 {COMPILE_COMMANDS_NAME}: {makefile_path}")
+        if not write_compile_commands(makefile_path):
+            print_error("生成失败")
+            sys.exit(1)
+        print_success("生成完成！")
+        sys.exit(0)
+    
+    # 快速检查：文件自上次修复后未变化时无需读取即可跳过
+    fingerprint = toolchain_fingerprint(**options)
+    state_cache = FixStateCache()
+    if not args.force and state_cache.is_current(makefile_path, fingerprint):
+        print_success("Makefile 未变化，且已是最新的修复，跳过")
+        sys.exit(0)
+    
+    # 检查是否已经修复过
+    status = get_fix_status(makefile_path, fingerprint)
+    if status == 'current' and not args.force:
+        state_cache.record(makefile_path, fingerprint)
+        print_success("Makefile 已是最新的修复，跳过（使用 --force 强制重新修复）")
+        sys.exit(0)
+    
     # 检查是否是 STM32CubeMX 生成的
-    if not is_cubemx_makefile(makefile_path):
+    if status is None and not is_cubemx_makefile(makefile_path):
         print_warning("这可能不是 STM32CubeMX 生成的 Makefile")
         response = input("是否继续？(y/n): ")
         if response.lower() != 'y':
             sys.exit(0)
     
-    # 检查是否已经修复过
-    if is_already_fixed(makefile_path):
+    if status == 'outdated':
+        print_info("Makefile 使用旧版本的模板修复过，自动重新修复")
+    elif status == 'legacy' and not args.force:
         print_warning("Makefile 似乎已经修复过（包含 ARM_TOOLCHAIN_PATH）")
         response = input("是否重新修复？(y/n): ")
         if response.lower() != 'y':
             sys.exit(0)
     
     # 检查环境变量
-    if not check_environment():
+    if not check_environment(options['toolchain_pin']):
         sys.exit(0)
     
     # 备份文件
-    backup_path = backup_file(makefile_path)
+    backup_path = backup_file(makefile_path, keep=args.keep_backups)
     if backup_path:
         print_info(f"已备份原文件到: {backup_path}")
     
     # 修复 Makefile
     print_info(f"开始修复 Makefile: {makefile_path}")
-    if fix_makefile(makefile_path):
+    if fix_makefile(makefile_path, **options):
+        state_cache.record(makefile_path, fingerprint)
         print_success("Makefile 修复完成！")
         if backup_path:
             print_info(f"备份文件: {backup_path}")